@@ -1,6 +1,10 @@
 import os
+import threading
 import time
-from typing import Any, Callable, Optional, Union
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Optional
 
 import cv2
 import numpy as np
@@ -12,9 +16,88 @@ import src.analysis.db
 import src.tools.sms_sender
 
 
+class DecodedImageCache:
+    """
+    LRU cache of decoded images, keyed by path, modification time and read
+    mode, so a file rewritten in place is decoded again. The least recently
+    used images are evicted once the cached arrays exceed `max_bytes`.
+    Cached arrays are read-only; copy them before drawing on them.
+    Files are decoded in parallel by a pool of `workers` threads, started on
+    first use and kept until `close`.
+    """
+
+    def __init__(self, max_bytes: int = 256 * 1024 * 1024,
+                 workers: int = os.cpu_count() or 1):
+        self.max_bytes = max_bytes
+        self.workers = workers
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._images = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = None
+
+    @staticmethod
+    def key(image_path: str, mode: int) -> Optional[tuple[str, int, int]]:
+        try:
+            mtime = os.stat(image_path).st_mtime_ns
+        except OSError:
+            return None
+        return os.path.abspath(image_path), mtime, mode
+
+    def get(self, key) -> Optional[np.ndarray]:
+        with self._lock:
+            img = self._images.get(key)
+            if img is None:
+                self.misses += 1
+                return None
+            self._images.move_to_end(key)
+            self.hits += 1
+            return img
+
+    def put(self, key, img: np.ndarray) -> None:
+        if img.nbytes > self.max_bytes:
+            return
+        img.setflags(write=False)
+        with self._lock:
+            if key in self._images:
+                self.size -= self._images.pop(key).nbytes
+            self._images[key] = img
+            self.size += img.nbytes
+            while self.size > self.max_bytes:
+                _, old = self._images.popitem(last=False)
+                self.size -= old.nbytes
+
+    def clear(self) -> None:
+        with self._lock:
+            self._images.clear()
+            self.size = 0
+
+    def map(self, func, items: list) -> list:
+        """`func` over `items` on the decoding threads, in order."""
+        if len(items) < 2 or self.workers < 2:
+            return [func(item) for item in items]
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    self.workers, thread_name_prefix="decode")
+            executor = self._executor
+        return list(executor.map(func, items))
+
+    def close(self) -> None:
+        """Stops the decoding threads and drops the cached images."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor:
+            executor.shutdown()
+        self.clear()
+
+
 class Analyzer:
     def __init__(self):
         self.MAX_PROCESSED_IMAGES = 300
+        # where `combin_batch` saves the images with their detections
+        self.processed_dir = os.path.join("/app/shared-images", "processed")
 
         # Change to your image directory (normalize slashes for platform!)
         self.dir = r"C:\Users\CROPPS-in-Box\Documents\cropps main folder\cropps-img\assets\captured_data"
@@ -43,6 +126,10 @@ class Analyzer:
         # Other than testing, only one function should be called.
         self.functions = [self.combin]
 
+        # Decoded images, shared by every metric and `paint_square`, and
+        # the threads decoding files in parallel
+        self.cache = DecodedImageCache()
+
         ### Thresholds for analysis - see functions below for specifications ###
         # BRIGHT PIXELS
         self.threshold_bright = 60  # intensity ranges from 0 to 255
@@ -53,21 +140,48 @@ class Analyzer:
         self.threshold_normalized = 5
         self.threshold_normalized_total = 6000
 
+        # SPARSE BRIGHT PIXELS
+        self.threshold_sparse_min = 1000  # minimum number to consider valid
+        self.threshold_sparse_max = 500000  # maximum before "too bright"
+
+        # Metrics computed from one decoded image (or a stack of images).
+        # Each entry maps a name to (extracted, criterion, desc), where
+        # `extracted` takes an N x H x W stack and returns N values and
+        # `criterion` maps those values to N booleans.
+        self.metrics = {
+            "yellow": (self._count_bright,
+                       lambda extracted: extracted > self.threshold_num_bright,
+                       "Yellow pixels"),
+            "normalized": (self._count_normalized,
+                           lambda extracted:
+                           extracted > self.threshold_normalized_total,
+                           "Normalized intensity"),
+            "sparse": (self._count_bright, self._is_sparse,
+                       "Sparse bright pixels"),
+        }
+        # An image is agitated if all these metrics say so
+        self.verdict_metrics = ["yellow", "normalized"]
+
     def testing_init(self):
-        self.dir = "../assets/CROPPS_Training_Dataset"
+        self.dir = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                "..", "assets", "CROPPS_Training_Dataset")
         self.read_delay = 0
+        self.show_img = 0
         self.is_test = 1
 
-    def paint_square(self, frame: cv2.Mat | np.ndarray[Any, np.dtype]) \
+    def paint_square(self, frame: cv2.Mat | np.ndarray[Any, np.dtype],
+                     gray_frame: Optional[np.ndarray] = None) \
             -> cv2.Mat | np.ndarray[Any, np.dtype]:
         """
         Function to draw a square around the region with the most white pixels in the given frame.
 
         :param frame: The current frame from the video stream.
+        :param gray_frame: grayscale version of `frame`, if already computed
         :return: Frame with a square drawn around the white region.
         """
         # Convert the frame to grayscale
-        gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if gray_frame is None:
+            gray_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
 
         # Apply a binary threshold to isolate the white pixels
         _, thresholded = cv2.threshold(gray_frame, self.threshold_bright, 255,
@@ -110,34 +224,130 @@ class Analyzer:
         plt.grid()
         plt.show()
 
-    def _detect(self, image_path: str, extracted: Callable[
-        [Union[cv2.Mat, np.ndarray[Any, np.dtype]]], int],
-                criterion: Callable[[int], bool], desc: str) \
+    def load(self, image_path: str, color: bool = False) \
+            -> Optional[np.ndarray]:
+        """
+        Reads the image located in `image_path`, or returns it from the cache
+        if it was already decoded. Returns a read-only grayscale array, or a
+        BGR array if `color`, or ``None`` if it cannot be read.
+        """
+        mode = cv2.IMREAD_COLOR if color else cv2.IMREAD_GRAYSCALE
+        key = self.cache.key(image_path, mode)
+        img = self.cache.get(key) if key else None
+        if img is not None:
+            return img
+
+        time.sleep(self.read_delay)
+        img = cv2.imread(image_path, mode)
+        if img is None:
+            print(f"[ANALYSIS] Error loading {image_path}")
+        elif key:
+            self.cache.put(key, img)
+        return img
+
+    def load_many(self, image_paths: list[str], color: bool = False) \
+            -> list[Optional[np.ndarray]]:
+        """`load` for several files, decoded in parallel."""
+        return self.cache.map(lambda p: self.load(p, color), image_paths)
+
+    def close(self) -> None:
+        self.cache.close()
+
+    def _count_bright(self, stack: np.ndarray) -> np.ndarray:
+        """Number of pixels brighter than `threshold_bright` per image."""
+        return np.count_nonzero(stack > self.threshold_bright, axis=(1, 2))
+
+    def _count_normalized(self, stack: np.ndarray) -> np.ndarray:
+        """
+        Number of pixels per image whose intensity minus the (truncated)
+        average of the image falls between `threshold_normalized` percent of
+        the average and 100. The subtraction wraps around like the ``uint8``
+        arithmetic it replaces.
+        """
+        avg = stack.mean(axis=(1, 2)).astype(np.int64)
+        shifted = stack - avg.astype(stack.dtype)[:, None, None]
+        low = (avg * (1 + self.threshold_normalized / 100)).astype(np.int64)
+        return np.count_nonzero((shifted >= low[:, None, None]) &
+                                (shifted <= 100), axis=(1, 2))
+
+    def _is_sparse(self, extracted: np.ndarray) -> np.ndarray:
+        """True when the count is between the sparse min and max thresholds."""
+        return (self.threshold_sparse_min <= extracted) & \
+            (extracted <= self.threshold_sparse_max)
+
+    def analyze_batch(self, stack: np.ndarray,
+                      names: Optional[list[str]] = None) \
+            -> dict[str, tuple[np.ndarray, np.ndarray]]:
+        """
+        Evaluates the registered metrics on a stack of grayscale images.
+
+        Args:
+            stack: N x H x W (or a single H x W) grayscale array
+            names: metrics to compute, defaults to all of `self.metrics`
+
+        Returns: a dict mapping each metric name to the N return values of
+         its criterion and its extracted function
+        """
+        if stack.ndim == 2:
+            stack = stack[None]
+        if self.show_img:
+            for img in stack:
+                self.plot_histogram(img)
+
+        results = {}
+        for name in names or self.metrics:
+            extracted, criterion, desc = self.metrics[name]
+            data = np.asarray(extracted(stack))
+            agitated = np.asarray(criterion(data))
+            print(f"[ANALYSIS] {desc}: {data.tolist()}")
+            results[name] = (agitated, data)
+        return results
+
+    def analyze_files(self, image_paths: list[str],
+                      names: Optional[list[str]] = None) \
+            -> list[Optional[dict[str, tuple[bool, int]]]]:
+        """
+        Reads each image once (in parallel) and evaluates the registered
+        metrics on all of them, stacking images of the same size so each
+        metric runs vectorized.
+
+        Returns: one dict per path mapping each metric name to
+         ``(agitated, data)``, or ``None`` for images that cannot be read
+        """
+        return self._analyze_images(self.load_many(image_paths), names)
+
+    def _analyze_images(self, images: list[Optional[np.ndarray]],
+                        names: Optional[list[str]] = None) \
+            -> list[Optional[dict[str, tuple[bool, int]]]]:
+        by_shape = {}
+        for i, img in enumerate(images):
+            if img is not None:
+                by_shape.setdefault(img.shape, []).append(i)
+
+        results = [None] * len(images)
+        for indices in by_shape.values():
+            batch = self.analyze_batch(np.stack([images[i] for i in indices]),
+                                       names)
+            for j, i in enumerate(indices):
+                results[i] = {name: (bool(agitated[j]), int(data[j]))
+                              for name, (agitated, data) in batch.items()}
+        return results
+
+    def _detect(self, image_path: str, name: str) \
             -> tuple[bool, Optional[int]]:
         """
         Helper function that analyzes the image located in `image_path`
         Args:
             image_path: path of image
-            extracted: function that takes in an image, analyzes it, and returns
-             an `int`
-            criterion: function that takes in an `int` and returns a `bool` based
-             on certain criteria
-            desc: description of the function
-
-        Returns: the return values of `criterion` and `extracted`
+            name: name of the metric in `self.metrics`
 
+        Returns: the return values of the metric's criterion and extracted
+         functions
         """
-        time.sleep(self.read_delay)
-        img = cv2.imread(image_path, cv2.IMREAD_GRAYSCALE)
-        if img is None:
-            print(f"[ANALYSIS] Error loading {image_path}")
+        result = self.analyze_files([image_path], [name])[0]
+        if result is None:
             return False, None
-        if self.show_img:
-            self.plot_histogram(img)
-        data = extracted(img)
-        agitated = criterion(data)
-        print(f"[ANALYSIS] {desc}: {data}")
-        return agitated, data
+        return result[name]
 
     def detect_yellow_num(self, image_path: str) -> tuple[bool, int]:
         """
@@ -146,12 +356,7 @@ class Analyzer:
         is greater than `THRESHOLD_NUM_BRIGHT`.
         """
         # TODO: THIS IS A REALLY BAD FUNCTION
-        return self._detect(image_path,
-                            lambda img: np.count_nonzero(
-                                img > self.threshold_bright),
-                            lambda
-                                extracted: extracted > self.threshold_num_bright,
-                            "Yellow pixels")
+        return self._detect(image_path, "yellow")
 
     def normalize_brightness(self, image_path: str) -> tuple[bool, int]:
         """
@@ -160,18 +365,8 @@ class Analyzer:
          percent greater than the average. The image is categorized as "agitated" if
          that number is greater than `THRESHOLD_NORMALIZED_TOTAL`.
         """
-
         # TODO: THIS IS A REALLY BAD FUNCTION
-        def criteria(img):
-            avg = int(np.average(img))
-            img -= int(avg)
-            return cv2.countNonZero(cv2.inRange(img, np.array(
-                [int(avg * (1 + self.threshold_normalized / 100))]), np.array([
-                100])))
-
-        return self._detect(image_path, criteria, lambda
-            extracted: extracted > self.threshold_normalized_total,
-                            "Normalized intensity")
+        return self._detect(image_path, "normalized")
 
     def detect_sparse_bright_pixels(self, image_path: str) -> tuple[bool, int]:
         """
@@ -179,43 +374,89 @@ class Analyzer:
         Returns True (agitated) when there are FEW bright pixels (between min and max thresholds).
         Returns False when there are too many or too few bright pixels.
         """
-
         # TODO: THIS IS A BETTER BUT STILL REALLY BAD FUNCTION
-        def count_bright_pixels(img):
-            # Count pixels above brightness threshold
-            bright_pixels = np.count_nonzero(img > self.threshold_bright)
-            return bright_pixels
+        return self._detect(image_path, "sparse")
 
-        def is_agitated(count):
-            # Define min and max thresholds for number of bright pixels
-            MIN_BRIGHT_PIXELS = 1000  # Minimum number to consider valid
-            MAX_BRIGHT_PIXELS = 500000  # Maximum number before considered too bright
+    def combin(self, image_path: str) -> tuple[bool, None]:
+        return self.combin_batch([image_path])[0] or (False, None)
 
-            # Return True only if count is between min and max
-            return MIN_BRIGHT_PIXELS <= count <= MAX_BRIGHT_PIXELS
-
-        return self._detect(image_path, count_bright_pixels, is_agitated,
-                            "Sparse bright pixels")
-
-    def combin(self, image_path: str):
-        processed_dir = os.path.join("/app/shared-images", "processed")
+    def combin_batch(self, image_paths: list[str]
+                     ) -> list[Optional[tuple[bool, None]]]:
+        """
+        Decodes each image once, evaluates `verdict_metrics` on the whole
+        batch, then saves the processed images and logs every result to the
+        database. The verdict of an image that could not be read or analyzed
+        is None.
+        """
+        processed_dir = self.processed_dir
         os.makedirs(processed_dir, exist_ok=True)
 
-        basename = os.path.basename(image_path)
-        final_path = os.path.join(processed_dir, basename)
-
+        frames = self.load_many(image_paths, color=True)
+        grays = [None if f is None else cv2.cvtColor(f, cv2.COLOR_BGR2GRAY)
+                 for f in frames]
         try:
-            # Run analysis
-            a = self.detect_yellow_num(image_path)
-            b = self.normalize_brightness(image_path)
-            res = (a[0] and b[0], None)
+            results = self._analyze_images(grays, self.verdict_metrics)
+        except Exception as e:
+            print(f"[ANALYSIS ERROR from analyzer] {e}")
+            return [None] * len(image_paths)
+
+        verdicts = []
+        stored = {}  # recording folder -> frames for the results store
+        for image_path, frame, gray, result in zip(image_paths, frames, grays,
+                                                    results):
+            try:
+                res = (all(result[n][0] for n in self.verdict_metrics), None)
+            except Exception as e:
+                # result is None for an unreadable image
+                print(f"[ANALYSIS ERROR from analyzer] {image_path}: {e}")
+                verdicts.append(None)
+                continue
+            verdicts.append(res)
+
+            basename = os.path.basename(image_path)
+            final_path = os.path.join(processed_dir, basename)
+
+            try:
+                a = result["yellow"]
+                b = result["normalized"]
+
+                # Save processed image
+                cv2.imwrite(final_path,
+                            self.paint_square(frame.copy(), gray))
+
+                # Fire-and-forget: the row is written by the DB sink thread
+                print(
+                    f"[DEBUG] Queueing DB log: yellow={a[1]}, normalized={b[1]}, agitated={res[0]}, path={final_path}")
+                src.analysis.db.insert_data(
+                    yellow_pixels=a[1],
+                    normalized_pixels=b[1],
+                    agitation=res[0],
+                    image_path=final_path
+                )
+                stored.setdefault(os.path.dirname(os.path.abspath(image_path)),
+                                  []).append({
+                    "timestamp": datetime.now().isoformat(),
+                    "yellow_pixels": a[1],
+                    "normalized_pixels": b[1],
+                    "agitated": res[0],
+                    "image_path": final_path,
+                })
+
+                print(f"[ANALYSIS] Agitated: {res[0]}\n")
+
+            except Exception as e:
+                print(f"[DB ERROR from analyzer] {e}")
 
-            # Save processed image
-            frame = cv2.imread(image_path)
-            frame = self.paint_square(frame)
-            cv2.imwrite(final_path, frame)
+        try:
+            store = src.analysis.db.get_results_store()
+            if store:
+                for recording, rows in stored.items():
+                    store.add_frames(recording, rows)
+        except Exception as e:
+            print(f"[DB ERROR from analyzer] {e}")
 
-            # Trim old processed files
+        # Trim old processed files
+        try:
             processed_imgs = sorted(
                 [f for f in os.listdir(processed_dir) if
                  f.lower().endswith((".png", ".jpg", ".jpeg"))],
@@ -225,22 +466,11 @@ class Analyzer:
                 for old_file in processed_imgs[
                     :len(processed_imgs) - self.MAX_PROCESSED_IMAGES]:
                     os.remove(os.path.join(processed_dir, old_file))
-
-            print(
-                f"[DEBUG] Inserting to DB: yellow={a[1]}, normalized={b[1]}, agitated={res[0]}, path={final_path}")
-            src.analysis.db.insert_data(
-                yellow_pixels=a[1],
-                normalized_pixels=b[1],
-                agitation=res[0],
-                image_path=final_path
-            )
-
-            print(f"[ANALYSIS] Agitated: {res[0]}\n")
-
-        except Exception as e:
-            print(f"[DB ERROR from analyzer] {e}")
+        except OSError as e:
+            print(f"[ANALYSIS ERROR from analyzer] {e}")
 
         # Cooldown logic stays as is
+        return verdicts
 
 
 class ImageHandler(FileSystemEventHandler):
@@ -259,15 +489,16 @@ class ImageHandler(FileSystemEventHandler):
         if file_name.lower().endswith(('.png', '.jpg', '.jpeg', '.tif')):
             print(f"[HEADLESS] Processing new image: {event.src_path}")
             for func in self.analyzer.functions: func(event.src_path)
-            self.analyzer.combin(event.src_path)
 
 
 class ObserverWrapper:
     def __init__(self, analyzer: Analyzer,
                  sms_sender: src.tools.sms_sender.SmsSender,
-                 image_dir=r"C:\Users\CROPPS-in-Box\Documents\cropps main folder\cropps-img\assets\captured_data"
+                 image_dir=r"C:\Users\CROPPS-in-Box\Documents\cropps main folder\cropps-img\assets\captured_data",
+                 event_handler: Optional[FileSystemEventHandler] = None
                  ):
-        self.event_handler = ImageHandler(analyzer, sms_sender)
+        self.event_handler = event_handler or ImageHandler(analyzer,
+                                                           sms_sender)
         self.observer = Observer()
         self.analyzer = analyzer
         self.image_dir = image_dir
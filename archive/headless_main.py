@@ -1,53 +1,59 @@
-import glob
 import os
 import time
 
+import src.analysis.db
 from src.tools import sms_sender
 from archive import analyzer
+from archive.ingest import IngestHandler, IngestQueue
 
 # Get image directory from env var or fallback
 IMAGE_DIR = os.environ.get("IMAGE_DIR", "/app/shared-images")
 
+# Number of analysis worker threads and seconds between two metric reports
+INGEST_WORKERS = int(os.environ.get("INGEST_WORKERS", "2"))
+STATS_INTERVAL = 30
+
 # create necessary objects
 analyzer_obj = analyzer.Analyzer()
+# the ingest queue waits for files to be fully written instead
+analyzer_obj.read_delay = 0
 sms = sms_sender.SmsSender()
-observer = analyzer.ObserverWrapper(analyzer_obj, sms, image_dir=IMAGE_DIR)
 
-# keep track of what's been processed already
-processed_files = set()
+# every new image goes through this queue exactly once; the processed state
+# survives restarts
+ingest = IngestQueue(
+    analyzer_obj,
+    state_path=os.path.join(IMAGE_DIR, "processed", ".ingest_state.json"),
+    workers=INGEST_WORKERS)
+observer = analyzer.ObserverWrapper(analyzer_obj, sms, image_dir=IMAGE_DIR,
+                                    event_handler=IngestHandler(ingest))
 
 
 def run_headless():
     print(f"[HEADLESS] Starting headless analysis in {IMAGE_DIR}")
+    os.makedirs(os.path.join(IMAGE_DIR, "processed"), exist_ok=True)
+
+    ingest.start()
 
-    # Start the watchdog observer for real-time folder changes
+    # Start the watchdog observer for real-time folder changes, then queue
+    # whatever arrived while the service was down
     observer.start_monitoring()
+    ingest.scan(IMAGE_DIR)
 
     try:
         while True:
-            # get all image files (jpg/png)
-            image_files = sorted(
-                glob.glob(os.path.join(IMAGE_DIR, "*.png")) +
-                glob.glob(os.path.join(IMAGE_DIR, "*.jpg"))
-            )
-
-            for img_path in image_files:
-                # Skip already processed
-                if img_path in processed_files:
-                    continue
-                if "_processed" in img_path:
-                    continue  # Don't analyze already processed images
-
-                print(f"[HEADLESS] Processing new image: {img_path}")
-
-                # Use analyzer directly – handles saving and DB logging
-                analyzer_obj.combin(img_path, sms)
-
-                # Track it as done
-                processed_files.add(img_path)
-
-            time.sleep(1)
+            time.sleep(STATS_INTERVAL)
+            print(f"[HEADLESS] {ingest.stats()}")
+            sink = src.analysis.db.get_sink()
+            if sink:
+                print(f"[DB] {sink.stats()}")
 
     except KeyboardInterrupt:
         print("[HEADLESS] Stopping...")
+    finally:
         observer.stop()
+        ingest.stop()
+        analyzer_obj.close()
+        sink = src.analysis.db.get_sink()
+        if sink:
+            sink.close()
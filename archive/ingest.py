@@ -0,0 +1,296 @@
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+
+from watchdog.events import FileSystemEventHandler
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.tif', '.tiff')
+
+
+class IngestQueue:
+    """
+    Single entry point for new images in the headless runner. Paths are
+    de-duplicated, each file is analyzed once by a pool of worker threads
+    after its size has stopped changing, and the processed state is saved
+    to `state_path` so a restart only picks up files not analyzed yet.
+
+    A file is identified by its path, inode change time (ctime) and size.
+    Unlike the modification time, the ctime can't be set by cp -p, rsync or
+    unzip, so a recording copied in with its original times is still new.
+    Files with a ctime up to `watermark_ns` are processed; the watermark
+    stays below the files still queued and `late_events` seconds behind the
+    clock, so only the files processed above it are kept in memory. A file
+    that fails is retried `retries` times; files that still fail are saved
+    apart and tried again on the next restart.
+    """
+
+    def __init__(self, analyzer, state_path=None, workers=2, batch_size=8,
+                 settle_interval=0.05, settle_timeout=5.0, retries=3,
+                 retry_delay=2.0, late_events=60.0):
+        """
+        :param analyzer: `archive.analyzer.Analyzer` whose `combin_batch`
+                         analyzes the images
+        :param state_path: JSON file where the processed state is kept
+        :param workers: number of worker threads
+        :param batch_size: max number of queued images analyzed together
+        :param settle_interval: seconds between two size checks of a file
+        :param settle_timeout: seconds after which a file that keeps growing
+                               is analyzed anyway
+        :param retries: times a file that failed is queued again
+        :param retry_delay: seconds before the first retry, doubled after
+                            each failure
+        :param late_events: seconds a file event may arrive after the file
+                            was written
+        """
+        self.analyzer = analyzer
+        self.state_path = state_path
+        self.workers = workers
+        self.batch_size = batch_size
+        self.settle_interval = settle_interval
+        self.settle_timeout = settle_timeout
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.late_events = late_events
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        # path -> ctime_ns of files queued, in-flight or waiting for a retry
+        self._pending = {}
+        self._attempts = {}  # path -> failed attempts
+        # path -> (ctime_ns, size) of files processed above the watermark
+        self.watermark_ns, self._done, self.failed_paths = self._load_state()
+
+        self._threads = []
+        self._stop_event = threading.Event()
+
+        # Metrics
+        self.start_time = time.time()
+        self.processed = 0
+        self.failed = 0
+        self.retried = 0
+        self.duplicates = 0
+        self._recent = deque(maxlen=1000)  # (finish time, latency) per image
+
+    ### STATE ###
+
+    @staticmethod
+    def _signature(path):
+        st = os.stat(path)
+        return st.st_ctime_ns, st.st_size
+
+    def _load_state(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return 0, {}, set()
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+            done = {path: (int(ctime_ns), int(size))
+                    for path, (ctime_ns, size) in state["done"].items()}
+            return int(state["watermark_ns"]), done, set(state["failed"])
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"[INGEST] Could not read state {self.state_path}, "
+                  f"starting over: {e}")
+            return 0, {}, set()
+
+    def _save_state(self):
+        """Writes the state atomically, caller holds the lock."""
+        if not self.state_path:
+            return
+        tmp_path = self.state_path + ".tmp"
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump({"watermark_ns": self.watermark_ns,
+                           "done": self._done,
+                           "failed": sorted(self.failed_paths)}, f)
+            os.replace(tmp_path, self.state_path)
+        except OSError as e:
+            print(f"[INGEST] Could not save state {self.state_path}: {e}")
+
+    def _advance_watermark(self):
+        """
+        Moves the watermark up to the oldest file still queued and forgets
+        the processed files below it, caller holds the lock.
+        """
+        limit = time.time_ns() - int(self.late_events * 1e9)
+        if self._pending:
+            limit = min(limit, min(self._pending.values()) - 1)
+        if limit <= self.watermark_ns:
+            return
+        self.watermark_ns = limit
+        self._done = {p: sig for p, sig in self._done.items()
+                      if sig[0] > limit}
+
+    ### QUEUE ###
+
+    @staticmethod
+    def is_image(path):
+        name = os.path.basename(path).lower()
+        return name.endswith(IMAGE_EXTENSIONS) and "_processed" not in name
+
+    def submit(self, path):
+        """Queues `path` unless it is not an image or was already seen."""
+        if not self.is_image(path):
+            return False
+        try:
+            signature = self._signature(path)
+        except OSError:
+            return False
+
+        with self._lock:
+            if path in self._pending or self._done.get(path) == signature \
+                    or (signature[0] <= self.watermark_ns
+                        and path not in self.failed_paths):
+                self.duplicates += 1
+                return False
+            self._pending[path] = signature[0]
+        self._queue.put((path, time.time()))
+        return True
+
+    def scan(self, directory):
+        """Queues the images of `directory` not processed yet, oldest first."""
+        with os.scandir(directory) as it:
+            entries = sorted((e for e in it if e.is_file()),
+                             key=lambda e: e.stat().st_ctime_ns)
+        queued = sum(self.submit(e.path) for e in entries)
+        print(f"[INGEST] {queued} unprocessed images found in {directory}")
+
+    def _retry(self, path, queued_at):
+        """Queues `path` again later, or gives up on it; holds the lock."""
+        attempts = self._attempts.get(path, 0) + 1
+        if attempts > self.retries:
+            self._attempts.pop(path, None)
+            self._pending.pop(path, None)
+            self.failed_paths.add(path)
+            self.failed += 1
+            return
+        self._attempts[path] = attempts
+        self.retried += 1
+        timer = threading.Timer(self.retry_delay * 2 ** (attempts - 1),
+                                self._queue.put, ((path, queued_at),))
+        timer.daemon = True
+        timer.start()
+
+    def _wait_until_written(self, path):
+        """Waits until the size of `path` stops changing."""
+        deadline = time.time() + self.settle_timeout
+        last_size = -1
+        while time.time() < deadline:
+            try:
+                size = os.stat(path).st_size
+            except OSError:
+                return False
+            if size and size == last_size:
+                return True
+            last_size = size
+            time.sleep(self.settle_interval)
+        return os.path.exists(path)
+
+    def _next_batch(self):
+        try:
+            batch = [self._queue.get(timeout=0.5)]
+        except queue.Empty:
+            return []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        while not self._stop_event.is_set():
+            batch = self._next_batch()
+            if not batch:
+                continue
+
+            ready = [(p, t) for p, t in batch if self._wait_until_written(p)]
+            try:
+                verdicts = self.analyzer.combin_batch(
+                    [p for p, _ in ready]) if ready else []
+            except Exception as e:
+                print(f"[INGEST] Error analyzing batch: {e}")
+                verdicts = [None] * len(ready)
+            # None marks a file that could not be analyzed
+            analyzed = dict(zip(ready, (v is not None for v in verdicts)))
+
+            now = time.time()
+            with self._lock:
+                for path, queued_at in batch:
+                    if (path, queued_at) not in analyzed:
+                        # deleted before it was fully written
+                        self._pending.pop(path, None)
+                        self.failed += 1
+                        continue
+                    if not analyzed[(path, queued_at)]:
+                        self._retry(path, queued_at)
+                        continue
+                    self._pending.pop(path, None)
+                    self._attempts.pop(path, None)
+                    self.failed_paths.discard(path)
+                    try:
+                        # the version that was analyzed, once settled
+                        self._done[path] = self._signature(path)
+                    except OSError:
+                        pass
+                    self.processed += 1
+                    self._recent.append((now, now - queued_at))
+                self._advance_watermark()
+                self._save_state()
+
+    ### CONTROL ###
+
+    def start(self):
+        with self._lock:
+            # failed files deleted since the last run
+            self.failed_paths = {p for p in self.failed_paths
+                                 if os.path.exists(p)}
+        for i in range(self.workers):
+            t = threading.Thread(target=self._worker, name=f"ingest-{i}",
+                                 daemon=True)
+            t.start()
+            self._threads.append(t)
+
+    def stop(self):
+        self._stop_event.set()
+        for t in self._threads:
+            t.join()
+        self._threads.clear()
+        with self._lock:
+            self._save_state()
+
+    def stats(self):
+        """Throughput and backlog metrics."""
+        now = time.time()
+        with self._lock:
+            last_minute = [lat for t, lat in self._recent if now - t <= 60]
+            return {
+                "processed": self.processed,
+                "failed": self.failed,
+                "retried": self.retried,
+                "duplicates": self.duplicates,
+                "backlog": len(self._pending),
+                "images_per_s": len(last_minute) / min(
+                    60.0, max(now - self.start_time, 1e-9)),
+                "mean_latency_s": sum(last_minute) / len(last_minute)
+                if last_minute else 0.0,
+            }
+
+
+class IngestHandler(FileSystemEventHandler):
+    """Forwards watchdog file events to an `IngestQueue`."""
+
+    def __init__(self, ingest: IngestQueue):
+        super().__init__()
+        self.ingest = ingest
+
+    def on_created(self, event):
+        if not event.is_directory:
+            self.ingest.submit(event.src_path)
+
+    def on_moved(self, event):
+        # images written to a temporary name then renamed into place
+        if not event.is_directory:
+            self.ingest.submit(event.dest_path)
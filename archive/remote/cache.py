@@ -0,0 +1,79 @@
+"""
+Content-addressed cache for the analysis server.
+
+Frames are identified by ``protocol.frame_digest`` of their pixels, so a
+re-submitted recording, or one sharing frames with an earlier upload, is
+answered from here instead of being re-analyzed. Two kinds of entries are
+stored, both keyed by a digest of the analysis parameters:
+
+* the count for a (reference frame, frame) pair, ``pair_key``
+* the final result of a whole recording, ``recording_key``
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+
+def params_digest(params):
+    raw = json.dumps(params, sort_keys=True).encode()
+    return hashlib.blake2b(raw, digest_size=8).hexdigest()
+
+
+def pair_key(params, reference, frame):
+    return f"pair:{params}:{reference}:{frame}"
+
+
+def recording_key(params, hashes):
+    digest = hashlib.blake2b(digest_size=16)
+    for frame_hash in hashes:
+        digest.update(frame_hash.encode())
+    return f"rec:{params}:{digest.hexdigest()}"
+
+
+class ResultCache:
+    """Thread-safe LRU of JSON-serializable values, capped at ``max_bytes``."""
+
+    def __init__(self, max_bytes=64 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, value):
+        size = len(key) + len(json.dumps(value))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "bytes": self._bytes,
+                    "max_bytes": self.max_bytes, "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions}
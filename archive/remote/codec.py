@@ -0,0 +1,81 @@
+"""
+Compact frame encodings for the upload stream (see protocol.py).
+
+A recording is sent as one keyframe followed by frame-to-frame deltas.
+Consecutive plant frames differ by little more than sensor noise, so after
+zigzag-mapping the signed deltas and splitting the bytes into planes, the
+high byte plane is almost all zeros and zlib compresses it away.
+
+    {"encoding": "key",   "shape": [h, w], "dtype": "uint16"}  frame
+    {"encoding": "delta", "shape": [h, w], "dtype": "int16"}   frame - previous
+    {"encoding": "tiff"}                                       TIFF file
+"""
+import math
+import zlib
+
+import numpy as np
+
+COMPRESSION_LEVEL = 3
+# A 32-bit delta of the largest frame the cameras produce (1440x1080)
+MAX_FRAME_BYTES = 1440 * 1080 * 4
+
+
+def _shuffle(array):
+    """Bytes of ``array`` grouped by significance (all low bytes first)."""
+    array = np.ascontiguousarray(array)
+    planes = array.view(np.uint8).reshape(-1, array.itemsize).T
+    return zlib.compress(planes.tobytes(), COMPRESSION_LEVEL)
+
+
+def _unshuffle(payload, dtype, shape):
+    """
+    Inverse of `_shuffle`. Inflates at most the size of the announced frame,
+    so a small payload can't expand into gigabytes.
+    """
+    dtype = np.dtype(dtype)
+    if not all(isinstance(d, int) and d > 0 for d in shape):
+        raise ValueError(f"invalid frame shape {list(shape)}")
+    expected = math.prod(shape) * dtype.itemsize
+    if expected > MAX_FRAME_BYTES:
+        raise ValueError(f"frame of {expected} bytes is too large")
+
+    inflater = zlib.decompressobj()
+    try:
+        raw = inflater.decompress(payload, expected)
+    except zlib.error as e:
+        raise ValueError(f"corrupt frame payload: {e}") from e
+    if len(raw) != expected or inflater.unconsumed_tail or not inflater.eof:
+        raise ValueError(f"frame payload does not inflate to {expected} "
+                         f"bytes")
+    planes = np.frombuffer(raw, np.uint8)
+    return planes.reshape(dtype.itemsize, -1).T.copy().view(dtype).reshape(shape)
+
+
+def encode_keyframe(image):
+    header = {"encoding": "key", "shape": list(image.shape),
+              "dtype": image.dtype.name}
+    return header, _shuffle(image)
+
+
+def encode_delta(image, reference):
+    """Lossless ``image - reference``, zigzag mapped so small is positive."""
+    delta = image.astype(np.int32) - reference
+    if -2 ** 15 <= delta.min() and delta.max() < 2 ** 15:
+        delta = delta.astype(np.int16)
+    bits = delta.itemsize * 8
+    zigzag = (delta << 1) ^ (delta >> (bits - 1))
+    header = {"encoding": "delta", "shape": list(image.shape),
+              "dtype": delta.dtype.name}
+    return header, _shuffle(zigzag.view(f"u{delta.itemsize}"))
+
+
+def decode_keyframe(header, payload):
+    return _unshuffle(payload, header["dtype"], tuple(header["shape"]))
+
+
+def decode_delta(header, payload):
+    """The signed difference to the previous frame, as int32."""
+    dtype = np.dtype(header["dtype"])
+    zigzag = _unshuffle(payload, f"u{dtype.itemsize}",
+                        tuple(header["shape"])).astype(np.int64)
+    return ((zigzag >> 1) ^ -(zigzag & 1)).astype(np.int32)
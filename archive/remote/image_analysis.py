@@ -3,6 +3,10 @@ import cv2
 import numpy as np
 import matplotlib.pyplot as plt
 
+from cache import pair_key, params_digest, recording_key
+from codec import decode_delta, decode_keyframe
+from protocol import frame_digest
+
 # Image dimensions
 IMAGE_WIDTH = 1280
 IMAGE_HEIGHT = 1024
@@ -61,6 +65,218 @@ def detect_conditions(pixel_counts_prev):
     
     return result
 
+
+class MissingFrame(Exception):
+    """A frame was sent by hash only but its counts are not cached."""
+
+    def __init__(self, index):
+        super().__init__(f"frame {index} is needed")
+        self.index = index
+
+
+class IncrementalAnalysis:
+    """
+    Frame-by-frame version of ``image_analysis`` for streamed recordings.
+    Only the background and the previous frame are kept, so memory does not
+    grow with the length of the recording. The parameters default to this
+    module's constants; streaming clients send their own so the verdict
+    matches their local analysis.
+
+    With a ``cache`` (see cache.py) every count is stored under the hashes of
+    the two frames, and frames whose counts are already known can be added
+    by hash only with ``add_known``.
+    """
+
+    def __init__(self, min_intensity=MIN_INTENSITY, max_intensity=MAX_INTENSITY,
+                 max_frames=MAX_FRAMES, threshold_nothing=THRESHOLD_NOTHING,
+                 threshold_injection=THRESHOLD_INJECTION,
+                 width=IMAGE_WIDTH, height=IMAGE_HEIGHT, cache=None):
+        self.min_intensity = min_intensity
+        self.max_intensity = max_intensity
+        self.max_frames = max_frames
+        self.threshold_nothing = threshold_nothing
+        self.threshold_injection = threshold_injection
+        self.shape = (height, width)
+        self.cache = cache
+        self.params = params_digest([min_intensity, max_intensity, max_frames,
+                                     threshold_nothing, threshold_injection,
+                                     width, height])
+
+        self.background = None
+        self.prev = None
+        self.offset = None
+        self.hashes = []
+        self.n_frames = 0
+        self.pixel_counts_vs_prev = []
+        self.pixel_counts_vs_bg = []
+
+    def _in_range(self, difference):
+        """Count of a signed difference, saturated at 0 like cv2.subtract."""
+        in_range = difference <= self.max_intensity
+        if self.min_intensity > 0:
+            in_range &= difference >= self.min_intensity
+        return int(np.count_nonzero(in_range))
+
+    def _subtract(self, current, reference, index, reference_index):
+        if reference is None:
+            raise MissingFrame(reference_index)
+        if current is None:
+            raise MissingFrame(index)
+        difference = cv2.subtract(current, reference)
+        return int(np.count_nonzero((difference >= self.min_intensity) &
+                                    (difference <= self.max_intensity)))
+
+    def _count(self, index, reference_index, compute):
+        key = None
+        if self.cache is not None:
+            key = pair_key(self.params, self.hashes[reference_index],
+                           self.hashes[index])
+            count = self.cache.get(key)
+            if count is not None:
+                return count
+        count = compute()
+        if key:
+            self.cache.put(key, count)
+        return count
+
+    def _offset(self):
+        """Previous frame minus background, as int32, if it can be known."""
+        if self.offset is not None:
+            return self.offset
+        if self.prev is not None and self.background is not None:
+            return self.prev.astype(np.int32) - self.background
+        return None
+
+    def _add(self, frame_hash, image=None, delta=None):
+        index = self.n_frames
+        self.hashes.append(frame_hash)
+        self.n_frames += 1
+
+        if index == 0:
+            if delta is not None:
+                raise ValueError("the first frame can't be a delta")
+            self.background = image
+            self.prev = image
+            return
+
+        # A delta gives the vs-prev count directly and, added to the running
+        # offset from the background, the vs-bg count
+        offset = None
+        if delta is not None and (offset := self._offset()) is not None:
+            offset = offset + delta
+
+        def vs_prev():
+            if delta is not None:
+                return self._in_range(delta)
+            return self._subtract(image, self.prev, index, index - 1)
+
+        def vs_bg():
+            if offset is not None:
+                return self._in_range(offset)
+            return self._subtract(image, self.background, index, 0)
+
+        self.pixel_counts_vs_prev.append(self._count(index, index - 1, vs_prev))
+        self.pixel_counts_vs_bg.append(self._count(index, 0, vs_bg))
+        self.prev = image
+        self.offset = offset
+
+    def add_frame(self, image):
+        """Add the next frame. Frames that can't be analyzed are skipped."""
+        if image is None or image.shape != self.shape:
+            return
+        image = np.ascontiguousarray(image)
+        self._add(frame_digest(image.data, image.shape, image.dtype.name),
+                  image=image)
+
+    def add_delta(self, delta, frame_hash=None):
+        """
+        Add the next frame as its difference to the previous one. The frame
+        is rebuilt and hashed here, so counts are never cached under a hash
+        sent by the client; ``frame_hash``, if given, must match.
+        """
+        if delta.shape != self.shape:
+            return
+        if self.n_frames == 0:
+            raise ValueError("the first frame can't be a delta")
+        if self.prev is None:
+            # sent by hash only, there is nothing to apply the delta to
+            raise MissingFrame(self.n_frames - 1)
+
+        frame = self.prev.astype(np.int32) + delta
+        limits = np.iinfo(self.prev.dtype)
+        if frame.min() < limits.min or frame.max() > limits.max:
+            raise ValueError(f"frame {self.n_frames} is out of range")
+        frame = frame.astype(self.prev.dtype)
+        digest = frame_digest(frame.data, frame.shape, frame.dtype.name)
+        if frame_hash is not None and frame_hash != digest:
+            raise ValueError(f"frame {self.n_frames} does not match its hash")
+        self._add(digest, image=frame, delta=delta)
+
+    def add_known(self, frame_hash):
+        """Add the next frame by hash, without its pixels."""
+        self._add(frame_hash)
+
+    def add_message(self, header, payload):
+        """Add a "frame" or "hash" message of an upload stream."""
+        if header["type"] == "hash":
+            self.add_known(header["hash"])
+        elif header.get("encoding", "tiff") == "tiff":
+            self.add_encoded(payload)
+        elif header["encoding"] == "key":
+            self.add_frame(decode_keyframe(header, payload))
+        elif header["encoding"] == "delta":
+            self.add_delta(decode_delta(header, payload), header.get("hash"))
+        else:
+            raise ValueError(f"unknown encoding {header['encoding']}")
+
+    def add_encoded(self, data):
+        """Decode an image file (TIFF/PNG) and add it."""
+        image = cv2.imdecode(np.frombuffer(data, np.uint8),
+                             cv2.IMREAD_ANYDEPTH | cv2.IMREAD_GRAYSCALE)
+        self.add_frame(image)
+
+    def needed_frames(self, hashes):
+        """Indices of the frames that must be uploaded to analyze ``hashes``."""
+        needed = set()
+        for i in range(1, len(hashes)):
+            for reference in (i - 1, 0):
+                if pair_key(self.params, hashes[reference],
+                            hashes[i]) not in self.cache:
+                    needed.update((reference, i))
+        if len(hashes) < 2:
+            needed.update(range(len(hashes)))
+        return sorted(needed)
+
+    def recording_key(self, hashes=None):
+        return recording_key(self.params,
+                             self.hashes if hashes is None else hashes)
+
+    def verdict(self):
+        if self.n_frames == 0:
+            return "No images found"
+        if self.n_frames < 2:
+            return "Insufficient images"
+        if not self.pixel_counts_vs_prev:
+            return "No frames for detection"
+
+        result = "Nothing happened"
+        for count in self.pixel_counts_vs_prev[:self.max_frames - 1]:
+            if count > self.threshold_injection:
+                return "Burn"
+            elif self.threshold_nothing <= count <= self.threshold_injection:
+                result = "Current injection"
+        return result
+
+    def result(self):
+        """Verdict and counts, cached under the recording's hash."""
+        result = {"result": self.verdict(), "frames": self.n_frames,
+                  "pixel_counts_vs_prev": self.pixel_counts_vs_prev,
+                  "pixel_counts_vs_bg": self.pixel_counts_vs_bg}
+        if self.cache is not None and self.n_frames:
+            self.cache.put(self.recording_key(), result)
+        return result
+
+
 def image_analysis(screenshot_directory):
     """
     Analyze images in the specified directory:
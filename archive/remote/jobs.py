@@ -0,0 +1,248 @@
+"""
+Bounded job queue for the analysis server.
+
+Uploaded zips are written to a temporary file by the request handler and
+analyzed in a pool of worker processes, so a slow analysis never blocks the
+web threads and at most ``max_pending`` recordings are waiting at any time.
+Upload streams are analyzed frame by frame by a pool of threads sharing the
+server's cache, either from a saved file or while the request body arrives.
+"""
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import protocol
+from image_analysis import image_analysis, IncrementalAnalysis
+
+# Finished jobs are kept this long (s) so clients can still poll the result
+JOB_TTL = 600
+
+
+class QueueFull(Exception):
+    pass
+
+
+def analyze_zip(zip_path):
+    """Worker: unzip an uploaded recording and run the folder analysis."""
+    started = time.time()
+    tmp_dir = os.path.dirname(zip_path)
+    try:
+        with zipfile.ZipFile(zip_path, "r") as zip_ref:
+            zip_ref.extractall(tmp_dir)
+        os.remove(zip_path)
+        return {"result": image_analysis(tmp_dir), "started": started}
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+
+def analyze_stream(stream, cache=None):
+    """
+    Stream worker: run the incremental analysis over the messages of a
+    file-like upload ``stream``. Frames sent by hash only are looked up in
+    ``cache`` and raise ``MissingFrame`` when they are not there.
+    """
+    started = time.time()
+    analysis = None
+    for header, payload in protocol.iter_messages(stream):
+        kind = header.get("type")
+        if kind == "start":
+            params = header.get("params", {})
+            if not isinstance(params, dict):
+                raise TypeError("params must be an object")
+            analysis = IncrementalAnalysis(**params, cache=cache)
+        elif kind == "end":
+            break
+        elif analysis is None:
+            raise protocol.ProtocolError("stream did not start")
+        elif kind in ("frame", "hash"):
+            analysis.add_message(header, payload)
+
+    if analysis is None:
+        raise protocol.ProtocolError("stream did not start")
+    return dict(analysis.result(), started=started)
+
+
+def analyze_stream_file(stream_path, cache=None):
+    """Stream worker: analyze an upload stream saved by ``JobQueue.submit``."""
+    try:
+        with open(stream_path, "rb") as f:
+            return analyze_stream(f, cache)
+    finally:
+        shutil.rmtree(os.path.dirname(stream_path), ignore_errors=True)
+
+
+class Job:
+    def __init__(self, kind):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.submitted = time.time()
+        self.finished = None
+        self.future = None
+        self.output = None
+        self.error = None
+        self.exception = None
+
+    @property
+    def status(self):
+        if self.finished is not None:
+            return "failed" if self.error else "done"
+        return "running" if self.future.running() else "queued"
+
+    def to_dict(self):
+        info = {"id": self.id, "kind": self.kind, "status": self.status,
+                "submitted": self.submitted}
+        if self.finished is not None:
+            started = (self.output or {}).get("started", self.submitted)
+            info["queue_s"] = round(started - self.submitted, 3)
+            info["run_s"] = round(self.finished - started, 3)
+            info["total_s"] = round(self.finished - self.submitted, 3)
+        if self.output:
+            info.update({k: v for k, v in self.output.items()
+                         if k != "started"})
+        if self.error:
+            info["error"] = self.error
+        return info
+
+
+class JobQueue:
+    """
+    ``submit`` saves an upload and hands it to a worker pool,
+    ``submit_stream`` analyzes a stream as it is read. Both raise
+    ``QueueFull`` when ``max_pending`` jobs are already queued or running.
+    """
+
+    def __init__(self, workers=None, max_pending=32, cache=None):
+        self.workers = workers or os.cpu_count()
+        self.max_pending = max_pending
+        self.cache = cache
+        self._pool = ProcessPoolExecutor(self.workers)
+        # streams need the cache for frames sent by hash; OpenCV and NumPy
+        # release the GIL for the pixel work
+        self._stream_pool = ThreadPoolExecutor(self.workers,
+                                               thread_name_prefix="stream")
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._pending = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+        self._run_total = 0.0
+        self._queue_total = 0.0
+
+    def _reserve(self):
+        with self._lock:
+            self._expire()
+            if self._pending >= self.max_pending:
+                self._rejected += 1
+                raise QueueFull(f"{self._pending} jobs pending")
+            self._pending += 1
+
+    def _release(self):
+        with self._lock:
+            self._pending -= 1
+
+    def _track(self, job, future):
+        job.future = future
+        with self._lock:
+            self._jobs[job.id] = job
+        future.add_done_callback(lambda f, job=job: self._done(job, f))
+        return job
+
+    def submit(self, kind, save):
+        """
+        Queue a ``"zip"`` or ``"stream"`` job. ``save(path)`` writes the
+        upload to ``path`` in a fresh temporary directory.
+        """
+        self._reserve()
+        tmp_dir = tempfile.mkdtemp()
+        path = os.path.join(tmp_dir, "upload")
+        job = Job(kind)
+        try:
+            save(path)
+            if kind == "zip":
+                future = self._pool.submit(analyze_zip, path)
+            else:
+                future = self._stream_pool.submit(analyze_stream_file, path,
+                                                  self.cache)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            self._release()
+            raise
+        return self._track(job, future)
+
+    def submit_stream(self, stream):
+        """
+        Queue the analysis of an upload ``stream`` read while it arrives,
+        such as a request body. The stream must stay open until the job
+        finishes.
+        """
+        self._reserve()
+        job = Job("stream")
+        try:
+            future = self._stream_pool.submit(analyze_stream, stream,
+                                              self.cache)
+        except BaseException:
+            self._release()
+            raise
+        return self._track(job, future)
+
+    def _done(self, job, future):
+        with self._lock:
+            job.finished = time.time()
+            try:
+                job.output = future.result()
+                self._completed += 1
+                started = job.output["started"]
+                self._queue_total += started - job.submitted
+                self._run_total += job.finished - started
+            except Exception as e:
+                job.exception = e
+                job.error = str(e) or type(e).__name__
+                self._failed += 1
+            self._pending -= 1
+            self._changed.notify_all()
+
+    def _expire(self):
+        now = time.time()
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job.finished and now - job.finished > JOB_TTL]:
+            del self._jobs[job_id]
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def wait(self, job, timeout=None):
+        """Block until ``job`` finishes or ``timeout`` expires."""
+        with self._lock:
+            return self._changed.wait_for(lambda: job.finished is not None,
+                                          timeout)
+
+    def metrics(self):
+        with self._lock:
+            running = sum(1 for job in self._jobs.values()
+                          if job.finished is None and job.future.running())
+            return {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "queue_depth": self._pending - running,
+                "running": running,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected,
+                "mean_queue_s": round(
+                    self._queue_total / self._completed, 3)
+                if self._completed else None,
+                "mean_run_s": round(self._run_total / self._completed, 3)
+                if self._completed else None,
+            }
+
+    def shutdown(self):
+        self._pool.shutdown(cancel_futures=True)
+        self._stream_pool.shutdown(cancel_futures=True)
@@ -0,0 +1,124 @@
+"""
+Load generator for the analysis server.
+
+Simulates N lab stations that each upload synthetic recordings and wait for
+the verdict, then reports throughput, latency percentiles and the server's
+own metrics::
+
+    python load_test.py --url http://localhost:3000 --stations 8 --requests 5
+"""
+import argparse
+import json
+import threading
+import time
+
+import numpy as np
+import requests
+
+import codec
+import protocol
+
+WIDTH = 1440
+HEIGHT = 1080
+BIT_DEPTH = 10
+
+
+def synthetic_recording(frames, burn_at=None, seed=0):
+    """Upload stream of a 10-bit recording: sensor noise plus a burn."""
+    rng = np.random.default_rng(seed)
+    base = rng.normal(300, 20, (HEIGHT, WIDTH))
+    body = [protocol.encode_message({"type": "start", "params": {
+        "min_intensity": 20, "max_intensity": 170,
+        "width": WIDTH, "height": HEIGHT}})]
+    reference = None
+    for i in range(frames):
+        frame = base + rng.normal(0, 3, base.shape)
+        if burn_at is not None and i >= burn_at:
+            frame[:HEIGHT // 4] += 100
+        frame = np.clip(frame, 0, 2 ** BIT_DEPTH - 1).astype(np.uint16)
+        if reference is None:
+            header, payload = codec.encode_keyframe(frame)
+        else:
+            header, payload = codec.encode_delta(frame, reference)
+        header.update(type="frame", index=i, hash=protocol.frame_digest(
+            frame.data, frame.shape, frame.dtype.name))
+        body.append(protocol.encode_message(header, payload))
+        reference = frame
+    body.append(protocol.encode_message({"type": "end"}))
+    return b"".join(body)
+
+
+def station(url, bodies, poll, latencies, errors):
+    session = requests.Session()
+    headers = {"Content-Type": "application/octet-stream"}
+    for body in bodies:
+        start = time.perf_counter()
+        try:
+            resp = session.post(f"{url}/jobs", data=body, headers=headers)
+            if resp.status_code == 503:
+                errors.append("busy")
+                time.sleep(float(resp.headers.get("Retry-After", 1)))
+                continue
+            resp.raise_for_status()
+            job_id = resp.json()["id"]
+
+            if poll:
+                while resp.json()["status"] in ("queued", "running"):
+                    time.sleep(poll)
+                    resp = session.get(f"{url}/jobs/{job_id}")
+                info = resp.json()
+            else:
+                with session.get(f"{url}/jobs/{job_id}/events",
+                                 stream=True) as events:
+                    for line in events.iter_lines():
+                        info = json.loads(line)
+            if info["status"] != "done":
+                errors.append(info.get("error", info["status"]))
+                continue
+            latencies.append(time.perf_counter() - start)
+        except requests.RequestException as e:
+            errors.append(str(e))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--url", default="http://localhost:3000")
+    parser.add_argument("--stations", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=5,
+                        help="recordings uploaded by each station")
+    parser.add_argument("--frames", type=int, default=20)
+    parser.add_argument("--poll", type=float, default=0,
+                        help="poll interval in s, 0 follows /events instead")
+    args = parser.parse_args()
+
+    # a different recording per upload, generated before the clock starts:
+    # the server caches counts by frame hash, so repeating one recording
+    # would only measure cache hits
+    bodies = [[synthetic_recording(args.frames, burn_at=args.frames // 2,
+                                   seed=s * args.requests + i)
+               for i in range(args.requests)] for s in range(args.stations)]
+    size = sum(len(b) for per_station in bodies for b in per_station)
+    print(f"Recordings: {args.stations * args.requests} x {args.frames} "
+          f"frames, {size / 1e6:.1f} MB")
+
+    latencies, errors = [], []
+    threads = [threading.Thread(target=station, args=(
+        args.url, per_station, args.poll, latencies, errors))
+        for per_station in bodies]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    print(f"{len(latencies)} recordings in {elapsed:.1f} s "
+          f"({len(latencies) / elapsed:.2f} req/s), {len(errors)} errors")
+    if latencies:
+        p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+        print(f"latency p50 {p50:.2f} s, p95 {p95:.2f} s, p99 {p99:.2f} s")
+    print(f"server: {requests.get(f'{args.url}/metrics').json()}")
+
+
+if __name__ == "__main__":
+    main()
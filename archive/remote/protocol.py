@@ -0,0 +1,95 @@
+"""
+Framing for the streaming upload between ``remote_image_analysis`` and the
+analysis server.
+
+A stream is a sequence of messages sent in one chunked HTTP request body.
+Every message is a 4-byte big-endian header length, a JSON header, and
+``header["size"]`` bytes of payload::
+
+    {"type": "start", "params": {...}}     analysis parameters
+    {"type": "frame", "index": i, ...}     one frame, encoded as described
+                                           in codec.py
+    {"type": "hash", "index": i, "hash": h}
+                                           frame the server already knows
+    {"type": "end"}                        recording stopped
+
+Frames are identified by ``frame_digest`` of their pixel data, so the same
+frame has the same hash however it was encoded for transport.
+
+The module only depends on the standard library so the client can import it
+without the server's requirements.
+"""
+import hashlib
+import json
+import struct
+
+HEADER = struct.Struct(">I")
+MAX_HEADER_SIZE = 64 * 1024
+# Twice a raw 16-bit 1440x1080 frame, the largest the cameras produce
+MAX_MESSAGE_BYTES = 2 * 1440 * 1080 * 2
+READ_SIZE = 1 << 16
+
+
+class ProtocolError(Exception):
+    pass
+
+
+def frame_digest(data, shape, dtype):
+    """Hash of a frame's raw pixel buffer, its shape and dtype name."""
+    digest = hashlib.blake2b(f"{shape[0]}x{shape[1]}:{dtype}".encode(),
+                             digest_size=16)
+    digest.update(data)
+    return digest.hexdigest()
+
+
+def encode_message(header, payload=b""):
+    """Serialize one message, ``size`` is filled in from the payload."""
+    header = dict(header, size=len(payload))
+    raw = json.dumps(header).encode()
+    return HEADER.pack(len(raw)) + raw + payload
+
+
+def _read_exactly(stream, size):
+    chunks = []
+    remaining = size
+    while remaining:
+        chunk = stream.read(min(remaining, READ_SIZE))
+        if not chunk:
+            break
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    return b"".join(chunks)
+
+
+def read_message(stream):
+    """
+    Read the next message from a file-like ``stream``.
+    Returns ``(header, payload)``, or ``None`` once the stream is exhausted.
+    """
+    raw = _read_exactly(stream, HEADER.size)
+    if not raw:
+        return None
+    if len(raw) < HEADER.size:
+        raise ProtocolError("truncated message header")
+
+    (length,) = HEADER.unpack(raw)
+    if length > MAX_HEADER_SIZE:
+        raise ProtocolError(f"message header too large ({length} bytes)")
+    raw = _read_exactly(stream, length)
+    if len(raw) < length:
+        raise ProtocolError("truncated message header")
+    header = json.loads(raw)
+
+    size = header.get("size", 0)
+    if not isinstance(size, int) or not 0 <= size <= MAX_MESSAGE_BYTES:
+        raise ProtocolError(f"invalid payload size for {header.get('type')}"
+                            f" ({size!r} bytes)")
+    payload = _read_exactly(stream, size)
+    if len(payload) < size:
+        raise ProtocolError(f"truncated payload for {header.get('type')}")
+    return header, payload
+
+
+def iter_messages(stream):
+    while (message := read_message(stream)) is not None:
+        yield message
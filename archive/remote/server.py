@@ -1,37 +1,193 @@
-from flask import Flask, request, jsonify
-import tempfile, zipfile, os, shutil
-from image_analysis import image_analysis  # import your existing function
+from flask import Flask, Response, request, jsonify
+import json, os, shutil
+from cache import ResultCache
+from image_analysis import IncrementalAnalysis, MissingFrame  # import your existing function
+from jobs import JobQueue, QueueFull
+import protocol
+
+# "dev" runs the Flask development server, "production" serves with
+# gunicorn; both pass request bodies on as they arrive
+SERVER_MODE = os.getenv("SERVER_MODE", "dev")
+SERVER_THREADS = int(os.getenv("SERVER_THREADS", "16"))
+
+# Analysis processes and the most recordings queued or running at once
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", str(os.cpu_count())))
+MAX_PENDING_JOBS = int(os.getenv("MAX_PENDING_JOBS", "32"))
+RETRY_AFTER = 5     # s, suggested to clients when the queue is full
+EVENT_INTERVAL = 2  # s between two job status events
+
+# Size cap of the per-frame count and verdict cache
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
 
 app = Flask(__name__)
+cache = ResultCache(CACHE_MAX_BYTES)
+job_queue = JobQueue(JOB_WORKERS, MAX_PENDING_JOBS, cache)
+
+def _save_zip(path):
+    request.files["images"].save(path)
+
+
+def _save_stream(path):
+    with open(path, "wb") as f:
+        shutil.copyfileobj(request.stream, f, protocol.READ_SIZE)
+
+
+def _submit():
+    """Queue the upload of the current request, or return an error response."""
+    if "images" in request.files:
+        kind, save = "zip", _save_zip
+    elif request.mimetype == "application/octet-stream":
+        kind, save = "stream", _save_stream
+    else:
+        return None, (jsonify({"error": "No file uploaded"}), 400)
+
+    try:
+        return job_queue.submit(kind, save), None
+    except QueueFull as e:
+        return None, _busy(e)
+
+
+def _busy(error):
+    print(f"[!] Rejected upload from {request.remote_addr}: {error}")
+    return (jsonify({"error": "Server busy, retry later"}), 503,
+            {"Retry-After": str(RETRY_AFTER)})
+
 
 @app.route("/analyze", methods=["POST"])
 def analyze():
     print(f"[*] Received request from {request.remote_addr}")
-    if "images" not in request.files:
-        return jsonify({"error": "No file uploaded"}), 400
-    
-    # Save uploaded zip temporarily
-    tmp_dir = tempfile.mkdtemp()
-    zip_path = os.path.join(tmp_dir, "images.zip")
-    request.files["images"].save(zip_path)
-
-    # Unzip
-    with zipfile.ZipFile(zip_path, "r") as zip_ref:
-        zip_ref.extractall(tmp_dir)
-
-    # Run analysis
+    job, error = _submit()
+    if error:
+        return error
+
+    job_queue.wait(job)
+    info = job.to_dict()
+    if job.error:
+        print(f"[!] Error during analysis: {job.error}")
+        return jsonify({"error": "Analysis failed"}), 500
+    print(f"[+] Analysis result: {info['result']} ({info['total_s']} s)")
+    return jsonify(info)
+
+
+@app.route("/jobs", methods=["POST"])
+def submit_job():
+    job, error = _submit()
+    if error:
+        return error
+    print(f"[*] Queued {job.kind} job {job.id} from {request.remote_addr}")
+    return jsonify(job.to_dict()), 202, {"Location": f"/jobs/{job.id}"}
+
+
+@app.route("/jobs/<job_id>", methods=["GET"])
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job.to_dict())
+
+
+@app.route("/jobs/<job_id>/events", methods=["GET"])
+def job_events(job_id):
+    """One JSON line per update until the job finishes."""
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+
+    def events():
+        yield json.dumps(job.to_dict()) + "\n"
+        while not job_queue.wait(job, EVENT_INTERVAL):
+            yield json.dumps(job.to_dict()) + "\n"
+        yield json.dumps(job.to_dict()) + "\n"
+
+    return Response(events(), mimetype="application/x-ndjson")
+
+
+def _analysis(params):
+    """Analysis parameters sent by a client, with the server's cache."""
+    if not isinstance(params, dict):
+        raise TypeError("params must be an object")
+    return IncrementalAnalysis(**params, cache=cache)
+
+
+@app.route("/hashes", methods=["POST"])
+def hashes():
+    """
+    First step of an upload: the client sends the hashes of its frames and
+    gets back either the cached result or the frames it still has to send.
+    """
+    body = request.get_json(silent=True) or {}
+    frame_hashes = body.get("hashes")
+    if not isinstance(frame_hashes, list):
+        return jsonify({"error": "No hashes"}), 400
     try:
-        # print amount of files extracted
-        num_files = len(os.listdir(tmp_dir))
-        print(f"[*] Running analysis on {num_files} files")
-        result = image_analysis(tmp_dir)
-        print(f"[+] Analysis result: {result}")
-        return jsonify({"result": result})
-    except Exception as e:
-        print(f"[!] Error during analysis: {e}")
+        analysis = _analysis(body.get("params", {}))
+    except TypeError as e:
+        return jsonify({"error": f"Bad params: {e}"}), 400
+
+    result = cache.get(analysis.recording_key(frame_hashes))
+    if result is not None:
+        print(f"[+] Cached result for {len(frame_hashes)} frames")
+        return jsonify(dict(result, cached=True))
+    return jsonify({"missing": analysis.needed_frames(frame_hashes)})
+
+
+@app.route("/stream", methods=["POST"])
+def stream():
+    """
+    Streamed recording: frames are analyzed by a job queue worker as they
+    arrive (see protocol.py) and the verdict is returned as soon as the
+    client ends the stream.
+    """
+    print(f"[*] Stream opened by {request.remote_addr}")
+    try:
+        job = job_queue.submit_stream(request.stream)
+    except QueueFull as e:
+        return _busy(e)
+    job_queue.wait(job)
+
+    error = job.exception
+    if isinstance(error, MissingFrame):
+        # evicted since the client asked /hashes, it has to send everything
+        print(f"[!] Stream needs {error}")
+        return jsonify({"error": str(error), "index": error.index}), 409
+    if isinstance(error, (protocol.ProtocolError, KeyError, TypeError,
+                          ValueError)):
+        print(f"[!] Malformed stream: {error}")
+        return jsonify({"error": "Malformed stream"}), 400
+    if error:
+        print(f"[!] Error during analysis: {job.error}")
         return jsonify({"error": "Analysis failed"}), 500
-    finally:
-        shutil.rmtree(tmp_dir)
+
+    info = job.to_dict()
+    print(f"[+] Stream result after {info['frames']} frames: "
+          f"{info['result']}")
+    return jsonify(info)
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    return jsonify(dict(job_queue.metrics(), cache=cache.stats()))
+
 
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=3000)
+    if SERVER_MODE == "production":
+        from gunicorn.app.base import BaseApplication
+
+        class Server(BaseApplication):
+            # One process, which holds the job queue and the cache. Threaded
+            # workers hand the request body over unbuffered, which /stream
+            # relies on, unlike waitress which reads it all first.
+            def load_config(self):
+                self.cfg.set("bind", "0.0.0.0:3000")
+                self.cfg.set("workers", 1)
+                self.cfg.set("worker_class", "gthread")
+                self.cfg.set("threads", SERVER_THREADS)
+
+            def load(self):
+                return app
+
+        print(f"[*] Serving with {SERVER_THREADS} threads, "
+              f"{JOB_WORKERS} analysis workers")
+        Server().run()
+    else:
+        app.run(host="0.0.0.0", port=3000, threaded=True)
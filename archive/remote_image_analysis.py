@@ -1,29 +1,80 @@
-import os, io, zipfile, requests
+import os, requests
+import queue
+import threading
+from pathlib import Path
 
-REDCLOUD_ENDPOINT = "http://128.84.40.199:32000/analyze"
+import cv2
+import numpy as np
 
+from archive.remote import codec, protocol
 
-def remote_image_analysis(directory: str, server_url=REDCLOUD_ENDPOINT):
-    print(f"[INFO] Preparing to send images from directory: {directory}")
+REDCLOUD_SERVER = "http://128.84.40.199:32000"
 
-    # Pack images into a zip
-    zip_buffer = io.BytesIO()
-    with zipfile.ZipFile(zip_buffer, "w") as zipf:
-        for fname in os.listdir(directory):
-            fpath = os.path.join(directory, fname)
-            if os.path.isfile(fpath):
-                print(f"[DEBUG] Adding file to archive: {fpath}")
-                zipf.write(fpath, arcname=fname)
+# Frames waiting to be uploaded by a RemoteStream
+MAX_QUEUED_FRAMES = 16
+CONNECT_TIMEOUT = 5
 
-    zip_buffer.seek(0)
-    print(
-        f"[INFO] Finished zipping images. Size = {len(zip_buffer.getvalue())/1024:.2f} KB"
-    )
 
-    # Send to server
-    print(f"[INFO] Sending files to {server_url}")
-    files = {"images": ("images.zip", zip_buffer, "application/zip")}
-    resp = requests.post(server_url, files=files)
+def _recording_frames(directory):
+    """TIFF frames of a recording in capture order (``<index>-<stamp>.tiff``)."""
+    names = [f for f in os.listdir(directory) if f.endswith(".tiff")]
+    names.sort(key=lambda name: int(name.split("-")[0]))
+    return [os.path.join(directory, name) for name in names]
+
+
+def _read_frame(path, shape):
+    image = cv2.imread(path, cv2.IMREAD_ANYDEPTH | cv2.IMREAD_GRAYSCALE)
+    if image is None or shape and image.shape != tuple(shape):
+        return None
+    return np.ascontiguousarray(image)
+
+
+def _frame_hash(image):
+    return protocol.frame_digest(image.data, image.shape, image.dtype.name)
+
+
+def remote_image_analysis(directory: str, server_url=REDCLOUD_SERVER,
+                          params=None):
+    """
+    Analyze a saved recording on the server.
+
+    The hashes of the frames are sent first: a recording the server has seen
+    before is answered from its cache, otherwise only the frames it has no
+    cached counts for are uploaded, the others go as hash-only messages.
+    """
+    params = params or {}
+    shape = (params["height"], params["width"]) if "width" in params else None
+    print(f"[INFO] Hashing frames in directory: {directory}")
+    frames, hashes = [], []
+    for path in _recording_frames(directory):
+        image = _read_frame(path, shape)
+        if image is not None:
+            frames.append(path)
+            hashes.append(_frame_hash(image))
+
+    with requests.Session() as session:
+        resp = session.post(f"{server_url}/hashes",
+                            json={"params": params, "hashes": hashes},
+                            timeout=(CONNECT_TIMEOUT, None))
+        resp.raise_for_status()
+        answer = resp.json()
+        if "result" in answer:
+            print(f"[INFO] Cached result: {answer['result']}")
+            return answer["result"]
+
+        missing = set(answer["missing"])
+        for attempt in range(2):
+            print(f"[INFO] Sending {len(missing)} of {len(frames)} frames "
+                  f"to {server_url}")
+            resp = session.post(
+                f"{server_url}/stream",
+                data=_upload_messages(params, frames, hashes, missing),
+                headers={"Content-Type": "application/octet-stream"},
+                timeout=(CONNECT_TIMEOUT, None))
+            # 409: cached counts were evicted in between, send every frame
+            if resp.status_code != 409:
+                break
+            missing = set(range(len(frames)))
 
     print(f"[INFO] Response status code: {resp.status_code}")
     resp.raise_for_status()
@@ -32,3 +83,145 @@ def remote_image_analysis(directory: str, server_url=REDCLOUD_ENDPOINT):
     print(f"[INFO] Received result: {result}")
 
     return result
+
+
+def _frame_message(index, image, reference=None):
+    """A keyframe, or the compressed delta to the previously sent frame."""
+    if reference is None:
+        header, payload = codec.encode_keyframe(image)
+    else:
+        header, payload = codec.encode_delta(image, reference)
+    header.update(type="frame", index=index, hash=_frame_hash(image))
+    return protocol.encode_message(header, payload)
+
+
+def _upload_messages(params, frames, hashes, missing):
+    shape = (params["height"], params["width"]) if "width" in params else None
+    yield protocol.encode_message({"type": "start", "params": params})
+    reference = None
+    for index, (path, frame_hash) in enumerate(zip(frames, hashes)):
+        if index in missing:
+            image = _read_frame(path, shape)
+            # deltas only chain onto the frame just before
+            yield _frame_message(index, image, reference)
+            reference = image
+        else:
+            yield protocol.encode_message(
+                {"type": "hash", "index": index, "hash": frame_hash})
+            reference = None
+    yield protocol.encode_message({"type": "end"})
+
+
+class RemoteStream:
+    """
+    Streams a recording to the server while it is being captured.
+
+    Frames go out over a single chunked POST (see ``archive/remote/protocol.py``)
+    as soon as they are saved, the first as a keyframe and the rest as deltas
+    (``archive/remote/codec.py``), so the server's counts are up to date when
+    the recording stops and ``finish`` only waits for the last few frames.
+
+    ``send_frame`` is called while the frames are being saved and never
+    waits for the network. At most ``max_queued`` frames are held in memory;
+    if the upload falls behind, the stream is given up and ``finish`` sends
+    the saved recording with ``remote_image_analysis`` instead.
+    """
+
+    def __init__(self, params=None, server_url=REDCLOUD_SERVER,
+                 max_queued=MAX_QUEUED_FRAMES):
+        self.server_url = server_url
+        self.params = params or {}
+        self.shape = ((self.params["height"], self.params["width"])
+                      if "width" in self.params else None)
+        self.result = None
+        self.error = None
+        self.directory = None
+        self.frames_sent = 0
+        self.frames_dropped = 0
+        self.bytes_sent = 0
+
+        self._queue = queue.Queue(max_queued)
+        self._session = requests.Session()
+        self._thread = threading.Thread(target=self._upload, daemon=True)
+        self._thread.start()
+
+    def _messages(self):
+        yield protocol.encode_message({"type": "start", "params": self.params})
+        reference = None
+        index = 0
+        while (image := self._queue.get()) is not None:
+            if self.frames_dropped:
+                # the deltas would skip the dropped frames
+                return
+            message = _frame_message(index, image, reference)
+            self.bytes_sent += len(message)
+            yield message
+            reference = image
+            index += 1
+        yield protocol.encode_message({"type": "end"})
+
+    def _upload(self):
+        print(f"[INFO] Streaming frames to {self.server_url}")
+        try:
+            resp = self._session.post(
+                f"{self.server_url}/stream", data=self._messages(),
+                headers={"Content-Type": "application/octet-stream"},
+                timeout=(CONNECT_TIMEOUT, None))
+            resp.raise_for_status()
+            self.result = resp.json().get("result")
+        except Exception as e:
+            print(f"[ERROR] Stream to {self.server_url} failed: {e}")
+            self.error = e
+        finally:
+            self._session.close()
+
+    def _put(self, message):
+        while self._thread.is_alive():
+            try:
+                self._queue.put(message, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def send_frame(self, path, image=None):
+        """
+        Frame listener: queue one saved frame. Anything but TIFFs is ignored.
+        Encoding happens on the upload thread, not the caller's.
+        """
+        if not str(path).endswith(".tiff"):
+            return
+        self.directory = Path(path).parent
+        if self.frames_dropped:
+            self.frames_dropped += 1
+            return
+        if image is None:
+            image = _read_frame(str(path), self.shape)
+        else:
+            image = np.asarray(image)
+            if self.shape and image.shape != self.shape:
+                image = None
+        if image is None:
+            return
+        try:
+            self._queue.put_nowait(image)
+            self.frames_sent += 1
+        except queue.Full:
+            self.frames_dropped += 1
+
+    def finish(self, timeout=None):
+        """End the stream and return the server's verdict."""
+        self._put(None)
+        self._thread.join(timeout)
+        if self.frames_dropped:
+            print(f"[INFO] Upload fell behind, {self.frames_dropped} frames "
+                  f"not streamed; sending the saved recording")
+            return remote_image_analysis(self.directory, self.server_url,
+                                         self.params)
+        if self.error:
+            raise self.error
+        if self._thread.is_alive():
+            raise TimeoutError(f"no result from {self.server_url}")
+        print(f"[INFO] Streamed {self.frames_sent} frames "
+              f"({self.bytes_sent / 1024:.2f} KB), result: {self.result}")
+        return self.result
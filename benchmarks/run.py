@@ -0,0 +1,370 @@
+"""
+End-to-end benchmarks for the capture -> save -> analyze -> notify path.
+
+Runs headless with the simulated camera (``src.tools.sim_camera``) and writes
+the results to ``benchmarks/results/<timestamp>_<commit>.json`` so runs can be
+compared across commits.
+
+Usage (from the repository root):
+    python -m benchmarks.run                    # 100 and 1000 frames
+    python -m benchmarks.run --sizes 100,1000,10000
+    python -m benchmarks.run --compare benchmarks/results/<old>.json
+
+Synthetic recordings are generated once with a fixed seed and kept in
+``benchmarks/data/``. Frames are full 1440x1080 16-bit TIFFs (~3 MB each),
+so the 10 000-frame recording needs ~30 GB of disk space.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import shutil
+import subprocess
+import sys
+import threading
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+try:
+    import resource
+except ModuleNotFoundError:
+    resource = None  # Windows
+
+_ROOT_PATH = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(_ROOT_PATH))
+# keep the benchmark recordings out of saves/results.db; inherited by the
+# isolated child processes
+os.environ["RESULTS_BACKEND"] = "none"
+
+from src.tools.image_queue import ImageAcquisitionThread, _make_preview
+from src.tools.sim_camera import SENSOR_HEIGHT, SENSOR_WIDTH, BIT_DEPTH, \
+    SimulatedCamera
+
+DATA_PATH = _ROOT_PATH / "benchmarks" / "data"
+RESULTS_PATH = _ROOT_PATH / "benchmarks" / "results"
+
+SIZES = (100, 1000, 10000)
+DEFAULT_SIZES = (100, 1000)
+SEED = 0
+
+# Frame numbers of the injected events, relative to the recording length
+EVENTS = {0.25: "injection", 0.5: "burn"}
+
+DISPLAY_SIZE = (800, 600)  # canvas size used for display conversion
+DISPLAY_FRAMES = 50
+LOGGERNET_RECORDS = 100000
+LOGGERNET_FIELDS = ["SE1", "SE2", "voltage_diff", "BattV"]
+CR6_RATE = 1000  # records/s of the stand-in logger
+CR6_SECONDS = 3
+ACQ_LOGGERS = 40  # stand-in loggers polled at once by the acquisition service
+ACQ_RATE = 100
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              cwd=_ROOT_PATH, check=True, capture_output=True,
+                              text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _peak_rss_mb():
+    """Peak resident set size of this process, ``None`` on Windows."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return rss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _measured(func, *args):
+    """
+    Runs `func(*args)` and returns its result with wall time, peak Python
+    allocation (numpy included) and the peak RSS of the process.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(*args)
+    wall = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "result": result,
+        "wall_s": wall,
+        "peak_alloc_mb": peak / 1024 / 1024,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+def _isolated(func, *args):
+    """Runs `_measured(func, *args)` in a fresh process so RSS is not shared."""
+    ctx = multiprocessing.get_context("spawn")
+    with ctx.Pool(1, maxtasksperchild=1) as pool:
+        return pool.apply(_measured, (func, *args))
+
+
+### RECORDINGS ###
+
+def _make_thread(n_frames):
+    events = {int(n_frames * k): v for k, v in EVENTS.items()}
+    camera = SimulatedCamera(fps=0, events=events, seed=SEED)
+    camera.arm(2)
+    camera.issue_software_trigger()
+    return camera, ImageAcquisitionThread(camera, 1)
+
+
+def _save(thread, images, directory):
+    """Saves `images` through the regular writer and returns the time taken."""
+    q = queue.Queue()
+    for img in images:
+        q.put(img)
+    thread._last_image_queue = q
+    thread.image_dir = directory
+    start = time.perf_counter()
+    thread.save_images(force_save=True)
+    return time.perf_counter() - start
+
+
+def recording(n_frames, chunk=100):
+    """
+    Returns the folder of the synthetic `n_frames` recording, writing it
+    first if needed. Frames are written in chunks of `chunk`, as the
+    acquisition thread does, and the writer throughput is returned.
+    """
+    directory = DATA_PATH / f"sim_{n_frames}"
+    if (directory / "done").exists():
+        return directory, None
+
+    shutil.rmtree(directory, ignore_errors=True)
+    directory.mkdir(parents=True)
+
+    camera, thread = _make_thread(n_frames)
+    written, elapsed = 0, 0.0
+    for start in range(0, n_frames, chunk):
+        images = [Image.fromarray(camera.get_pending_frame_or_null().image_buffer)
+                  for _ in range(min(chunk, n_frames - start))]
+        elapsed += _save(thread, images, directory)
+        written += sum(img.width * img.height * 2 for img in images)
+
+    (directory / "done").touch()
+    return directory, written / 1024 / 1024 / elapsed
+
+
+### BENCHMARKS ###
+
+def bench_writer(n_frames=100):
+    """Writer throughput (TIFF + preview PNG) in MB/s of raw frame data."""
+    camera, thread = _make_thread(n_frames)
+    images = [Image.fromarray(camera.get_pending_frame_or_null().image_buffer)
+              for _ in range(n_frames)]
+    directory = DATA_PATH / "writer"
+    shutil.rmtree(directory, ignore_errors=True)
+    directory.mkdir(parents=True)
+    try:
+        elapsed = _save(thread, images, directory)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    mb = n_frames * SENSOR_WIDTH * SENSOR_HEIGHT * 2 / 1024 / 1024
+    return {"frames": n_frames, "wall_s": elapsed, "mb_per_s": mb / elapsed}
+
+
+def bench_display(n_frames=DISPLAY_FRAMES):
+    """Time per frame of the live-view conversion (bit shift + thumbnail)."""
+    camera, _ = _make_thread(n_frames)
+    images = [Image.fromarray(camera.get_pending_frame_or_null().image_buffer)
+              for _ in range(n_frames)]
+    start = time.perf_counter()
+    for img in images:
+        _make_preview(img, BIT_DEPTH).thumbnail(DISPLAY_SIZE,
+                                               Image.Resampling.LANCZOS)
+    elapsed = time.perf_counter() - start
+    return {"frames": n_frames, "ms_per_frame": elapsed / n_frames * 1000}
+
+
+def _loggernet_payload(n_records):
+    rng = np.random.default_rng(SEED)
+    vals = rng.normal(-500, 50, (n_records, len(LOGGERNET_FIELDS))).round(3)
+    data = {
+        "head": {"fields": [{"name": f} for f in LOGGERNET_FIELDS]},
+        "data": [{"time": f"2025-01-01T00:00:{i / 100:05.2f}", "no": i,
+                  "vals": ["NAN" if i % 997 == 0 else v for v in row]}
+                 for i, row in enumerate(vals.tolist())],
+    }
+    return json.dumps(data)
+
+
+def bench_loggernet(n_records=LOGGERNET_RECORDS):
+    """Records/s through JSON decoding, `parse_data_query` and the buffer."""
+    from src.tools.cr6 import parse_data_query
+    from src.tools.ring_buffer import RingBuffer
+
+    payload = _loggernet_payload(n_records)
+    buffer = RingBuffer(len(LOGGERNET_FIELDS), 12000)
+    start = time.perf_counter()
+    _, records = parse_data_query(json.loads(payload))
+    for i, (_, vals) in enumerate(records):
+        buffer.append(i, vals)
+    elapsed = time.perf_counter() - start
+    return {"records": n_records, "records_per_s": n_records / elapsed}
+
+
+def bench_cr6_polling(rate=CR6_RATE, seconds=CR6_SECONDS):
+    """Capture from the stand-in CR6 through `CR6Client` for a few seconds."""
+    from src.tools.cr6 import CR6Client
+    from src.tools.loggernet_live import POLL_INTERVAL
+    from src.tools.mock_cr6 import MockCR6
+
+    with MockCR6(rate) as logger:
+        client = CR6Client(logger.url)
+        numbers = []
+        start = time.perf_counter()
+        while time.perf_counter() - start < seconds:
+            numbers.extend(record.no for record in client.poll())
+            time.sleep(POLL_INTERVAL)
+        elapsed = time.perf_counter() - start
+        client.close()
+
+    lost = numbers[-1] - numbers[0] + 1 - len(numbers) if numbers else 0
+    return {"logger_rate": rate, "records": len(numbers), "lost": lost,
+            "requests": client.requests,
+            "records_per_request": len(numbers) / max(1, client.requests),
+            "records_per_s": len(numbers) / elapsed}
+
+
+def bench_acquisition(loggers=ACQ_LOGGERS, rate=ACQ_RATE,
+                      seconds=CR6_SECONDS):
+    """Poll many stand-in loggers at once through `AcquisitionService`."""
+    from src.tools.acquisition import AcquisitionService
+    from src.tools.mock_cr6 import MockCR6
+
+    ages = []
+    with MockCR6(rate, loggers=loggers) as mock:
+        service = AcquisitionService(
+            {f"logger{k}": url for k, url in enumerate(mock.urls)})
+        service.subscribe(lambda samples: ages.extend(
+            time.time() - s.t for s in samples))
+        with service:
+            time.sleep(seconds)
+
+    ages.sort()
+    records = sum(s["records"] for s in service.stats.values())
+    return {"loggers": loggers, "logger_rate": rate,
+            "records_per_s": records / seconds,
+            "errors": sum(s["errors"] for s in service.stats.values()),
+            "age_p50_ms": ages[len(ages) // 2] * 1000 if ages else None,
+            "age_p99_ms": ages[int(len(ages) * 0.99)] * 1000 if ages else None}
+
+
+def _analyze(directory):
+    import matplotlib
+    matplotlib.use("Agg")
+    from src.analysis.image_analysis import image_analysis
+    return image_analysis(directory)
+
+
+def _stop_to_sms(directory):
+    """
+    Time from `stop_analysis` handing the folder to its worker to the result
+    SMS being sent. The phone is replaced by a recorder of `send_msg` calls.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    from src.analysis.image_analysis import image_analysis
+    from src.tools.sms_sender import SmsSender
+
+    sms_sender = SmsSender.__new__(SmsSender)
+    with open(_ROOT_PATH / "src" / "data" / "sms_template.json") as f:
+        sms_sender.template = json.load(f)
+    sms_sender.phone = "0"
+    sent = threading.Event()
+    sms_sender.send_msg = lambda *_: sent.set()
+
+    start = time.perf_counter()
+    sms_sender.send_msg_after_analysis(image_analysis(directory))
+    sent.wait()
+    return time.perf_counter() - start
+
+
+def bench_analysis(sizes):
+    results = {}
+    for n in sizes:
+        directory, writer_mb_s = recording(n)
+        analysis = _isolated(_analyze, str(directory))
+        stop_to_sms = _isolated(_stop_to_sms, str(directory))
+        results[str(n)] = {
+            "verdict": analysis["result"],
+            "wall_s": analysis["wall_s"],
+            "frames_per_s": n / analysis["wall_s"],
+            "peak_alloc_mb": analysis["peak_alloc_mb"],
+            "peak_rss_mb": analysis["peak_rss_mb"],
+            "stop_to_sms_s": stop_to_sms["result"],
+        }
+        if writer_mb_s is not None:
+            results[str(n)]["recording_writer_mb_per_s"] = writer_mb_s
+        print(f"[BENCH] image_analysis {n} frames: {results[str(n)]}")
+    return results
+
+
+def compare(old, new, path=""):
+    """Prints every numeric metric of `new` next to its value in `old`."""
+    for key, value in new.items():
+        name = f"{path}.{key}" if path else key
+        if isinstance(value, dict):
+            compare(old.get(key, {}), value, name)
+        elif isinstance(value, (int, float)) and isinstance(old.get(key),
+                                                            (int, float)):
+            change = (value - old[key]) / old[key] * 100 if old[key] else 0
+            print(f"{name:60} {old[key]:12.3f} -> {value:12.3f} "
+                  f"({change:+.1f}%)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help=f"recording sizes to analyze, among {SIZES}")
+    parser.add_argument("--compare", help="previous results JSON file")
+    parser.add_argument("--output", help="results JSON file")
+    args = parser.parse_args(argv)
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+
+    results = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y%m%d_%H%M%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "writer": bench_writer(),
+        "display": bench_display(),
+        "loggernet": bench_loggernet(),
+        "loggernet_polling": bench_cr6_polling(),
+        "acquisition": bench_acquisition(),
+        "analysis": bench_analysis(sizes),
+    }
+    print(f"[BENCH] writer: {results['writer']}")
+    print(f"[BENCH] display: {results['display']}")
+    print(f"[BENCH] loggernet: {results['loggernet']}")
+    print(f"[BENCH] loggernet polling: {results['loggernet_polling']}")
+    print(f"[BENCH] acquisition: {results['acquisition']}")
+
+    output = Path(args.output) if args.output else \
+        RESULTS_PATH / f"{results['timestamp']}_{results['commit']}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"[BENCH] Results saved to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
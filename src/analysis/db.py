@@ -1,33 +1,589 @@
+import json
 import os
+import queue
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import deque
 from datetime import datetime
+from pathlib import Path
 
-import psycopg2
+try:
+    import psycopg2
+    from psycopg2.extras import execute_values
+except ModuleNotFoundError:
+    psycopg2 = None  # DbSink.postgres() raises when it is used
 
+_ROOT_PATH = Path(__file__).resolve().parents[2]
 
-def insert_data(yellow_pixels, agitation, normalized_pixels, image_path):
+# Batching parameters of the background writer
+BATCH_SIZE = 100  # flush once this many rows are buffered...
+FLUSH_MS = 500  # ...or once the oldest buffered row is this old
+MAX_BUFFER = 10000  # rows kept in memory before spilling to disk
+POOL_SIZE = 2
+
+# Retries of a failed batch before it is spilled to disk
+MAX_RETRIES = 3
+RETRY_BACKOFF = 0.5  # seconds before the first retry, doubled every failure
+MAX_BACKOFF = 30.0
+
+SPILL_PATH = os.getenv("DB_SPILL_PATH",
+                       str(_ROOT_PATH / "saves" / "plant_logs_spill.jsonl"))
+
+COLUMNS = ("timestamp", "yellow_pixels", "agitation", "normalized_pixels",
+           "image_path")
+INSERT_SQL = f"INSERT INTO plant_logs ({', '.join(COLUMNS)}) VALUES "
+
+# Local per-frame results store: "sqlite" or "none"
+RESULTS_BACKEND = os.getenv("RESULTS_BACKEND", "sqlite")
+RESULTS_PATH = os.getenv("RESULTS_DB", str(_ROOT_PATH / "saves" / "results.db"))
+
+RESULTS_SCHEMA = """
+                 CREATE TABLE IF NOT EXISTS recordings
+                 (
+                     id         INTEGER PRIMARY KEY AUTOINCREMENT,
+                     name       TEXT UNIQUE NOT NULL,
+                     source     TEXT,
+                     created_at TEXT,
+                     verdict    TEXT,
+                     n_frames   INTEGER DEFAULT 0,
+                     peak_count INTEGER
+                 );
+                 CREATE INDEX IF NOT EXISTS recordings_verdict
+                     ON recordings (verdict, created_at);
+                 CREATE INDEX IF NOT EXISTS recordings_created
+                     ON recordings (created_at);
+                 CREATE INDEX IF NOT EXISTS recordings_peak
+                     ON recordings (peak_count);
+                 CREATE TABLE IF NOT EXISTS frames
+                 (
+                     recording_id      INTEGER NOT NULL
+                         REFERENCES recordings (id) ON DELETE CASCADE,
+                     frame             INTEGER NOT NULL,
+                     timestamp         TEXT,
+                     count_vs_prev     INTEGER,
+                     count_vs_bg       INTEGER,
+                     yellow_pixels     INTEGER,
+                     normalized_pixels REAL,
+                     agitated          BOOLEAN,
+                     image_path        TEXT,
+                     PRIMARY KEY (recording_id, frame)
+                 ) WITHOUT ROWID;
+                 CREATE INDEX IF NOT EXISTS frames_agitated
+                     ON frames (agitated, recording_id);
+                 """
+
+FRAME_COLUMNS = ("frame", "timestamp", "count_vs_prev", "count_vs_bg",
+                 "yellow_pixels", "normalized_pixels", "agitated",
+                 "image_path")
+
+SQLITE_SCHEMA = """
+                CREATE TABLE IF NOT EXISTS plant_logs
+                (
+                    id                INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp         TEXT,
+                    yellow_pixels     INTEGER,
+                    agitation         BOOLEAN,
+                    normalized_pixels REAL,
+                    image_path        TEXT
+                )
+                """
+
+
+def postgres_params():
+    """Connection parameters from the DB_* env vars, ``None`` if unset."""
     password = os.getenv("DB_PASSWORD")
     if not password:
+        return None
+    return dict(
+        dbname=os.getenv("DB_NAME", "plantdata"),
+        user=os.getenv("DB_USER", "cropps"),
+        password=password,
+        host=os.getenv("DB_HOST", "postgres-db"),
+        port=os.getenv("DB_PORT", "5432")
+    )
+
+
+class ConnectionPool:
+    """
+    Minimal thread-safe pool of DB-API connections created by `connect`.
+    Connections are opened lazily and discarded when they fail.
+    """
+
+    def __init__(self, connect, size=POOL_SIZE):
+        self.connect = connect
+        self._idle = queue.LifoQueue(size)
+        self._slots = threading.Semaphore(size)
+
+    def get(self):
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            try:
+                return self.connect()
+            except Exception:
+                self._slots.release()
+                raise
+
+    def put(self, conn, broken=False):
+        if broken:
+            try:
+                conn.close()
+            except Exception:
+                pass
+        else:
+            self._idle.put_nowait(conn)
+        self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+class DbSink:
+    """
+    Buffers `plant_logs` rows and writes them from a background thread in
+    batches of `batch_size` rows or every `flush_ms` milliseconds, using
+    pooled connections. When the database cannot be reached, or more than
+    `max_buffer` rows are waiting, rows are appended to `spill_path` and
+    replayed after the next successful flush.
+
+    Use `DbSink.postgres()` for the k3s database and `DbSink.sqlite(path)` as
+    a local stand-in.
+    """
+
+    def __init__(self, connect, paramstyle="%s", batch_size=BATCH_SIZE,
+                 flush_ms=FLUSH_MS, max_buffer=MAX_BUFFER,
+                 spill_path=SPILL_PATH, pool_size=POOL_SIZE,
+                 max_retries=MAX_RETRIES, retry_backoff=RETRY_BACKOFF):
+        """
+        :param connect: callable returning a new DB-API connection
+        :param paramstyle: "%s" (psycopg2, uses `execute_values`) or "?"
+                           (sqlite3, uses `executemany`)
+        """
+        self.pool = ConnectionPool(connect, pool_size)
+        self.paramstyle = paramstyle
+        self.batch_size = batch_size
+        self.flush_ms = flush_ms
+        self.max_buffer = max_buffer
+        self.spill_path = spill_path
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self._failures = 0  # consecutive failed writes
+
+        self._buffer = deque()
+        self._in_flight = 0  # rows taken by the writer but not written yet
+        self._flush_now = False
+        self._cond = threading.Condition()
+        self._spill_lock = threading.Lock()
+        self._stop_event = threading.Event()
+
+        # Metrics
+        self.rows_queued = 0
+        self.rows_written = 0
+        self.rows_retried = 0
+        self.rows_failed = 0  # rows given up on after all retries
+        self.rows_spilled = 0
+        self.flushes = 0
+        self.flush_time = 0.0  # seconds spent in successful flushes
+        self.last_flush_ms = 0.0
+
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def postgres(cls, params=None, **kwargs):
+        if psycopg2 is None:
+            raise RuntimeError("psycopg2 is not installed")
+        params = params or postgres_params()
+        return cls(lambda: psycopg2.connect(connect_timeout=5, **params),
+                   "%s", **kwargs)
+
+    @classmethod
+    def sqlite(cls, path, **kwargs):
+        def connect():
+            conn = sqlite3.connect(path, check_same_thread=False)
+            conn.execute(SQLITE_SCHEMA)
+            return conn
+
+        return cls(connect, "?", **kwargs)
+
+    ### PRODUCER SIDE ###
+
+    def add(self, yellow_pixels, agitation, normalized_pixels, image_path,
+            timestamp=None):
+        """Queues one row. Never blocks on the database."""
+        row = (timestamp or datetime.now(), yellow_pixels, agitation,
+               normalized_pixels, image_path)
+        with self._cond:
+            self.rows_queued += 1
+            if len(self._buffer) >= self.max_buffer:
+                overflow = True
+            else:
+                overflow = False
+                self._buffer.append(row)
+                if len(self._buffer) >= self.batch_size:
+                    self._cond.notify()
+        if overflow:
+            self._spill([row])
+
+    def flush(self):
+        """Asks the writer to flush now and waits until every row is handled."""
+        with self._cond:
+            self._flush_now = True
+            self._cond.notify()
+            while (self._buffer or self._in_flight) \
+                    and self._thread.is_alive():
+                self._cond.wait(0.05)
+
+    def close(self):
+        """Writes the buffered rows (without retries) and stops the writer."""
+        self._stop_event.set()
+        with self._cond:
+            self._cond.notify()
+        self._thread.join()
+        self.pool.close()
+
+    def stats(self):
+        return {
+            "buffered": len(self._buffer),
+            "rows_queued": self.rows_queued,
+            "rows_written": self.rows_written,
+            "rows_retried": self.rows_retried,
+            "rows_failed": self.rows_failed,
+            "rows_spilled": self.rows_spilled,
+            "flushes": self.flushes,
+            "last_flush_ms": self.last_flush_ms,
+            "mean_flush_ms": self.flush_time / self.flushes * 1000
+            if self.flushes else 0.0,
+            "rows_per_s": self.rows_written / self.flush_time
+            if self.flush_time else 0.0,
+        }
+
+    ### WRITER SIDE ###
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: len(self._buffer) >= self.batch_size
+                            or self._flush_now or self._stop_event.is_set(),
+                    timeout=self.flush_ms / 1000)
+                batch = [self._buffer.popleft() for _ in
+                         range(min(len(self._buffer), self.batch_size))]
+                self._in_flight = len(batch)
+                self._flush_now = bool(self._buffer) and self._flush_now
+
+            if batch:
+                if self._write_with_retries(batch):
+                    self._replay_spill()
+                else:
+                    if self._stop_event.is_set():
+                        # closing with the database down: spill everything
+                        with self._cond:
+                            batch.extend(self._buffer)
+                            self._buffer.clear()
+                    self.rows_failed += len(batch)
+                    self._spill(batch)
+
+            with self._cond:
+                self._in_flight = 0
+                self._cond.notify_all()
+                if self._stop_event.is_set() and not self._buffer:
+                    return
+
+    def _write_with_retries(self, rows):
+        """
+        Writes `rows`, retrying with exponential backoff. The backoff keeps
+        growing across batches while the database stays down, and stops
+        early when the sink is closed.
+        """
+        for attempt in range(self.max_retries + 1):
+            if attempt or self._failures:
+                delay = min(self.retry_backoff * 2 ** (self._failures - 1),
+                            MAX_BACKOFF)
+                if self._stop_event.wait(delay) and attempt:
+                    return False
+            if attempt:
+                self.rows_retried += len(rows)
+            if self._write(rows):
+                self._failures = 0
+                return True
+            self._failures += 1
+        return False
+
+    def _write(self, rows):
+        """Inserts `rows` in one statement. Returns whether it succeeded."""
+        start = time.perf_counter()
+        try:
+            conn = self.pool.get()
+        except Exception as e:
+            print(f"[DB] Error connecting: {e}")
+            return False
+
+        try:
+            cur = conn.cursor()
+            if self.paramstyle == "%s":
+                execute_values(cur, INSERT_SQL + "%s", rows)
+            else:
+                cur.executemany(
+                    INSERT_SQL + f"({', '.join('?' * len(COLUMNS))})",
+                    [(r[0].isoformat(), *r[1:]) for r in rows])
+            conn.commit()
+            cur.close()
+        except Exception as e:
+            print(f"[DB] Error inserting {len(rows)} logs: {e}")
+            self.pool.put(conn, broken=True)
+            return False
+
+        self.pool.put(conn)
+        elapsed = time.perf_counter() - start
+        self.rows_written += len(rows)
+        self.flushes += 1
+        self.flush_time += elapsed
+        self.last_flush_ms = elapsed * 1000
+        return True
+
+    def _spill(self, rows):
+        with self._spill_lock:
+            try:
+                Path(self.spill_path).parent.mkdir(parents=True, exist_ok=True)
+                with open(self.spill_path, "a") as f:
+                    for r in rows:
+                        f.write(json.dumps([r[0].isoformat(), *r[1:]]) + "\n")
+                self.rows_spilled += len(rows)
+                print(f"[DB] {len(rows)} logs spilled to {self.spill_path}")
+            except OSError as e:
+                print(f"[DB] Could not spill {len(rows)} logs: {e}")
+
+    def _replay_spill(self):
+        """Writes back the spilled rows once the database is reachable."""
+        tmp_path = self.spill_path + ".replay"
+        with self._spill_lock:
+            if not os.path.exists(self.spill_path):
+                if not os.path.exists(tmp_path):
+                    return
+                # only the leftover of an interrupted replay
+            elif os.path.exists(tmp_path):
+                # left over by an interrupted replay: keep both
+                with open(self.spill_path) as src, open(tmp_path, "a") as dst:
+                    dst.write(src.read())
+                os.remove(self.spill_path)
+            else:
+                os.replace(self.spill_path, tmp_path)
+
+        rows = []
+        with open(tmp_path) as f:
+            for n, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    r = json.loads(line)
+                    rows.append((datetime.fromisoformat(r[0]), *r[1:]))
+                except (ValueError, TypeError, IndexError) as e:
+                    print(f"[DB] Skipping bad spilled log at {tmp_path}:{n}: "
+                          f"{e}")
+
+        failed = []
+        for i in range(0, len(rows), self.batch_size):
+            batch = rows[i:i + self.batch_size]
+            if failed or not self._write(batch):
+                failed.extend(batch)
+        if failed:
+            self._spill(failed)
+        else:
+            print(f"[DB] {len(rows)} spilled logs written")
+        os.remove(tmp_path)
+
+
+class ResultsStore(ABC):
+    """
+    Interface of the per-frame results store. Recordings are identified by
+    name (usually their folder) and hold one row per analyzed frame.
+    """
+
+    @abstractmethod
+    def save_recording(self, recording, verdict, counts_vs_prev,
+                       counts_vs_bg, source="image_analysis"):
+        """
+        Replaces the frames of `recording` with the pixel counts computed by
+        `image_analysis` (frame numbers start at 2, as in the .txt files).
+        """
+
+    @abstractmethod
+    def add_frames(self, recording, frames, source="analyzer"):
+        """
+        Appends frames to `recording`. Each frame is a dict whose keys are
+        among `FRAME_COLUMNS`, except "frame" which is numbered
+        automatically.
+        """
+
+    @abstractmethod
+    def find_recordings(self, verdict=None, since=None, until=None,
+                        min_peak=None):
+        """
+        Recordings matching every given criterion, newest first.
+        :param since: `datetime` or ISO string, inclusive
+        :param until: `datetime` or ISO string, exclusive
+        :param min_peak: minimum peak pixel count (vs. previous frame, or
+                         yellow pixels for frames without it)
+        """
+
+    @abstractmethod
+    def frames(self, recording):
+        """The frames of `recording` as dicts, in frame order."""
+
+    def close(self):
+        pass
+
+
+class SqliteResultsStore(ResultsStore):
+    """Results store in an indexed SQLite file (WAL mode)."""
+
+    def __init__(self, path=RESULTS_PATH):
+        if path != ":memory:":
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA foreign_keys=ON")
+        self._conn.executescript(RESULTS_SCHEMA)
+
+    def _recording_id(self, recording, source):
+        self._conn.execute(
+            "INSERT OR IGNORE INTO recordings (name, source, created_at) "
+            "VALUES (?, ?, ?)",
+            (str(recording), source, datetime.now().isoformat()))
+        return self._conn.execute("SELECT id FROM recordings WHERE name = ?",
+                                  (str(recording),)).fetchone()[0]
+
+    def save_recording(self, recording, verdict, counts_vs_prev,
+                       counts_vs_bg, source="image_analysis"):
+        counts_vs_prev = [int(c) for c in counts_vs_prev]
+        counts_vs_bg = [int(c) for c in counts_vs_bg]
+        n = max(len(counts_vs_prev), len(counts_vs_bg))
+        rows = [(i + 2,
+                 counts_vs_prev[i] if i < len(counts_vs_prev) else None,
+                 counts_vs_bg[i] if i < len(counts_vs_bg) else None)
+                for i in range(n)]
+
+        with self._lock, self._conn:
+            rec_id = self._recording_id(recording, source)
+            self._conn.execute("DELETE FROM frames WHERE recording_id = ?",
+                               (rec_id,))
+            self._conn.executemany(
+                "INSERT INTO frames (recording_id, frame, count_vs_prev, "
+                "count_vs_bg) VALUES (?, ?, ?, ?)",
+                [(rec_id, *r) for r in rows])
+            self._conn.execute(
+                "UPDATE recordings SET verdict = ?, n_frames = ?, "
+                "peak_count = ? WHERE id = ?",
+                (verdict, n, max(counts_vs_prev, default=None), rec_id))
+        return rec_id
+
+    def add_frames(self, recording, frames, source="analyzer"):
+        columns = FRAME_COLUMNS[1:]
+        with self._lock, self._conn:
+            rec_id = self._recording_id(recording, source)
+            start = self._conn.execute(
+                "SELECT COALESCE(MAX(frame), 0) FROM frames "
+                "WHERE recording_id = ?", (rec_id,)).fetchone()[0] + 1
+            self._conn.executemany(
+                f"INSERT INTO frames (recording_id, frame, "
+                f"{', '.join(columns)}) "
+                f"VALUES (?, ?, {', '.join('?' * len(columns))})",
+                [(rec_id, start + i, *(f.get(c) for c in columns))
+                 for i, f in enumerate(frames)])
+            counts = [f.get("count_vs_prev") if f.get("count_vs_prev")
+                      is not None else f.get("yellow_pixels") for f in frames]
+            peak = max((int(c) for c in counts if c is not None),
+                       default=None)
+            self._conn.execute(
+                "UPDATE recordings SET n_frames = n_frames + :n, "
+                "verdict = CASE WHEN :agitated THEN 'Agitated' "
+                "ELSE verdict END, "
+                "peak_count = COALESCE(MAX(peak_count, :peak), peak_count, "
+                ":peak) WHERE id = :id",
+                {"n": len(frames),
+                 "agitated": any(f.get("agitated") for f in frames),
+                 "peak": peak, "id": rec_id})
+        return rec_id
+
+    def find_recordings(self, verdict=None, since=None, until=None,
+                        min_peak=None):
+        clauses, params = [], []
+        if verdict is not None:
+            clauses.append("verdict = ?")
+            params.append(verdict)
+        if since is not None:
+            clauses.append("created_at >= ?")
+            params.append(since if isinstance(since, str)
+                          else since.isoformat())
+        if until is not None:
+            clauses.append("created_at < ?")
+            params.append(until if isinstance(until, str)
+                          else until.isoformat())
+        if min_peak is not None:
+            clauses.append("peak_count > ?")
+            params.append(min_peak)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            return [dict(r) for r in self._conn.execute(
+                f"SELECT * FROM recordings {where} ORDER BY created_at DESC",
+                params)]
+
+    def frames(self, recording):
+        with self._lock:
+            return [dict(r) for r in self._conn.execute(
+                "SELECT f.* FROM frames f JOIN recordings r "
+                "ON f.recording_id = r.id WHERE r.name = ? ORDER BY frame",
+                (str(recording),))]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_sink = None
+_sink_lock = threading.Lock()
+_results_store = None
+
+
+def get_sink():
+    """The shared Postgres sink, ``None`` if DB_PASSWORD is not set."""
+    global _sink
+    with _sink_lock:
+        if _sink is None and postgres_params():
+            _sink = DbSink.postgres()
+        return _sink
+
+
+def insert_data(yellow_pixels, agitation, normalized_pixels, image_path):
+    sink = get_sink()
+    if not sink:
         print("[DB] DB_PASSWORD env var not set; skipping insert.")
         return
-    try:
-        conn = psycopg2.connect(
-            dbname=os.getenv("DB_NAME", "plantdata"),
-            user=os.getenv("DB_USER", "cropps"),
-            password=password,
-            host=os.getenv("DB_HOST", "postgres-db"),
-            port=os.getenv("DB_PORT", "5432")
-        )
-        cur = conn.cursor()
-
-        cur.execute("""
-                    INSERT INTO plant_logs (timestamp, yellow_pixels, agitation, normalized_pixels, image_path)
-                    VALUES (%s, %s, %s, %s, %s)
-                    """, (datetime.now(), yellow_pixels, agitation,
-                          normalized_pixels, image_path))
-
-        conn.commit()
-        cur.close()
-        conn.close()
-        print("[DB] Log inserted.")
-    except Exception as e:
-        print(f"[DB] Error inserting log: {e}")
+    sink.add(yellow_pixels, agitation, normalized_pixels, image_path)
+
+
+def get_results_store():
+    """The shared local results store, ``None`` if RESULTS_BACKEND is none."""
+    global _results_store
+    with _sink_lock:
+        if _results_store is None:
+            match RESULTS_BACKEND:
+                case "sqlite":
+                    _results_store = SqliteResultsStore()
+                case "none":
+                    return None
+                case _:
+                    raise ValueError(
+                        f"Unknown results backend: {RESULTS_BACKEND}")
+        return _results_store
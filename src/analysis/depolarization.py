@@ -0,0 +1,175 @@
+"""
+Online detection of depolarization events in the surface potentials.
+
+Each sample is compared with the baseline of the preceding ``baseline``
+seconds: an event starts when a channel is ``z_threshold`` standard
+deviations away from the baseline mean and moving away from it faster than
+``slope_threshold`` mV/s, for ``confirm`` samples in a row. At 100 Hz that
+is a few tens of ms after the potential starts to move, plus the polling
+interval of the logger.
+
+The baseline lives in a ``RingBuffer`` with running sums of the values and
+their squares, so each sample costs O(1) whatever the window. It is frozen
+while an event lasts, so the event does not become its own baseline, and
+starts over if an event never comes back to it (a new resting potential).
+"""
+from typing import NamedTuple
+
+import numpy as np
+
+from src.tools.ring_buffer import RingBuffer
+
+RATE = 100.0  # Hz, logger scan rate, sets the window lengths in samples
+BASELINE = 10.0  # s of samples before the current one
+Z_THRESHOLD = 6.0
+SLOPE_THRESHOLD = 5.0  # mV/s
+SLOPE_SPAN = 0.2  # s over which the slope is measured
+CONFIRM = 3  # samples in a row above both thresholds
+MIN_SIGMA = 0.5  # mV, floor of the baseline noise on a quiet channel
+REFRACTORY = 2.0  # s back within z_threshold / 2 before the next event
+MAX_EVENT = 60.0  # s, after which the baseline is learned again
+
+# Last column of the Loggernet recordings, a bitfield: WOUNDED_FLAG for a
+# manual wounding mark, DETECTED_FLAG for a detected depolarization
+FLAGS_COLUMN = "Flags"
+WOUNDED_FLAG = 1
+DETECTED_FLAG = 2
+
+
+class Depolarization(NamedTuple):
+    t: float  # time of the sample that confirmed the event
+    channel: int
+    label: str
+    value: float  # mV
+    baseline: float  # mV, mean before the event
+    z: float
+    slope: float  # mV/s
+
+
+class DepolarizationDetector:
+    def __init__(self, channels, labels=None, rate=RATE, baseline=BASELINE,
+                 z_threshold=Z_THRESHOLD, slope_threshold=SLOPE_THRESHOLD,
+                 slope_span=SLOPE_SPAN, confirm=CONFIRM, min_sigma=MIN_SIGMA,
+                 refractory=REFRACTORY, max_event=MAX_EVENT):
+        self.channels = channels
+        self.labels = list(labels or [str(i) for i in range(channels)])
+        self.z_threshold = z_threshold
+        self.slope_threshold = slope_threshold
+        self.confirm = confirm
+        self.min_sigma = min_sigma
+        self.refractory = refractory
+        self.max_event = max_event
+
+        self.baseline = RingBuffer(channels, max(2, int(baseline * rate)))
+        self.recent = RingBuffer(channels, max(1, int(slope_span * rate)) + 1)
+        self._sum = np.zeros(channels)
+        self._sumsq = np.zeros(channels)
+        self._added = 0  # samples added since the sums were recomputed
+        self._above = np.zeros(channels, dtype=np.int64)
+
+        self.event = None  # the event in progress
+        self._last_loud = None  # last time a channel was far from baseline
+        self.events = 0
+        self._listeners = []
+
+    def subscribe(self, callback):
+        """
+        Calls ``callback(event)`` with each new ``Depolarization``, on the
+        thread that feeds the samples: it must not block.
+        """
+        self._listeners.append(callback)
+
+    def unsubscribe(self, callback):
+        self._listeners = [cb for cb in self._listeners if cb != callback]
+
+    def _add_to_baseline(self, t, v):
+        if len(self.baseline) == self.baseline.capacity:
+            _, values, _ = self.baseline.view(self.baseline.capacity)
+            oldest = values[:, 0]
+            self._sum -= oldest
+            self._sumsq -= oldest * oldest
+        self.baseline.append(t, v)
+        self._sum += v
+        self._sumsq += v * v
+
+        # rounding errors of the running sums don't build up past a window
+        self._added += 1
+        if self._added >= self.baseline.capacity:
+            _, values, _ = self.baseline.view()
+            self._sum = values.sum(axis=1)
+            self._sumsq = (values * values).sum(axis=1)
+            self._added = 0
+
+    def reset(self):
+        """Forgets the baseline, e.g. after moving the electrodes."""
+        self.baseline.clear()
+        self._sum[:] = 0
+        self._sumsq[:] = 0
+        self._added = 0
+        self._above[:] = 0
+        self.event = None
+
+    def notify(self, event):
+        """Calls the listeners with ``event``."""
+        for callback in self._listeners:
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"[DEPOL] listener failed: {e}")
+
+    def update(self, t, vals, notify=True):
+        """
+        Processes the next sample, ``vals`` may contain the logger's "NAN"
+        strings (such samples are ignored).
+
+        :param notify: call the listeners with a new event; callers holding
+            a lock pass False and call ``notify`` once it is released
+        :return: the ``Depolarization`` this sample confirmed, or None
+        """
+        v = np.asarray(vals, dtype=np.float64)[:self.channels]
+        if len(v) < self.channels or not np.isfinite(v).all():
+            return None
+        self.recent.append(t, v)
+
+        n = len(self.baseline)
+        if n < self.baseline.capacity:
+            self._add_to_baseline(t, v)
+            return None
+
+        mean = self._sum / n
+        sigma = np.sqrt(np.maximum(self._sumsq / n - mean * mean, 0))
+        z = (v - mean) / np.maximum(sigma, self.min_sigma)
+        times, values, _ = self.recent.view()
+        dt = t - times[0]
+        slope = (v - values[:, 0]) / dt if dt > 0 else np.zeros_like(v)
+
+        if self.event is not None:
+            if (np.abs(z) >= self.z_threshold / 2).any():
+                self._last_loud = t
+            if t - self.event.t >= self.max_event:
+                # the potential settled elsewhere, learn it again
+                self.reset()
+            elif t - self._last_loud >= self.refractory:
+                self.event = None
+            return None
+
+        # away from the baseline, and still moving away from it
+        candidate = (np.abs(z) >= self.z_threshold) & \
+            (np.abs(slope) >= self.slope_threshold) & \
+            (np.sign(z) == np.sign(slope))
+        self._above = np.where(candidate, self._above + 1, 0)
+        if (self._above < self.confirm).all():
+            self._add_to_baseline(t, v)
+            return None
+
+        ch = int(np.argmax(np.where(self._above >= self.confirm,
+                                    np.abs(z), -1)))
+        self.event = Depolarization(t, ch, self.labels[ch], float(v[ch]),
+                                    float(mean[ch]), float(z[ch]),
+                                    float(slope[ch]))
+        self._last_loud = t
+        self._above[:] = 0
+        self.events += 1
+        if notify:
+            self.notify(self.event)
+        return self.event
@@ -8,7 +8,8 @@ import cv2
 import matplotlib.pyplot as plt
 import numpy as np
 
-from archive.remote_image_analysis import remote_image_analysis
+from archive.remote_image_analysis import RemoteStream, remote_image_analysis
+from src.analysis.db import get_results_store
 from src.tools.capture_task import CaptureTask
 
 # Image dimensions
@@ -26,15 +27,52 @@ MAX_FRAMES = 101  # Check first 100 frames for detection
 THRESHOLD_NOTHING = 35       # pixel-count threshold (bit-depth independent)
 THRESHOLD_INJECTION = 10000  # pixel-count threshold (bit-depth independent)
 
+# Results of a recording that could not be analyzed
+NO_IMAGES = "No images found"
+INSUFFICIENT_IMAGES = "Insufficient images"
+
 # Flag to enable/disable figure creation
 CREATE_FIGURE = True
 
+# Where the analysis runs: None (locally), "upload" (send the recording once
+# it stops, frames the server has cached are skipped) or "stream" (upload
+# frames while recording)
+REMOTE = None
+
+# Open streams by recording directory: (stream, acquisition thread)
+_remote_streams = {}
+# Frame listeners of the verdict engines, by recording directory
+_verdict_listeners = {}
+
 
-def start_analysis(camera, directory, button, command):
+def _remote_params():
+    return {"min_intensity": MIN_INTENSITY, "max_intensity": MAX_INTENSITY,
+            "max_frames": MAX_FRAMES, "threshold_nothing": THRESHOLD_NOTHING,
+            "threshold_injection": THRESHOLD_INJECTION,
+            "width": IMAGE_WIDTH, "height": IMAGE_HEIGHT}
+
+
+def start_analysis(camera, directory, button, command, verdict=None):
+    """
+    :param verdict: ``VerdictEngine`` to feed the frames to while
+        recording, it publishes the result as soon as it can
+    """
     directory.mkdir(parents=True, exist_ok=True)
     capture_task = CaptureTask(camera, directory)
     capture_task.start()
 
+    if verdict is not None:
+        conditions = FrameConditions(verdict)
+        acquisition = camera.image_acquisition_thread
+        acquisition.frame_listeners.append(conditions.send_frame)
+        _verdict_listeners[str(directory)] = (conditions, acquisition)
+
+    if REMOTE == "stream":
+        stream = RemoteStream(_remote_params())
+        acquisition = camera.image_acquisition_thread
+        acquisition.frame_listeners.append(stream.send_frame)
+        _remote_streams[str(directory)] = (stream, acquisition)
+
     if button:
         button.config(text="Stop Analysis", fg="darkred",
                       command=command)
@@ -42,15 +80,17 @@ def start_analysis(camera, directory, button, command):
     return capture_task
 
 
-def stop_analysis(sms_sender, directory, button, command):
+def stop_analysis(sms_sender, directory, button, command, verdict=None):
+    """
+    :param verdict: the ``VerdictEngine`` given to ``start_analysis``; the
+        offline result only completes it and its ``on_verdict`` reports the
+        result instead of this function
+    """
     if button:
         button.config(
             text="Start Analysis", fg="darkgreen",
             command=command)
 
-    # variable to control remote/local analysis
-    REMOTE = False
-
     # Show a non-blocking "waiting" message
     waiting_win = tk.Toplevel()
     waiting_win.title("Please wait")
@@ -61,12 +101,30 @@ def stop_analysis(sms_sender, directory, button, command):
 
     def worker():
         try:
-            if REMOTE:
-                result = remote_image_analysis(directory)
+            if REMOTE == "stream":
+                stream, acquisition = _remote_streams.pop(str(directory))
+                # the last frames are written after the recording stops
+                acquisition.wait_saved()
+                acquisition.frame_listeners.remove(stream.send_frame)
+                result = stream.finish()
+            elif REMOTE:
+                result = remote_image_analysis(directory,
+                                               params=_remote_params())
             else:
                 print(directory)
                 result = image_analysis(directory)
 
+            if verdict is not None:
+                conditions, acquisition = _verdict_listeners.pop(
+                    str(directory), (None, None))
+                if conditions:
+                    acquisition.frame_listeners.remove(conditions.send_frame)
+                # an error is reported as it is, not turned into a verdict
+                if result not in (NO_IMAGES, INSUFFICIENT_IMAGES):
+                    result = verdict.finish(result)
+                    if sms_sender.phone:
+                        return
+
             try:
                 sms_sender.send_msg_after_analysis(result)
             except RuntimeError:
@@ -115,6 +173,15 @@ def plot_pixel_counts_vs_background(pixel_counts_bg, screenshot_directory):
     plt.close()
 
 
+def frame_condition(count):
+    """Condition shown by one frame's pixel count, None if nothing."""
+    if count > THRESHOLD_INJECTION:
+        return "Burn"
+    elif THRESHOLD_NOTHING <= count <= THRESHOLD_INJECTION:
+        return "Current injection"
+    return None
+
+
 def detect_conditions(pixel_counts_prev):
     """Detect conditions based on pixel counts (40-170, frame vs. previous) in the first 30 frames."""
     if not pixel_counts_prev:
@@ -125,14 +192,52 @@ def detect_conditions(pixel_counts_prev):
     result = "Nothing happened"
 
     for count in frames_to_check:
-        if count > THRESHOLD_INJECTION:
-            return "Burn"
-        elif THRESHOLD_NOTHING <= count <= THRESHOLD_INJECTION:
-            result = "Current injection"
+        condition = frame_condition(count)
+        if condition == "Burn":
+            return condition
+        elif condition:
+            result = condition
 
     return result
 
 
+class FrameConditions:
+    """
+    Frame listener feeding a ``VerdictEngine`` the condition of each saved
+    frame as ``image_analysis`` would compute it, so the verdict doesn't
+    wait for the recording to stop.
+    """
+
+    def __init__(self, verdict):
+        self.verdict = verdict
+        self.prev_image = None
+        self.frames = 0
+
+    def send_frame(self, path, image=None):
+        if not str(path).endswith(".tiff") or \
+                self.frames >= MAX_FRAMES - 1:
+            return
+        if image is None:
+            image = cv2.imread(str(path),
+                               cv2.IMREAD_ANYDEPTH | cv2.IMREAD_GRAYSCALE)
+        else:
+            image = np.asarray(image)
+        if image is None or image.shape != (IMAGE_HEIGHT, IMAGE_WIDTH):
+            return
+        if self.prev_image is None:
+            self.prev_image = image
+            return
+
+        difference = cv2.subtract(image, self.prev_image)
+        self.prev_image = image
+        count = np.count_nonzero((difference >= MIN_INTENSITY) &
+                                 (difference <= MAX_INTENSITY))
+        self.frames += 1
+        self.verdict.add_optical(frame_condition(count))
+        if self.frames == MAX_FRAMES - 1:
+            self.verdict.optical_done()
+
+
 def image_analysis(screenshot_directory):
     """
     Analyze images in the specified directory:
@@ -146,12 +251,12 @@ def image_analysis(screenshot_directory):
                  f.endswith('.tiff')]
 
     if not all_files:
-        return "No images found"
+        return NO_IMAGES
 
     all_files.sort(key=lambda x: int(x.split('-')[0]))
 
     if len(all_files) < 2:
-        return "Insufficient images"
+        return INSUFFICIENT_IMAGES
 
     pixel_counts_vs_prev = []
     pixel_counts_vs_bg = []
@@ -211,4 +316,16 @@ def image_analysis(screenshot_directory):
             plot_pixel_counts_vs_background(pixel_counts_vs_bg,
                                             screenshot_directory)
 
-    return detect_conditions(pixel_counts_vs_prev)
+    result = detect_conditions(pixel_counts_vs_prev)
+
+    # Index the per-frame counts so recordings can be queried without
+    # walking the folders
+    try:
+        store = get_results_store()
+        if store:
+            store.save_recording(os.path.abspath(screenshot_directory), result,
+                                 pixel_counts_vs_prev, pixel_counts_vs_bg)
+    except Exception as e:
+        print(f"[DB] Could not save results: {e}")
+
+    return result
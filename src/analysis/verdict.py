@@ -0,0 +1,118 @@
+"""
+Verdict of an analysis from both the camera and the Loggernet channels.
+
+Each modality adds findings as its data arrives: the optical one a label
+per frame (see ``frame_condition`` in image_analysis.py), the electrical one
+each ``Depolarization`` of the detector. Rules, read from
+``src/data/verdict_rules.json``, are checked in order after every finding::
+
+    {"when": {"optical": "Current injection", "electrical": "Depolarization"},
+     "verdict": "Current injection", "early": true}
+
+matches once every modality of ``when`` has that finding. An ``early`` rule
+publishes its verdict right away, the others are only checked once the
+optical analysis is over (``optical_done`` or ``finish``); if none matches,
+the verdict is ``default``. The verdict is published once, to
+``on_verdict``.
+"""
+import json
+import threading
+import time
+from pathlib import Path
+
+_RULES_PATH = Path(__file__).resolve().parents[1] / "data" / \
+    "verdict_rules.json"
+
+OPTICAL = "optical"
+ELECTRICAL = "electrical"
+
+
+def load_rules(path=_RULES_PATH):
+    with open(path) as f:
+        return json.load(f)
+
+
+class VerdictEngine:
+    def __init__(self, rules=None, on_verdict=None):
+        """
+        :param rules: as in verdict_rules.json, read from there by default
+        :param on_verdict: called with the verdict once it is decided, on
+            the thread of the finding that decided it
+        """
+        self.rules = rules or load_rules()
+        self.strong_slope = self.rules.get(ELECTRICAL, {}) \
+            .get("strong_slope", float("inf"))
+        self.on_verdict = on_verdict
+        self.findings = {OPTICAL: set(), ELECTRICAL: set()}
+        self.optical_frames = 0
+        self.optical_over = False
+        self.verdict = None
+        self.started = time.monotonic()
+        self.latency = None  # s from start to verdict
+        self._lock = threading.Lock()
+
+    def add_optical(self, label):
+        """Condition of the next frame, None if nothing happened in it."""
+        with self._lock:
+            self.optical_frames += 1
+            if label:
+                self.findings[OPTICAL].add(label)
+        self._evaluate()
+
+    def optical_done(self):
+        """No more frames will be analyzed."""
+        with self._lock:
+            self.optical_over = True
+        self._evaluate()
+
+    def add_depolarization(self, event):
+        """``DepolarizationDetector`` listener."""
+        with self._lock:
+            self.findings[ELECTRICAL].add("Depolarization")
+            if abs(event.slope) >= self.strong_slope:
+                self.findings[ELECTRICAL].add("Strong depolarization")
+        self._evaluate()
+
+    def finish(self, optical_result=None):
+        """
+        Ends the analysis, with the result of the offline optical analysis
+        if there was one, and decides if nothing did before.
+
+        :return: the verdict
+        """
+        with self._lock:
+            if optical_result:
+                self.findings[OPTICAL].add(optical_result)
+            self.optical_over = True
+        self._evaluate()
+        return self.verdict
+
+    def _matches(self, rule):
+        return all(label in self.findings[modality]
+                   for modality, label in rule["when"].items())
+
+    def _evaluate(self):
+        with self._lock:
+            if self.verdict is not None:
+                return
+            verdict = None
+            for rule in self.rules["rules"]:
+                if (rule.get("early") or self.optical_over) and \
+                        self._matches(rule):
+                    verdict = rule["verdict"]
+                    break
+            if verdict is None and self.optical_over:
+                verdict = self.rules.get("default", "Nothing happened")
+            if verdict is None:
+                return
+            self.verdict = verdict
+            self.latency = time.monotonic() - self.started
+
+        print(f"[VERDICT] {verdict} after {self.latency:.1f} s "
+              f"(optical: {sorted(self.findings[OPTICAL])}, "
+              f"electrical: {sorted(self.findings[ELECTRICAL])})")
+        if self.on_verdict:
+            try:
+                self.on_verdict(verdict)
+            except Exception as e:
+                print(f"[VERDICT] listener failed: {e}")
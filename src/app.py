@@ -26,8 +26,11 @@ from dlls.windows_setup import configure_path
 configure_path(str(DLL_PATH))
 
 from src.analysis.image_analysis import start_analysis, stop_analysis
+from src.analysis.verdict import VerdictEngine
 from src.tools.cutter_control import cutter_app
-from src.tools.loggernet import Loggernet
+from src.tools.acquisition import AcquisitionService
+from src.tools.alignment import Alignment, align_recording
+from src.tools.loggernet import REFRESH_MS, Loggernet
 from src.tools.loggernet_live import LoggernetLive
 from src.tools.sms_sender import SmsSender
 from src.tools.trigger import Trigger
@@ -40,6 +43,8 @@ from src.ui.loading_screen import LoadingScreen
 WINDOW_WIDTH, WINDOW_HEIGHT = 1600, 900
 DISPLAY_FPS = 15  # GUI camera-feed refresh rate (decoupled from capture fps)
 DISPLAY_INTERVAL_MS = max(1, int(1000 / DISPLAY_FPS))
+# At most one SMS per this many seconds about detected depolarizations
+DEPOLARIZATION_SMS_INTERVAL = 60
 
 
 def threaded(target):
@@ -57,8 +62,13 @@ class CameraApp(tk.Tk):
         self.state("zoomed")
         self.icon = tk.PhotoImage(file=ICO_PATH)
         self.iconphoto(False, self.icon)
-        self._last_msg_history = []
         self.update_pid = None
+        self.graph_pid = None
+        self.acquisition = None
+        self.alignment = None
+        self.recording_dir = None
+        self._last_depolarization_sms = None
+        self.verdict = None  # of the analysis in progress
         self.capture_task = None
         self.cap = None
         self.start_record_button = None
@@ -78,6 +88,10 @@ class CameraApp(tk.Tk):
         try:
             if self.update_pid is not None:
                 self.after_cancel(self.update_pid)
+            if self.graph_pid is not None:
+                self.after_cancel(self.graph_pid)
+            if self.acquisition is not None:
+                self.acquisition.stop(timeout=1)
             if hasattr(self.camera, 'image_acquisition_thread'):
                 self.camera.image_acquisition_thread.stop()
             if hasattr(self.camera, 'camera'):
@@ -124,11 +138,6 @@ class CameraApp(tk.Tk):
         y = (canvas_height - pil_image.height) // 2
         self.canvas.create_image(x, y, anchor=tk.NW, image=self.imgtk)
 
-        # Update histogram if frame exists
-        if self.show_graph:
-            if not self.loggernet.stop_event.is_set(): self.loggernet.update(0)
-            self.loggernet_canvas.draw_idle()
-
         # === GRAPHS ===
         # if self.show_graph:
         #     self.histogram.update(pil_image)
@@ -161,6 +170,15 @@ class CameraApp(tk.Tk):
 
         self.update_pid = self.after(DISPLAY_INTERVAL_MS, self.update_camera_feed)
 
+    def update_graph(self):
+        """Redraw the Loggernet graph, at its own rate (REFRESH_MS)."""
+        if self._shutting_down:
+            return
+        # Records are fetched by the Loggernet thread, this only draws them
+        if not self.loggernet.stop_event.is_set() and self.loggernet.update(0):
+            self.loggernet_canvas.draw_idle()
+        self.graph_pid = self.after(REFRESH_MS, self.update_graph)
+
     ## main functions for buttons ##
 
     def start_stop_recording(self):
@@ -168,8 +186,21 @@ class CameraApp(tk.Tk):
         path = self.camera.start_stop_recording(self.start_record_button)
         if self.show_graph:
             self.loggernet.path = path / "data.csv" if path else None
+            if path is None and self.recording_dir:
+                self._align_recording(self.recording_dir)
+        self.recording_dir = path
         return path
 
+    @threaded
+    def _align_recording(self, directory):
+        """Write the per-frame Loggernet values of a finished recording."""
+        self.camera.image_acquisition_thread.wait_saved()
+        try:
+            self.alignment.save_clock(directory)
+            print(f"[ALIGN] {align_recording(directory)}")
+        except (OSError, ValueError, TypeError) as e:
+            print(f"[ALIGN] failed for {directory}: {e}")
+
     def start_analysis(self):
         # If recording is already running (e.g., user pressed Start Recording
         # manually before triggering analysis), stop the current recording
@@ -179,9 +210,14 @@ class CameraApp(tk.Tk):
 
         self.screenshot_directory = self.start_stop_recording()
 
+        # Decided from the frames and the Loggernet, whichever is first
+        self.verdict = VerdictEngine(on_verdict=self._send_detection)
+        if self.show_graph:
+            self.loggernet.detector.subscribe(self.verdict.add_depolarization)
+
         self.capture_task = start_analysis(
             self.camera, self.screenshot_directory,
-            self.start_analysis_button, self.stop_analysis)
+            self.start_analysis_button, self.stop_analysis, self.verdict)
 
     def stop_analysis(self):
         time.sleep(1)
@@ -194,11 +230,32 @@ class CameraApp(tk.Tk):
 
         self.start_stop_recording()
 
+        verdict, self.verdict = self.verdict, None
+        if self.show_graph and verdict is not None:
+            self.loggernet.detector.unsubscribe(verdict.add_depolarization)
         stop_analysis(self.sms_sender, self.screenshot_directory,
-                      self.start_analysis_button, self.start_analysis)
+                      self.start_analysis_button, self.start_analysis, verdict)
 
         self.capture_task = None
 
+    def _on_depolarization(self, event):
+        """Loggernet detector listener, runs on the acquisition thread."""
+        print(f"[DEPOL] {event.label}: {event.value - event.baseline:+.1f} mV "
+              f"from baseline, {event.slope:+.1f} mV/s (z={event.z:.1f})")
+        if self.verdict is not None:
+            return  # part of the analysis verdict
+        last = self._last_depolarization_sms
+        if last is None or event.t - last >= DEPOLARIZATION_SMS_INTERVAL:
+            self._last_depolarization_sms = event.t
+            self._send_detection("depolarization")
+
+    @threaded
+    def _send_detection(self, result):
+        try:
+            self.sms_sender.send_msg_after_analysis(result)
+        except RuntimeError as e:
+            print(f"[SMS] {result} not sent: {e}")
+
     def sms_info(self):
         self.sms_sender.show_dialog(tk.Toplevel(self))
 
@@ -388,14 +445,14 @@ class CameraApp(tk.Tk):
                 self.sms_sender.new_msg_event.clear()
                 self.after(0, self._execute_trigger)
 
+            # Only the rows added since the last poll are fetched, and
+            # only the new messages are added to the chat box, unless the
+            # contact changed and the conversation has to be replaced
             if self.sms_sender and self.sms_sender.phone:
-                msgs = self.sms_sender.get_msg_history(
-                    self.sms_sender.phone)
-
-                if msgs != self._last_msg_history:
-                    self._last_msg_history = msgs
-                    self.chatbox._last_msg_history = msgs
-                    self.after(0, self.chatbox.refresh_chatbox,
+                history = self.sms_sender.history
+                if self.sms_sender.fetch_new_msgs(self.sms_sender.phone) or \
+                        self.sms_sender.history is not history:
+                    self.after(0, self.chatbox.show_new_msgs,
                                self.truncate_msgs)
 
         except Exception as e:
@@ -619,7 +676,13 @@ class CameraApp(tk.Tk):
             get_output_dir=lambda: getattr(self, "screenshot_directory", None))
 
         if self.show_graph:
-            self.loggernet = Loggernet()
+            # Polls every logger of LOGGERNET_URLS, the graph shows the first
+            self.acquisition = AcquisitionService().start()
+            logger = next(iter(self.acquisition.loggers))
+            self.loggernet = Loggernet(service=self.acquisition, logger=logger)
+            # Logger clock to camera clock, for the per-frame table
+            self.alignment = Alignment(self.acquisition, logger)
+            self.loggernet.detector.subscribe(self._on_depolarization)
 
         if self.show_webcam:
             self.cap = cv2.VideoCapture(0)
@@ -636,6 +699,8 @@ class CameraApp(tk.Tk):
         # Start camera feed
         self._init_sms_receiver()
         self.update_camera_feed()
+        if self.show_graph:
+            self.update_graph()
 
     def _show_trigger_settings(self):
         self.trigger.show_settings(tk.Toplevel(self), self._execute_trigger,
@@ -0,0 +1,211 @@
+"""
+Acquisition service for several CR6 dataloggers.
+
+One asyncio task per logger polls it (``CR6Client.poll``, so nothing is
+lost between polls) and hands the new records, stamped with their arrival
+time, to every subscriber: recording writers, live plots, frame alignment.
+Each logger keeps its own keep-alive session; the HTTP requests run on a
+shared pool of ``max_connections`` threads, which bounds the number of
+requests in flight whatever the number of loggers. A logger that fails is
+retried with exponential backoff without slowing down the others.
+
+Loggers are read from LOGGERNET_URLS, comma-separated ``name=url`` or bare
+URLs, and default to the single LOGGERNET_URL logger::
+
+    LOGGERNET_URLS="plant1=http://192.168.66.1/cr6,plant2=http://192.168.66.2/cr6"
+
+Try it against the stand-in logger with::
+
+    python -m src.tools.acquisition --mock 40 --seconds 10
+"""
+import argparse
+import asyncio
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+from src.tools.cr6 import CR6_URL, CR6Client, record_timestamp
+
+POLL_INTERVAL = 0.1  # s between two polls of the same logger
+MAX_CONNECTIONS = 16  # requests in flight at most, over all loggers
+BACKOFF_MIN = 0.5  # s, first retry delay after an error
+BACKOFF_MAX = 30  # s
+
+
+class Sample(NamedTuple):
+    logger: str  # name of the logger
+    no: int  # logger record number
+    time: str  # logger timestamp
+    t: float  # logger timestamp, epoch seconds
+    arrival: float  # time.monotonic() when the record was received
+    vals: list
+
+
+def loggers_from_env():
+    """``{name: url}`` of the configured loggers."""
+    urls = os.environ.get("LOGGERNET_URLS")
+    if not urls:
+        return {"cr6": CR6_URL}
+    loggers = {}
+    for i, entry in enumerate(filter(None, urls.split(","))):
+        name, _, url = entry.strip().rpartition("=")
+        loggers[name or f"cr6_{i}"] = url
+    return loggers
+
+
+class AcquisitionService:
+    def __init__(self, loggers=None, poll_interval=POLL_INTERVAL,
+                 max_connections=MAX_CONNECTIONS):
+        """
+        :param loggers: ``{name: url}``, ``loggers_from_env()`` by default
+        """
+        self.loggers = dict(loggers or loggers_from_env())
+        self.poll_interval = poll_interval
+        self.clients = {name: CR6Client(url)
+                        for name, url in self.loggers.items()}
+        self.stats = {name: {"records": 0, "polls": 0, "errors": 0,
+                             "backoff": 0.0, "last_arrival": None}
+                      for name in self.loggers}
+
+        self._subscribers = []
+        self._executor = ThreadPoolExecutor(max_connections,
+                                            thread_name_prefix="cr6")
+        self._loop = None
+        self._stopping = None
+        self._thread = None
+
+    def subscribe(self, callback, logger=None):
+        """
+        Calls ``callback(samples)`` with the new samples of ``logger`` (all
+        loggers if None) after each poll. Callbacks run on the service's
+        event loop and must not block: queue the samples or take a lock
+        briefly.
+        """
+        self._subscribers.append((logger, callback))
+
+    def unsubscribe(self, callback):
+        self._subscribers = [(name, cb) for name, cb in self._subscribers
+                             if cb != callback]
+
+    def _publish(self, name, samples):
+        for logger, callback in self._subscribers:
+            if logger is None or logger == name:
+                try:
+                    callback(samples)
+                except Exception as e:
+                    print(f"[ACQ] subscriber failed for {name}: {e}")
+
+    async def _poll_logger(self, name):
+        loop = asyncio.get_running_loop()
+        client = self.clients[name]
+        stats = self.stats[name]
+        backoff = BACKOFF_MIN
+        while not self._stopping.is_set():
+            try:
+                records = await loop.run_in_executor(self._executor,
+                                                     client.poll)
+            except Exception as e:
+                stats["errors"] += 1
+                # jitter so loggers that failed together don't retry together
+                stats["backoff"] = backoff * random.uniform(0.5, 1.0)
+                print(f"[ACQ] {name}: {e}, retrying in "
+                      f"{stats['backoff']:.1f}s")
+                await self._sleep(stats["backoff"])
+                backoff = min(backoff * 2, BACKOFF_MAX)
+                continue
+
+            backoff = BACKOFF_MIN
+            stats["backoff"] = 0.0
+            stats["polls"] += 1
+            if records:
+                arrival = time.monotonic()
+                stats["records"] += len(records)
+                stats["last_arrival"] = arrival
+                self._publish(name, [
+                    Sample(name, r.no, r.time, record_timestamp(r.time),
+                           arrival, r.vals) for r in records])
+            await self._sleep(self.poll_interval)
+
+    async def _sleep(self, delay):
+        """Sleeps ``delay`` seconds, less if the service stops."""
+        try:
+            await asyncio.wait_for(self._stopping.wait(), delay)
+        except asyncio.TimeoutError:
+            pass
+
+    async def run(self):
+        """Polls every logger until ``stop``."""
+        self._loop = asyncio.get_running_loop()
+        self._stopping = asyncio.Event()
+        await asyncio.gather(*(self._poll_logger(name)
+                               for name in self.loggers))
+
+    def start(self):
+        """Runs the service on its own thread."""
+        started = threading.Event()
+
+        def main():
+            async def run():
+                task = asyncio.ensure_future(self.run())
+                await asyncio.sleep(0)
+                started.set()
+                await task
+            asyncio.run(run())
+
+        self._thread = threading.Thread(target=main, daemon=True)
+        self._thread.start()
+        started.wait()
+        return self
+
+    def stop(self, timeout=5):
+        if self._loop and self._stopping:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+        if self._thread:
+            self._thread.join(timeout)
+        self._executor.shutdown(wait=False)
+        for client in self.clients.values():
+            client.close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Poll several CR6 loggers")
+    parser.add_argument("--mock", type=int, default=0,
+                        help="poll this many stand-in loggers instead")
+    parser.add_argument("--rate", type=float, default=100.0,
+                        help="records per second of each stand-in logger")
+    parser.add_argument("--seconds", type=float, default=10.0)
+    args = parser.parse_args()
+
+    mock = None
+    loggers = None
+    if args.mock:
+        from src.tools.mock_cr6 import MockCR6
+        mock = MockCR6(args.rate, loggers=args.mock).start()
+        loggers = {f"logger{k}": url for k, url in enumerate(mock.urls)}
+
+    lags = []
+    service = AcquisitionService(loggers)
+    service.subscribe(lambda samples: lags.extend(
+        time.time() - s.t for s in samples))
+    with service:
+        time.sleep(args.seconds)
+    if mock:
+        mock.stop()
+
+    records = sum(s["records"] for s in service.stats.values())
+    errors = sum(s["errors"] for s in service.stats.values())
+    lags.sort()
+    print(f"{len(service.loggers)} loggers: {records / args.seconds:.0f} "
+          f"records/s, {errors} errors")
+    if lags:
+        print(f"record age on arrival: p50 {lags[len(lags) // 2] * 1000:.0f} "
+              f"ms, p99 {lags[int(len(lags) * 0.99)] * 1000:.0f} ms")
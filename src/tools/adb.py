@@ -0,0 +1,144 @@
+"""
+Persistent ``adb shell`` sessions.
+
+Every ``adb shell <command>`` process costs 100-300 ms before the command
+even starts. ``AdbShell`` keeps one ``adb shell`` running and writes the
+commands to its stdin, each followed by an ``echo`` of a marker and the
+command's exit status, which frames its output::
+
+    content query --uri content://sms/inbox ...
+    echo "__adb_end_<token>__ $?"
+
+``AdbPool`` shares a few sessions between threads (the SMS poller, the
+chat history and the GUI sending messages). Commands are strings for the
+phone's shell exactly as with ``adb shell <args>``, so arguments keep the
+same quoting. Errors are raised as with ``subprocess.run(..., check=True)``.
+"""
+import queue
+import subprocess
+import threading
+import uuid
+
+SESSIONS = 2  # adb shell processes of a pool
+TIMEOUT = 10  # s for one command
+
+
+class AdbShell:
+    def __init__(self, adb, cwd=None, serial=None):
+        """
+        :param adb: path of the adb executable, or a command line (list)
+            that starts it
+        :param serial: device to talk to if several are connected
+        """
+        self.command = [adb] if isinstance(adb, str) else list(adb)
+        if serial:
+            self.command += ["-s", serial]
+        self.command.append("shell")
+        self.cwd = cwd
+        self.commands = 0
+        self._marker = f"__adb_end_{uuid.uuid4().hex}__"
+        self._process = None
+        self._lines = None
+        self._lock = threading.Lock()
+
+    def _start(self):
+        self._process = subprocess.Popen(
+            self.command, cwd=self.cwd, stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+            encoding="utf-8", errors="replace", bufsize=1)
+        self._lines = queue.Queue()
+        threading.Thread(target=self._read, args=(self._process, self._lines),
+                         daemon=True).start()
+
+    @staticmethod
+    def _read(process, lines):
+        for line in process.stdout:
+            lines.put(line)
+        lines.put(None)  # the session ended
+
+    def alive(self):
+        return self._process is not None and self._process.poll() is None
+
+    def run(self, args, timeout=TIMEOUT):
+        """
+        Runs ``args`` (list or string) in the session, starting it if
+        needed.
+
+        :return: the output of the command, stdout and stderr together
+        :raise subprocess.CalledProcessError: if the command fails or the
+            session ends
+        :raise subprocess.TimeoutExpired: the session is then restarted by
+            the next command
+        """
+        line = args if isinstance(args, str) else " ".join(map(str, args))
+        with self._lock:
+            if not self.alive():
+                self._start()
+            try:
+                self._process.stdin.write(
+                    f'{line}\necho "{self._marker} $?"\n')
+                self._process.stdin.flush()
+            except OSError:
+                self.close()
+                raise subprocess.CalledProcessError(255, line)
+
+            output = []
+            while True:
+                try:
+                    out = self._lines.get(timeout=timeout)
+                except queue.Empty:
+                    self.close()
+                    raise subprocess.TimeoutExpired(line, timeout,
+                                                    "".join(output))
+                if out is None:
+                    self.close()
+                    raise subprocess.CalledProcessError(255, line,
+                                                        "".join(output))
+                before, marker, status = out.rstrip("\r\n") \
+                    .rpartition(self._marker + " ")
+                if marker and status.isdigit():
+                    # the output may not end with a newline
+                    output.append(before)
+                    break
+                output.append(out)
+
+            self.commands += 1
+            output = "".join(output)
+            if int(status):
+                raise subprocess.CalledProcessError(int(status), line, output)
+            return output
+
+    def close(self):
+        if self._process is None:
+            return
+        try:
+            self._process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self._process.wait(1)
+        except subprocess.TimeoutExpired:
+            self._process.kill()
+        self._process = None
+
+
+class AdbPool:
+    """``sessions`` ``AdbShell`` used by whichever thread needs one."""
+
+    def __init__(self, adb, cwd=None, serial=None, sessions=SESSIONS):
+        self.shells = [AdbShell(adb, cwd, serial) for _ in range(sessions)]
+        self._idle = queue.Queue()
+        for shell in self.shells:
+            self._idle.put(shell)
+
+    def run(self, args, timeout=TIMEOUT):
+        """``AdbShell.run`` on the first idle session."""
+        shell = self._idle.get()
+        try:
+            return shell.run(args, timeout)
+        finally:
+            self._idle.put(shell)
+
+    def close(self):
+        for shell in self.shells:
+            shell.close()
@@ -0,0 +1,224 @@
+"""
+Time alignment of Loggernet samples with camera frames.
+
+Frames are stamped with ``time.monotonic()`` when the camera delivers them
+(``frames.csv`` of a recording, see image_queue.py). Logger samples carry
+the logger's own clock; ``ClockMap`` relates the two from the arrival times
+of the samples: a sample cannot arrive before it was recorded, so the
+smallest ``arrival - logger time`` seen is the offset between the clocks,
+up to the shortest network delay. The offset of a recording is saved in its
+``clock.json``.
+
+``asof_join`` then interpolates every channel at every frame time in one
+vectorized pass, and ``align_recording`` writes the merged per-frame table
+of a recording folder to ``aligned.csv``::
+
+    python -m src.tools.alignment saves/recordings_<timestamp>
+"""
+import argparse
+import csv
+import json
+import threading
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from src.analysis.depolarization import DETECTED_FLAG, WOUNDED_FLAG
+from src.tools.cr6 import record_timestamp
+from src.tools.series_store import SeriesStore
+
+FRAMES_FILE = "frames.csv"
+CLOCK_FILE = "clock.json"
+DATA_FILE = "data.csv"
+ALIGNED_FILE = "aligned.csv"
+# Samples further apart than this (s) are a gap, frames in it get NaN
+MAX_GAP = 1.0
+
+
+class ClockMap:
+    """Maps logger timestamps (epoch s) to ``time.monotonic()``."""
+
+    def __init__(self, offset=None):
+        self.offset = offset  # monotonic - logger time
+
+    def update(self, logger_t, arrival):
+        offset = arrival - logger_t
+        if self.offset is None or offset < self.offset:
+            self.offset = offset
+
+    def to_local(self, logger_t):
+        return np.asarray(logger_t) + self.offset
+
+    def to_logger(self, t):
+        return np.asarray(t) - self.offset
+
+
+def asof_join(frame_t, sample_t, values, flags=None, max_gap=MAX_GAP):
+    """
+    Values of the samples at the frame times.
+
+    :param frame_t: increasing frame times
+    :param sample_t: increasing sample times, on the same clock
+    :param values: array of shape ``(channels, len(sample_t))``
+    :param flags: optional sample flags, summed over the samples since the
+        previous frame
+    :return: ``values`` linearly interpolated at ``frame_t``, shape
+        ``(channels, len(frame_t))``, NaN outside the samples and in gaps
+        longer than ``max_gap``, and the summed flags if given
+    """
+    frame_t = np.asarray(frame_t, dtype=np.float64)
+    sample_t = np.asarray(sample_t, dtype=np.float64)
+    values = np.asarray(values, dtype=np.float64)
+    n = len(sample_t)
+    out = np.full((values.shape[0], len(frame_t)), np.nan)
+
+    # last sample at or before each frame
+    i = np.searchsorted(sample_t, frame_t, side="right") - 1
+    if n >= 2:
+        j = np.clip(i, 0, n - 2)
+        t0, t1 = sample_t[j], sample_t[j + 1]
+        inside = (i >= 0) & (frame_t <= sample_t[-1]) & \
+            ((t1 - t0 <= max_gap) | (frame_t == t0) | (frame_t == t1))
+        w = np.divide(frame_t - t0, t1 - t0, out=np.zeros_like(frame_t),
+                      where=t1 > t0)
+        joined = values[:, j] * (1 - w) + values[:, j + 1] * w
+        out[:, inside] = joined[:, inside]
+    elif n == 1:
+        out[:, frame_t == sample_t[0]] = values[:, :1]
+
+    if flags is None:
+        return out
+    counts = np.concatenate([[0], np.cumsum(flags)])[i + 1]
+    return out, np.diff(counts, prepend=0)
+
+
+class Alignment:
+    """
+    Live side: keeps the samples of one logger of an ``AcquisitionService``
+    on the monotonic clock, and the clock offset to save with recordings.
+    """
+
+    def __init__(self, service, logger=None, channels=3):
+        self.clock = ClockMap()
+        self.store = SeriesStore(channels)
+        self._lock = threading.Lock()
+        service.subscribe(self.on_samples, logger)
+
+    def on_samples(self, samples):
+        with self._lock:
+            for s in samples:
+                self.clock.update(s.t, s.arrival)
+            # timestamps are fixed once set, the offset only gets better
+            for s in samples:
+                self.store.append(self.clock.to_local(s.t), s.vals)
+
+    def at(self, frame_t):
+        """Channels interpolated at ``frame_t`` (monotonic, increasing)."""
+        frame_t = np.asarray(frame_t, dtype=np.float64)
+        with self._lock:
+            times, values, _ = self.store.since(frame_t.min() - MAX_GAP)
+        return asof_join(frame_t, times, values)
+
+    def save_clock(self, directory):
+        """Writes the clock offset next to the frames of a recording."""
+        with open(Path(directory) / CLOCK_FILE, "w") as f:
+            json.dump({"offset": self.clock.offset}, f)
+
+
+def _logger_times(strings):
+    """Logger time strings as epoch seconds, like ``record_timestamp``."""
+    strings = np.asarray(strings)
+    try:
+        parsed = strings.astype("datetime64[ms]")
+    except ValueError:
+        # recordings made before the logger time was kept
+        parsed = np.array([datetime.strptime(s, "%m/%d/%Y %H:%M:%S")
+                           for s in strings], dtype="datetime64[ms]")
+        strings = parsed.astype(str)
+    epoch = parsed.astype(np.int64) / 1000
+    # datetime64 is naive UTC, record_timestamp local time
+    return epoch + (record_timestamp(str(strings[0])) - epoch[0])
+
+
+def read_samples(directory):
+    """
+    Loggernet recording of ``directory``, CSV or float32 (see
+    recording_writer.py).
+
+    :return: channel names, logger times (epoch s), values
+        ``(channels, n)`` and flags
+    """
+    directory = Path(directory)
+    header_path = (directory / DATA_FILE).with_suffix(".json")
+    if header_path.exists():
+        with open(header_path) as f:
+            header = json.load(f)
+        columns = header["columns"]
+        data = np.fromfile(header_path.with_suffix(".f32"), np.float32) \
+            .reshape(-1, len(columns)).T
+        return (columns[1:-1], header["t0"] + data[0].astype(np.float64),
+                data[1:-1].astype(np.float64), data[-1])
+
+    with open(directory / DATA_FILE, newline="") as f:
+        columns, *rows = list(csv.reader(f))
+    if not rows:
+        return columns[1:-1], np.empty(0), \
+            np.empty((len(columns) - 2, 0)), np.empty(0)
+    times, *data = zip(*rows)
+    values = np.array(data, dtype=np.float64)  # "NAN" becomes nan
+    return columns[1:-1], _logger_times(times), values[:-1], values[-1]
+
+
+def read_frames(directory):
+    """``frame`` numbers, ``file`` names and monotonic times ``t``."""
+    with open(Path(directory) / FRAMES_FILE, newline="") as f:
+        rows = list(csv.DictReader(f))
+    return (np.array([int(r["frame"]) for r in rows], dtype=np.int64),
+            [r["file"] for r in rows],
+            np.array([float(r["t"]) for r in rows]))
+
+
+def align_recording(directory, max_gap=MAX_GAP):
+    """
+    Joins the Loggernet samples of a recording folder to its frames and
+    writes ``aligned.csv``: one row per frame with the channels at the frame
+    time, and the number of wounding marks and detected depolarizations
+    since the previous frame.
+
+    :return: path of the table
+    """
+    directory = Path(directory)
+    frames, files, frame_t = read_frames(directory)
+    with open(directory / CLOCK_FILE) as f:
+        clock = ClockMap(json.load(f)["offset"])
+    channels, sample_t, values, flags = read_samples(directory)
+
+    order = np.argsort(frame_t, kind="stable")
+    logger_t = clock.to_logger(frame_t[order])
+    flags = flags.astype(np.int64)
+    joined, wounded = asof_join(logger_t, sample_t, values,
+                                (flags & WOUNDED_FLAG) > 0, max_gap)
+    detected = asof_join(logger_t, sample_t, values[:0],
+                         (flags & DETECTED_FLAG) > 0, max_gap)[1]
+
+    path = directory / ALIGNED_FILE
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["frame", "file", "t", "logger_t"] + channels +
+                        ["wounded", "detected"])
+        for k, i in enumerate(order):
+            writer.writerow([frames[i], files[i], f"{frame_t[i]:.6f}",
+                             f"{logger_t[k]:.3f}"] +
+                            [f"{v:.4f}" for v in joined[:, k]] +
+                            [int(wounded[k]), int(detected[k])])
+    return path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description="Join the Loggernet samples of a recording to its frames")
+    parser.add_argument("directory")
+    parser.add_argument("--max-gap", type=float, default=MAX_GAP)
+    args = parser.parse_args()
+    print(f"Written {align_recording(args.directory, args.max_gap)}")
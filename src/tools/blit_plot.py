@@ -0,0 +1,104 @@
+"""
+Cheap redraws for live line plots.
+
+Only the line data changes from one frame to the next, so ``BlitPlot``
+renders the axes, ticks, legend and widgets once, keeps that picture and
+then only draws the lines on top of it (matplotlib "blitting"). A full
+redraw happens when the axis limits change or the window is resized.
+Lines are min/max decimated to the pixel width of the axes beforehand, so
+the cost of a frame does not grow with the number of samples shown.
+"""
+import time
+
+import numpy as np
+
+# Redraws per second at most, independent of the polling rate
+MAX_FPS = 20
+
+
+def minmax_decimate(y, width):
+    """
+    Reduces the columns of ``y`` to the minimum and maximum of ``width``
+    bins, which renders the same at ``width`` pixels. NaNs are ignored
+    unless a whole bin is NaN.
+
+    :param y: array of shape ``(lines, n)``
+    :return: ``x`` (sample index) and ``y`` with at most ``2 * width``
+        columns
+    """
+    n = y.shape[-1]
+    width = max(1, int(width))
+    if n <= 2 * width:
+        return np.arange(n), y
+    starts = np.linspace(0, n, width, endpoint=False).astype(int)
+    out = np.empty(y.shape[:-1] + (2 * width,), dtype=y.dtype)
+    out[..., 0::2] = np.fmin.reduceat(y, starts, axis=-1)
+    out[..., 1::2] = np.fmax.reduceat(y, starts, axis=-1)
+    return np.repeat(starts, 2), out
+
+
+class BlitPlot:
+    """
+    Redraws ``artists`` (lines, the title...) of ``fig`` over a cached
+    background, at most ``max_fps`` times per second.
+    """
+
+    def __init__(self, fig, artists, max_fps=MAX_FPS):
+        self.fig = fig
+        self.artists = list(artists)
+        self.max_fps = max_fps
+        for artist in self.artists:
+            artist.set_animated(True)
+
+        self.frames = 0
+        self.full_draws = 0
+        self._background = None
+        self._last = 0.0
+        fig.canvas.mpl_connect('draw_event', self._on_draw)
+
+    def _on_draw(self, _):
+        # everything but the animated artists was just drawn
+        self._background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        self._draw_artists()
+        self.full_draws += 1
+
+    def _draw_artists(self):
+        for artist in self.artists:
+            self.fig.draw_artist(artist)
+
+    def invalidate(self):
+        """Full redraw on the next idle, after changing limits or labels."""
+        self._background = None
+        self.fig.canvas.draw_idle()
+
+    def due(self):
+        return time.monotonic() - self._last >= 1 / self.max_fps
+
+    def fit_y(self, ax, lo, hi, margin=0.1):
+        """
+        Adjusts the y limits of ``ax`` if the data in ``[lo, hi]`` leaves
+        them or uses less than a third of them. Keeping the limits otherwise
+        lets most frames skip the full redraw.
+        """
+        if not (np.isfinite(lo) and np.isfinite(hi)):
+            return
+        y0, y1 = ax.get_ylim()
+        span = max(hi - lo, 1e-9)
+        if lo < y0 or hi > y1 or span < (y1 - y0) / 3:
+            ax.set_ylim(lo - margin * span, hi + margin * span)
+            self.invalidate()
+
+    def render(self):
+        """Draws a frame unless the previous one is too recent."""
+        if not self.due():
+            return False
+        self._last = time.monotonic()
+        canvas = self.fig.canvas
+        if self._background is None:
+            canvas.draw_idle()
+            return False
+        canvas.restore_region(self._background)
+        self._draw_artists()
+        canvas.blit(self.fig.bbox)
+        self.frames += 1
+        return True
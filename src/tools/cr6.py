@@ -0,0 +1,132 @@
+"""
+Client for the web API of the Campbell Scientific CR6 datalogger.
+
+Every poll asks for the records written since the last one seen
+(``DataQuery mode=since-record``) over a single keep-alive session, so
+nothing the logger stores between two polls is lost and the poll interval
+no longer has to match the logger's scan rate.
+"""
+import os
+import time
+from datetime import datetime
+from typing import NamedTuple
+
+import requests
+from requests.auth import HTTPBasicAuth
+
+# Set via LOGGERNET_URL / LOGGERNET_USER / LOGGERNET_PASS env vars
+CR6_URL = os.environ.get("LOGGERNET_URL", "http://192.168.66.1/cr6")
+DATA_TABLE = "dl:Data_Table"
+TIMEOUT = 2  # s
+# Empty polls in a row before checking whether the logger's table was reset
+RESET_CHECK_POLLS = 50
+
+
+class Record(NamedTuple):
+    no: int  # record number, increases by one per logger scan
+    time: str  # logger timestamp
+    vals: list
+
+
+def record_timestamp(time_str):
+    """Logger time string as epoch seconds, the local time if unparsable."""
+    try:
+        return datetime.fromisoformat(time_str).timestamp()
+    except (TypeError, ValueError):
+        return time.time()
+
+
+def parse_data_query(data):
+    """
+    Parses the JSON response of a CR6 ``DataQuery`` command.
+
+    :param data: decoded JSON response
+    :return: the list of field names and a list of ``(time, vals)`` records
+    """
+    fields = [f["name"] for f in data["head"]["fields"]]
+    records = [(record["time"], record["vals"]) for record in data["data"]]
+    return fields, records
+
+
+def parse_records(data):
+    """
+    Like ``parse_data_query``, but keeps the record numbers.
+
+    :return: the field names, a list of ``Record`` and whether the logger has
+        more records than it sent
+    """
+    fields = [f["name"] for f in data["head"]["fields"]]
+    records = [Record(record["no"], record["time"], record["vals"])
+               for record in data["data"]]
+    return fields, records, data.get("more", False)
+
+
+class CR6Client:
+    """
+    Polls one table of a CR6. ``poll`` returns the new records since the
+    previous call, the first call only returns the most recent one.
+    """
+
+    def __init__(self, url=CR6_URL, username=None, password=None,
+                 table=DATA_TABLE, timeout=TIMEOUT):
+        self.url = url
+        self.table = table
+        self.timeout = timeout
+        self.fields = None
+        self.last_record = None
+        self.requests = 0
+        self._empty_polls = 0
+
+        self.session = requests.Session()
+        self.session.auth = HTTPBasicAuth(
+            username or os.environ.get("LOGGERNET_USER", "your_username"),
+            password or os.environ.get("LOGGERNET_PASS", "your_password"))
+
+    def query(self, mode, p1=None):
+        params = {"command": "DataQuery", "uri": self.table, "mode": mode,
+                  "format": "json"}
+        if p1 is not None:
+            params["p1"] = p1
+        self.requests += 1
+        resp = self.session.get(self.url, params=params, timeout=self.timeout)
+        resp.raise_for_status()
+        fields, records, more = parse_records(resp.json())
+        self.fields = fields
+        return records, more
+
+    def most_recent(self, n=1):
+        return self.query("most-recent", n)[0]
+
+    def poll(self):
+        """New records since the last poll, oldest first."""
+        if self.last_record is None:
+            records = self.most_recent(1)
+        else:
+            records = []
+            more = True
+            while more:
+                batch, more = self.query("since-record",
+                                         (records[-1].no if records else
+                                          self.last_record) + 1)
+                batch = [r for r in batch if r.no > self.last_record]
+                if not batch:
+                    break
+                records.extend(batch)
+
+            self._empty_polls = 0 if records else self._empty_polls + 1
+            if self._empty_polls >= RESET_CHECK_POLLS and self._reset():
+                # the logger's table was reset (new program, cleared
+                # memory): start over from its newest record
+                records = self.most_recent(1)
+
+        if records:
+            self.last_record = records[-1].no
+        return records
+
+    def _reset(self):
+        self._empty_polls = 0
+        latest = self.most_recent(1)
+        return bool(latest) and latest[-1].no < self.last_record
+
+    def close(self):
+        self.session.close()
@@ -27,10 +27,15 @@ def _make_preview(img: Image.Image, bit_depth: int) -> Image.Image:
     scaled = np.clip(arr >> shift, 0, 255).astype(np.uint8)
     return Image.fromarray(scaled)
 
-from dlls.thorlabs_tsi_sdk.tl_camera import Frame
-from dlls.thorlabs_tsi_sdk.tl_camera_enums import SENSOR_TYPE
-from dlls.thorlabs_tsi_sdk.tl_mono_to_color_processor import \
-    MonoToColorProcessorSDK
+try:
+    from dlls.thorlabs_tsi_sdk.tl_camera import Frame
+    from dlls.thorlabs_tsi_sdk.tl_camera_enums import SENSOR_TYPE
+    from dlls.thorlabs_tsi_sdk.tl_mono_to_color_processor import \
+        MonoToColorProcessorSDK
+except ModuleNotFoundError:
+    # Thorlabs SDK not available: only monochrome (e.g. simulated) cameras
+    # from `src.tools.sim_camera` can be used.
+    SENSOR_TYPE = None
 
 
 class ImageAcquisitionThread(threading.Thread):
@@ -51,7 +56,8 @@ class ImageAcquisitionThread(threading.Thread):
         self.save_freq = save_freq
 
         # setup color processing if necessary
-        if self._camera.camera_sensor_type != SENSOR_TYPE.BAYER:
+        if SENSOR_TYPE is None \
+                or self._camera.camera_sensor_type != SENSOR_TYPE.BAYER:
             # Sensor type is not compatible with the color processing library
             self._is_color = False
         else:
@@ -73,6 +79,9 @@ class ImageAcquisitionThread(threading.Thread):
         self._queue_lock = threading.Lock()
         self._last_image_queue = None
         self._stop_event = threading.Event()
+        self._save_threads = []
+        # callables `listener(path, img)` run after each TIFF is saved
+        self.frame_listeners = []
 
     @property
     def image_dir(self) -> Optional[Path]:
@@ -98,13 +107,24 @@ class ImageAcquisitionThread(threading.Thread):
                 self._image_count = 0
         else:
             self._last_image_queue = self._image_queue
-            threading.Thread(target=self.save_images, args=(True,)).start()
+            self._start_saving(force_save=True)
 
         self._image_queue = queue.Queue()
 
     def get_output_queue(self):
         return self._image_queue
 
+    def _start_saving(self, force_save=False):
+        thread = threading.Thread(target=self.save_images, args=(force_save,))
+        self._save_threads = [t for t in self._save_threads if t.is_alive()]
+        self._save_threads.append(thread)
+        thread.start()
+
+    def wait_saved(self, timeout=None):
+        """Block until every pending chunk of frames has been written."""
+        for thread in list(self._save_threads):
+            thread.join(timeout)
+
     def save_images(self, force_save=False):
         with self._queue_lock:
             q = self._last_image_queue
@@ -117,6 +137,12 @@ class ImageAcquisitionThread(threading.Thread):
                 recording_dir = Path(self._image_dir)
                 preview_dir = recording_dir / "preview"
                 preview_dir.mkdir(exist_ok=True)
+                # acquisition time of every saved frame, see alignment.py
+                index_path = recording_dir / "frames.csv"
+                new_index = not index_path.exists()
+                index = open(index_path, "a", newline="")
+                if new_index:
+                    index.write("frame,file,t\n")
 
                 while not q.empty():
                     img = q.get()  # already 16-bit PIL Image carrying raw camera data
@@ -124,7 +150,15 @@ class ImageAcquisitionThread(threading.Thread):
                     if self._image_count % self.save_freq == 0:
                         stamp = time.strftime("%Y%m%d_%H%M%S")
                         name = f"{self._image_count}-{stamp}"
-                        img.save(str(recording_dir / f"{name}.tiff"))
+                        tiff_path = recording_dir / f"{name}.tiff"
+                        img.save(str(tiff_path))
+                        index.write(f"{self._image_count},{tiff_path.name},"
+                                    f"{img.info.get('t', float('nan')):.6f}\n")
+                        for listener in self.frame_listeners:
+                            try:
+                                listener(tiff_path, img)
+                            except Exception as e:
+                                print(f"[listener] failed for {name}: {e}")
                         # Linear 8-bit preview (same scale as the GUI)
                         try:
                             _make_preview(img, self._bit_depth).save(
@@ -133,6 +167,7 @@ class ImageAcquisitionThread(threading.Thread):
                             print(f"[preview] failed for {name}: {e}")
 
                     self._image_count += 1
+                index.close()
                 print(
                     f"Saved {self._image_count // self.save_freq} images in total to {recording_dir}")
 
@@ -181,6 +216,9 @@ class ImageAcquisitionThread(threading.Thread):
                         pil_image = self._get_color_image(frame)
                     else:
                         pil_image = self._get_image(frame)
+                    # monotonic acquisition time, the file names only have
+                    # the second they were saved at
+                    pil_image.info["t"] = time.monotonic()
                     self._image_queue.put_nowait(pil_image)
             except queue.Full:
                 # No point in keeping this image around when the queue is full, let's skip to the next one
@@ -201,7 +239,7 @@ class ImageAcquisitionThread(threading.Thread):
                     # create new queue
                     self._last_image_queue = self._image_queue
                     self._image_queue = queue.Queue()
-                    threading.Thread(target=self.save_images).start()
+                    self._start_saving()
 
         print("Image acquisition has stopped")
 
@@ -1,145 +1,189 @@
-import csv
-import os
 import threading
 import time
 
 import matplotlib.animation as animation
 import matplotlib.pyplot as plt
 import numpy as np
-import requests
-from requests.auth import HTTPBasicAuth
+
+from src.analysis.depolarization import DETECTED_FLAG, FLAGS_COLUMN, \
+    WOUNDED_FLAG, DepolarizationDetector
+from src.tools.blit_plot import minmax_decimate
+from src.tools.cr6 import CR6_URL, CR6Client, record_timestamp
+from src.tools.recording_writer import RecordingWriter
+from src.tools.series_store import SeriesStore
+
+# Time (in ms) between two redraws of the graph, whatever the logger's rate
+REFRESH_MS = 200
 
 
 class Loggernet:
-    def __init__(self):
-        self.INTERVAL = 0.1  # time (in s) to wait before retrieving the next data point
-        self.MAX_DATA = 30  # max number of data points to show on graph
+    """
+    Acquisition runs in its own thread, or in an ``AcquisitionService``
+    shared with other consumers, and keeps every record in ``self.store``;
+    ``update`` only draws a min/max downsampled view of the last ``WINDOW``
+    seconds, at whatever rate the GUI calls it.
+    """
+
+    def __init__(self, url=CR6_URL, service=None, logger=None):
+        """
+        :param service: running ``AcquisitionService`` to take the records
+            of ``logger`` from, instead of polling ``url`` here
+        """
+        self.INTERVAL = 0.1  # time (in s) between two requests to the logger, which return all new records
+        self.WINDOW = 30  # seconds of data to show on graph
         self.TITLE = "Title"
         self.X_LABEL = "Time"
         self.Y_LABEL = "Value"
-        self.path = None
+        self.writer = None
+        self._path = None
 
-        # Authentication credentials (set via LOGGERNET_USER / LOGGERNET_PASS env vars)
-        self.USERNAME = os.environ.get("LOGGERNET_USER", "your_username")
-        self.PASSWORD = os.environ.get("LOGGERNET_PASS", "your_password")
+        # Keep-alive session to the logger, credentials are read from the
+        # LOGGERNET_USER / LOGGERNET_PASS env vars
+        self.service = service
+        self.client = None if service else CR6Client(url)
 
-        # Data storage
-        self.timestamps = []  # x axis
-        self.data_list = []  # y axis
+        # Data storage, the flags of a sample are WOUNDED_FLAG if the plant
+        # was wounded, plus DETECTED_FLAG if a depolarization was detected
         self.labels = ["SE1", "SE2", "voltage diff"]
+        self.store = SeriesStore(len(self.labels))
+        self.detector = DepolarizationDetector(len(self.labels), self.labels)
         self.colors = ["red", "blue", "black"]
-        self.lines = []  # list of vertical lines
+        self.event_pending = False
+        self._drawn = 0  # store.total at the last redraw
 
         # Threading and plotting setup
         self.data_lock = threading.Lock()
         self.stop_event = threading.Event()
         self.fig, self.ax = plt.subplots()
-        self.graph = [self.ax.plot(self.timestamps, self.data_list, '-',
+        self.graph = [self.ax.plot([], [], '-',
                                    label=self.labels[i], color=self.colors[i])[
                           0]
                       for i in range(3)]
+        # wounding events, as vertical lines
+        self.markers = self.ax.vlines([], 0, 1, colors='red',
+                                      linestyles='--', label='Plant wounded',
+                                      transform=self.ax.get_xaxis_transform())
+        self.detected = self.ax.vlines([], 0, 1, colors='purple',
+                                       linestyles=':', label='Depolarization',
+                                       transform=self.ax.get_xaxis_transform())
 
         self.ax.set_title(self.TITLE)
-        self.ax.set_xlabel(self.X_LABEL)
+        self.ax.set_xlabel(self.X_LABEL + " (s ago)")
         self.ax.set_ylabel(self.Y_LABEL)
-        self.ax.set_xlim(self.MAX_DATA, 0)
+        self.ax.set_xlim(self.WINDOW, 0)
         self.ax.set_ylim(-1000, 0)
         self.ax.grid(True)
+        self.ax.legend(loc='center left', bbox_to_anchor=(1, 0.5))
+        plt.tight_layout()
 
         self.fig.canvas.mpl_connect('button_press_event', self.on_click)
         # self.fig.canvas.mpl_connect('key_press_event', self.on_click)
         self.fig.canvas.mpl_connect('close_event', self.on_close)
 
-        threading.Thread(target=self.fetch_latest, daemon=True).start()
+        if service:
+            service.subscribe(self.on_samples, logger)
+        else:
+            threading.Thread(target=self.fetch_latest, daemon=True).start()
 
-    def fetch_latest(self):
-        if self.path:
-            with open(self.path, 'w', newline='') as file:
-                csv.writer(file).writerows(
-                    [[self.X_LABEL] + self.labels + ["Plant wounded"]])
+    @property
+    def path(self):
+        return self._path
 
-        while not self.stop_event.is_set():
-            url = 'http://192.168.66.1/cr6'
-            params = {
-                'command': 'DataQuery',
-                'uri': 'dl:Data_Table',
-                'mode': 'most-recent',
-                'p1': 1,
-                'format': 'json'
-            }
-            auth = HTTPBasicAuth(self.USERNAME, self.PASSWORD)
+    @path.setter
+    def path(self, path):
+        """Starts recording to ``path``, or stops recording if None."""
+        if self.writer:
+            try:
+                self.writer.close()
+            except Exception as e:
+                print("Error closing recording:", e)
+            self.writer = None
+        self._path = path
+        if path:
+            self.writer = RecordingWriter(
+                path, [self.X_LABEL] + self.labels + [FLAGS_COLUMN])
 
+    def fetch_latest(self):
+        while not self.stop_event.is_set():
             try:
-                data = requests.get(url, params=params, auth=auth,
-                                    timeout=2).json()
-                if "data" not in data:
-                    break
-                record = data["data"][0]
-                # time_str = record["time"]
-                time_str = time.strftime("%m/%d/%Y %H:%M:%S")
-                vals = record["vals"]
-                (t, d) = time_str, vals
+                records = self.client.poll()
             except Exception as e:
                 print("Error fetching data:", e)
                 # Backoff on failure so we don't spin at full CPU
                 time.sleep(max(self.INTERVAL, 1.0))
                 continue
 
-            if not (t and d):
-                break
-
-            with self.data_lock:
-                self.data_list.append(d)
-                self.data_list[:] = self.data_list[-self.MAX_DATA:]
-                self.data_list[:] = [
-                    [np.nan if str(item).upper() == 'NAN' else item
-                     for item in row] for row in self.data_list]
-                self.timestamps[:] = list(
-                    range(len(self.data_list) - 1, -1, -1))
-                self.lines[:] = [i + 1 for i in self.lines]
-
-            if self.path:
-                with open(self.path, 'a', newline='') as file:
-                    csv.writer(file).writerows([[t] + d[:3] + [
-                        1 if self.lines and self.lines[-1] == 1 else 0]])
+            self.add_records((r.time, r.vals) for r in records)
             time.sleep(self.INTERVAL)
+        self.client.close()
+        self.path = None
         print("Data fetching stopped.")
         self.stop_event.set()
 
+    def on_samples(self, samples):
+        """``AcquisitionService`` subscriber."""
+        if self.stop_event.is_set():
+            self.service.unsubscribe(self.on_samples)
+            self.path = None
+            return
+        self.add_records((s.time, s.vals) for s in samples)
+
+    def add_records(self, records):
+        """Stores and records ``(time, vals)`` logger records."""
+        for t, d in records:
+            with self.data_lock:
+                flag = WOUNDED_FLAG if self.event_pending else 0
+                self.event_pending = False
+                t_s = record_timestamp(t)
+                event = self.detector.update(t_s, d[:3], notify=False)
+                if event:
+                    flag |= DETECTED_FLAG
+                self.store.append(t_s, d, flag)
+            if event:
+                self.detector.notify(event)
+
+            writer = self.writer
+            if writer:
+                writer.write(t, d[:3], flag)
+
     def update(self, _):
+        """
+        Redraws the last ``WINDOW`` seconds if new records arrived.
+
+        :return: the updated artists, empty if nothing changed
+        """
         if self.stop_event.is_set():
             print("Closing plot.")
             plt.close('all')
             return []
 
         with self.data_lock:
-            x = list(self.timestamps)
-            y_data = [list(col) for col in
-                      zip(*self.data_list)] if self.data_list else [[] for _ in
-                                                                    self.labels]
-            vlines = list(self.lines)
-
+            if self.store.total == self._drawn:
+                return []
+            self._drawn = self.store.total
+            latest = self.store.last_time()
+            times, values, flags = self.store.since(latest - self.WINDOW)
+
+        # x axis: seconds ago, at most two points per pixel column
+        ago = latest - times
+        idx, y_data = minmax_decimate(values, self.ax.bbox.width)
         for i, line in enumerate(self.graph):
-            if i < len(y_data):
-                line.set_data(x, y_data[i])
-
-        [l.remove() for l in self.ax.lines[len(self.graph):]]
-
-        latest_line = min(vlines) if vlines else -1
-        for i in vlines:
-            if i < self.MAX_DATA:
-                self.ax.axvline(x=i, color='red', linestyle='--',
-                                label='Plant wounded' if i == latest_line else None)
-
-        plt.tight_layout()
-        self.ax.legend(loc='center left', bbox_to_anchor=(1, 0.5))
-        self.ax.relim()
-        self.ax.autoscale_view()
-        return self.graph
+            line.set_data(ago[idx], y_data[i])
+        self.markers.set_segments([[(x, 0), (x, 1)]
+                                   for x in ago[(flags & WOUNDED_FLAG)
+                                                .astype(bool)]])
+        self.detected.set_segments([[(x, 0), (x, 1)] for x in
+                                    ago[(flags & DETECTED_FLAG).astype(bool)]])
+
+        if np.isfinite(y_data).any():
+            lo, hi = np.nanmin(y_data), np.nanmax(y_data)
+            margin = max(hi - lo, 1) * 0.05
+            self.ax.set_ylim(lo - margin, hi + margin)
+        return self.graph + [self.markers, self.detected]
 
     def on_click(self, _):
         with self.data_lock:
-            self.lines.append(0)
+            self.event_pending = True
 
     def on_close(self, _):
         self.stop_event.set()
@@ -147,7 +191,7 @@ class Loggernet:
 
     def run(self):
         ani = animation.FuncAnimation(self.fig, self.update,
-                                      interval=self.INTERVAL,
+                                      interval=REFRESH_MS,
                                       cache_frame_data=False)
         plt.show()
         print("Program exiting.")
@@ -1,47 +1,65 @@
-import csv
-import os
 import matplotlib.pyplot as plt
-import matplotlib.animation as animation
 import numpy as np
-import requests
 import threading
 import time
 import tkinter as tk
-from requests.auth import HTTPBasicAuth
+from pathlib import Path
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
 from matplotlib.widgets import Button, TextBox
 
+from src.analysis.depolarization import DETECTED_FLAG, FLAGS_COLUMN, \
+    WOUNDED_FLAG, DepolarizationDetector
+from src.tools.blit_plot import MAX_FPS, BlitPlot, minmax_decimate
+from src.tools.cr6 import CR6_URL, CR6Client, record_timestamp
+from src.tools.pyramid import Pyramid
+from src.tools.recording_writer import RECORDING_FORMAT, RecordingWriter
+from src.tools.ring_buffer import RingBuffer
+
+# Time (in s) between two requests to the logger; every request returns all
+# the records written since the previous one
+POLL_INTERVAL = 0.1
+
+
 class LoggernetLive:
-    def __init__(self, csv_filename, interval=0.01):
+    def __init__(self, csv_filename, interval=0.01, poll_interval=POLL_INTERVAL,
+                 url=CR6_URL, fmt=RECORDING_FORMAT, max_fps=MAX_FPS):
+        # interval: the logger's scan interval (time between two records)
         self.INTERVAL = interval
+        self.POLL_INTERVAL = poll_interval
+        # redraws per second at most, whatever the two intervals above
+        self.max_fps = max_fps
         self.MAX_DATA = int(120 / self.INTERVAL)
-        # Authentication credentials (set via LOGGERNET_USER / LOGGERNET_PASS env vars)
-        self.USERNAME = os.environ.get("LOGGERNET_USER", "your_username")
-        self.PASSWORD = os.environ.get("LOGGERNET_PASS", "your_password")
-        self.URL = 'http://192.168.66.1/cr6'
-        self.PARAMS = {
-            'command': 'DataQuery',
-            'uri': 'dl:Data_Table',
-            'mode': 'most-recent',
-            'p1': 1,
-            'format': 'json'
-        }
+        # Keep-alive session to the logger, credentials are read from the
+        # LOGGERNET_USER / LOGGERNET_PASS env vars
+        self.client = CR6Client(url)
 
         self.csv_filename = csv_filename
-        self.timestamps = []
-        self.data_list = []
-        self.flag_list = []
+        # "csv" or "f32", see recording_writer.py
+        self.fmt = fmt
+        self.writer = None
+        # last MAX_DATA samples, created once the channels are known
+        self.buffer = None
+        # every session, on disk next to the CSV (see pyramid.py), for
+        # windows longer than the buffer; kept while not recording so the
+        # plot can be panned back
+        self.history_dir = Path(csv_filename).with_name(
+            Path(csv_filename).stem + "_history")
+        self.history = None
+        # flags samples where the plotted channels depolarize
+        self.detector = None
         self.labels = None
         self.colors = None
         self.graph = []
+        self.renderer = None
 
         self.data_lock = threading.Lock()
         self.stop_event = threading.Event()
         self.recording = False
         self.event_pending = False
-        self.last_time_seen = None
 
         self.x_points_to_show = self.MAX_DATA
+        # points between the newest sample and the right edge of the plot
+        self.x_pan = 0
         self.y_min = None
         self.y_max = None
         self.auto_y_scale = True
@@ -64,6 +82,9 @@ class LoggernetLive:
         ax_wound = plt.axes([0.77, 0.68, 0.2, 0.08])
         self.btn_wound = Button(ax_wound, 'Wounding Event', color='salmon')
         self.btn_wound.on_clicked(self.on_wound)
+
+        # Scroll on the plot to zoom in time, shift+scroll to pan
+        self.fig.canvas.mpl_connect('scroll_event', self.on_scroll)
         
         # X-axis controls
         # Label for X-axis section
@@ -104,16 +125,19 @@ class LoggernetLive:
         self.txt_y_max.on_submit(self.update_y_max)
         
         # Instructions
-        self.fig.text(0.77, 0.08, 'Instructions:', fontsize=9, fontweight='bold')
-        self.fig.text(0.77, 0.05, '• Enter values and press Enter', fontsize=8)
-        self.fig.text(0.77, 0.02, '• Use Auto Y-Scale for dynamic range', fontsize=8)
+        self.fig.text(0.77, 0.10, 'Instructions:', fontsize=9, fontweight='bold')
+        self.fig.text(0.77, 0.07, '• Enter values and press Enter', fontsize=8)
+        self.fig.text(0.77, 0.04, '• Use Auto Y-Scale for dynamic range', fontsize=8)
+        self.fig.text(0.77, 0.01, '• Scroll to zoom, Shift+scroll to pan', fontsize=8)
 
     def update_x_points(self, text):
         """Update number of points to show on X-axis"""
         try:
             points = int(float(text))
             if points > 0:
-                self.x_points_to_show = min(points, self.MAX_DATA)
+                self.x_points_to_show = points
+                self.ax.set_xlim(0, self.x_points_to_show)
+                self.redraw()
                 # Update the minutes box accordingly
                 minutes = self.x_points_to_show * self.INTERVAL / 60
                 self.txt_x_minutes.set_val(f'{minutes:.2f}')
@@ -127,13 +151,29 @@ class LoggernetLive:
             minutes = float(text)
             if minutes > 0:
                 points = int(minutes * 60 / self.INTERVAL)
-                self.x_points_to_show = min(points, self.MAX_DATA)
+                self.x_points_to_show = max(1, points)
+                self.ax.set_xlim(0, self.x_points_to_show)
+                self.redraw()
                 # Update the points box accordingly
                 self.txt_x_points.set_val(str(self.x_points_to_show))
                 print(f"X-axis updated to show {minutes:.2f} minutes ({self.x_points_to_show} points)")
         except ValueError:
             print("Invalid input for X minutes")
 
+    def on_scroll(self, event):
+        """Zoom in/out of time around the right edge, or pan with Shift"""
+        if event.inaxes is not self.ax:
+            return
+        if event.key == 'shift':
+            # up goes back in time
+            step = max(1, self.x_points_to_show // 10)
+            step = step if event.button == 'up' else -step
+            self.x_pan = max(0, self.x_pan + step)
+        else:
+            factor = 1 / 1.25 if event.button == 'up' else 1.25
+            self.txt_x_points.set_val(
+                str(max(10, int(self.x_points_to_show * factor))))
+
     def toggle_auto_y(self, event):
         """Toggle automatic Y-axis scaling"""
         self.auto_y_scale = not self.auto_y_scale
@@ -143,6 +183,8 @@ class LoggernetLive:
         if not self.auto_y_scale:
             # If turning off auto scale, try to use current manual values
             self.apply_y_limits()
+        else:
+            self.redraw()
         
         print(f"Auto Y-scale: {'ON' if self.auto_y_scale else 'OFF'}")
 
@@ -172,6 +214,13 @@ class LoggernetLive:
         except ValueError:
             print("Invalid input for Y max")
 
+    def redraw(self):
+        """Full redraw, after changing anything but the lines and title"""
+        if self.renderer:
+            self.renderer.invalidate()
+        else:
+            self.fig.canvas.draw_idle()
+
     def apply_y_limits(self):
         """Apply manual Y-axis limits"""
         if self.y_min is not None and self.y_max is not None:
@@ -182,110 +231,176 @@ class LoggernetLive:
         elif self.y_max is not None:
             current_ylim = self.ax.get_ylim()
             self.ax.set_ylim(current_ylim[0], self.y_max)
+        self.redraw()
 
     def fetch_latest(self):
         first_pass = True
         while not self.stop_event.is_set():
             try:
-                resp = requests.get(self.URL, params=self.PARAMS, 
-                                 auth=HTTPBasicAuth(self.USERNAME, self.PASSWORD), timeout=2)
-                data = resp.json()
-                fields = [f["name"] for f in data["head"]["fields"]]
-                record = data["data"][0]
-                t = record["time"]
-                d = record["vals"]
+                records = self.client.poll()
                 
                 with self.data_lock:
-                    if first_pass:
-                        self.labels = fields
+                    if first_pass and self.client.fields:
+                        self.labels = self.client.fields
                         color_list = ["red", "blue", "green", "black", "orange", "purple", "cyan"]
                         self.colors = (color_list * ((len(self.labels) // len(color_list)) + 1))[:len(self.labels)]
-                        self.graph = [self.ax.plot([], [], '-', label=lbl, color=clr)[0] 
-                                    for lbl, clr in zip(self.labels[:-1], self.colors[:-1])]
+                        self.buffer = RingBuffer(len(self.labels), self.MAX_DATA)
+                        self.history = self.open_history()
+                        self.detector = DepolarizationDetector(
+                            max(1, len(self.labels) - 1), self.labels,
+                            rate=1 / self.INTERVAL)
+                        self.detector.subscribe(self.on_depolarization)
                         
-                        # Write CSV header
-                        with open(self.csv_filename, 'w', newline='') as f:
-                            writer = csv.writer(f)
-                            writer.writerow(['Time'] + self.labels + ["Flag"])
+                        # Writes the header, rows are written in the background
+                        self.writer = RecordingWriter(
+                            self.csv_filename,
+                            ['Time'] + self.labels + [FLAGS_COLUMN],
+                            fmt=self.fmt)
                         first_pass = False
                     
-                    # Only store new records (based on timestamp)
-                    if t != self.last_time_seen:
-                        self.timestamps.append(t)
-                        self.data_list.append(d)
-                        
-                        # Event flag: Set to 1 if event is pending, else 0
-                        if self.event_pending:
-                            self.flag_list.append(1)
-                            self.event_pending = False
-                        else:
-                            self.flag_list.append(0)
-                        
-                        self.timestamps[:] = self.timestamps[-self.MAX_DATA:]
-                        self.data_list[:] = self.data_list[-self.MAX_DATA:]
-                        self.flag_list[:] = self.flag_list[-self.MAX_DATA:]
+                    # The logger only returns records it hasn't sent yet
+                    events = []
+                    for _, t, d in records:
+                        # Event flags: WOUNDED_FLAG if an event is pending,
+                        # plus DETECTED_FLAG if a depolarization was detected
+                        flag = WOUNDED_FLAG if self.event_pending else 0
+                        self.event_pending = False
+                        t_s = record_timestamp(t)
+                        event = self.detector.update(t_s, d, notify=False)
+                        if event:
+                            flag |= DETECTED_FLAG
+                            events.append(event)
+                        self.buffer.append(t_s, d, flag)
+                        self.history.append(t_s, d)
                         
                         # Store ALL data to CSV only if recording is active
                         if self.recording:
-                            with open(self.csv_filename, 'a', newline='') as f:
-                                writer = csv.writer(f)
-                                writer.writerow([t] + d + [self.flag_list[-1]])
-                        
-                        self.last_time_seen = t  # update after storing
-                
-                time.sleep(self.INTERVAL)
+                            self.writer.write(t, d, flag)
+
+                # listeners run without holding the lock
+                for event in events:
+                    self.detector.notify(event)
+                if self.history:
+                    self.history.flush()
+                time.sleep(self.POLL_INTERVAL)
             except Exception as e:
                 print("Error fetching data:", e)
                 time.sleep(1)
         
+        self.client.close()
+        if self.writer:
+            try:
+                self.writer.close()
+            except Exception as e:
+                print("Error closing recording:", e)
+        if self.history:
+            self.history.close()
         self.stop_event.set()
 
+    def open_history(self):
+        """The history of the previous sessions, continued."""
+        try:
+            return Pyramid(self.history_dir, len(self.labels), mode="a")
+        except ValueError as e:
+            # the logger's channels changed, keep the old history aside
+            old_dir = self.history_dir.with_name(
+                f"{self.history_dir.name}_{time.strftime('%Y%m%d_%H%M%S')}")
+            print(f"{e}, moved to {old_dir}")
+            self.history_dir.rename(old_dir)
+            return Pyramid(self.history_dir, len(self.labels))
+
+    def setup_plot(self):
+        """Lines and everything that doesn't change from frame to frame"""
+        self.graph = [self.ax.plot([], [], '-', label=lbl, color=clr)[0]
+                      for lbl, clr in zip(self.labels[:-1], self.colors[:-1])]
+        self.ax.set_xlim(0, self.x_points_to_show)
+        self.ax.set_xlabel("Time (points, {:.2f}s steps)".format(self.INTERVAL))
+        self.ax.set_ylabel("Surface_Potential [mV]")
+        self.ax.legend(loc='upper left')
+        self.ax.grid(True)
+        self.ax.set_title("Live Logger Data")
+        if not self.auto_y_scale:
+            self.apply_y_limits()
+
+        # Only the lines and the title are redrawn every frame
+        self.renderer = BlitPlot(self.fig, self.graph + [self.ax.title],
+                                 max_fps=self.max_fps)
+        self.renderer.invalidate()
+
     def update(self, _):
         if self.stop_event.is_set():
             plt.close('all')
             return []
-        
+
+        if self.renderer and not self.renderer.due():
+            return self.graph
+
         with self.data_lock:
-            if not self.data_list:
+            if not self.buffer:
                 return self.graph
-            
-            # Use only the specified number of points for display
-            display_data = self.data_list[-self.x_points_to_show:]
-            
-            y_data = [list(col) for col in zip(*[row[:-1] for row in display_data])]
-            x = np.arange(len(display_data))
-            
-            for i, line in enumerate(self.graph):
-                if i < len(y_data):
-                    line.set_data(x, y_data[i])
-            
-            # Set X-axis limits based on displayed data
-            if len(display_data) > 0:
-                self.ax.set_xlim(0, len(display_data))
-            
-            # Handle Y-axis scaling
-            if self.auto_y_scale:
-                self.ax.relim()
-                self.ax.autoscale_view(scaley=True, scalex=False)
+            if not self.graph:
+                self.setup_plot()
+
+            # Windows the buffer can't show come from the history
+            wrapped = self.buffer.total > len(self.buffer)
+            from_history = self.x_pan or (
+                wrapped and self.x_points_to_show > len(self.buffer))
+            if from_history:
+                t_end = self.buffer.last()[0] - self.x_pan * self.INTERVAL
             else:
-                self.apply_y_limits()
-            
-            title = "Live Logger Data — " + ("RECORDING" if self.recording else "paused")
-            self.ax.set_title(title)
-            self.ax.set_xlabel("Time (points, {:.2f}s steps)".format(self.INTERVAL))
-            self.ax.set_ylabel("Surface_Potential [mV]")
-            self.ax.legend(loc='upper left')
-            self.ax.grid(True)
-            
-            # Update button label for start/stop
-            self.btn_rec.label.set_text("Stop Recording" if self.recording else "Start Recording")
-            self.btn_rec.color = "red" if self.recording else "lightgreen"
-            
-            return self.graph
+                # Use only the specified number of points for display,
+                # reduced to a min and max per pixel column of the axes
+                _, y_data, _ = self.buffer.view(self.x_points_to_show)
+                x, y_data = minmax_decimate(y_data[:len(self.graph)],
+                                            self.ax.bbox.width)
+
+        if from_history:
+            x, y_data = self.history_view(t_end)
+        for i, line in enumerate(self.graph):
+            line.set_data(x, y_data[i])
+
+        # Handle Y-axis scaling
+        if self.auto_y_scale and np.isfinite(y_data).any():
+            self.renderer.fit_y(self.ax, np.nanmin(y_data), np.nanmax(y_data))
+
+        title = "Live Logger Data — " + ("RECORDING" if self.recording else "paused")
+        if self.recording and self.writer:
+            title += " (write lag {lag_ms:.0f} ms)".format(**self.writer.stats())
+        if self.x_pan:
+            ago = self.x_pan * self.INTERVAL
+            title += " — {:.1f} s ago".format(ago) if ago < 120 else \
+                " — {:.1f} min ago".format(ago / 60)
+        self.ax.title.set_text(title)
+
+        self.renderer.render()
+        return self.graph
+
+    def history_view(self, t_end):
+        """
+        The ``x_points_to_show`` points up to ``t_end`` from the history, as
+        a min and max per pixel column of the axes
+        """
+        t_start = t_end - self.x_points_to_show * self.INTERVAL
+        t, vmin, vmax, _ = self.history.window(t_start, t_end,
+                                               int(self.ax.bbox.width))
+        n = len(self.graph)
+        x = np.repeat((t - t_start) / self.INTERVAL, 2)
+        y_data = np.empty((n, len(x)))
+        y_data[:, 0::2] = vmin[:n]
+        y_data[:, 1::2] = vmax[:n]
+        return x, y_data
 
     def toggle_recording(self, event):
         """Toggle recording state"""
         self.recording = not self.recording
+        if not self.recording and self.writer:
+            # Everything recorded so far is on disk once "stopped" is shown
+            self.writer.flush()
+
+        # Update button label for start/stop
+        self.btn_rec.label.set_text("Stop Recording" if self.recording else "Start Recording")
+        self.btn_rec.color = "red" if self.recording else "lightgreen"
+        self.redraw()
         print("Recording started." if self.recording else "Recording stopped.")
 
     def on_wound(self, event):
@@ -294,6 +409,13 @@ class LoggernetLive:
             self.event_pending = True
         print("Wounding event flagged.")
 
+    def on_depolarization(self, event):
+        """Detector listener, on the fetching thread"""
+        print("Depolarization on {} at {}: {:+.1f} mV from baseline, "
+              "{:+.1f} mV/s".format(event.label, time.strftime(
+                  "%H:%M:%S", time.localtime(event.t)),
+                  event.value - event.baseline, event.slope))
+
     def run(self):
         # REMOVE plt.show(); instead open a dedicated Tk window
         root = tk.Tk()
@@ -317,17 +439,15 @@ class LoggernetLive:
 
         # IMPORTANT: keep references alive
         self.canvas = canvas
-        self.ani = animation.FuncAnimation(
-            self.fig,
-            self.update,
-            interval=int(self.INTERVAL * 1000),
-            cache_frame_data=False
-        )
+        self.timer = canvas.new_timer(interval=int(1000 / self.max_fps))
+        self.timer.add_callback(self.update, None)
+        self.timer.start()
 
         canvas.draw()
         root.mainloop()
 
 if __name__ == '__main__':
     filename = input("Enter output CSV filename: ")
-    # Change interval here (e.g., 0.01, 0.05, or 0.1 for 10, 20, or 100 Hz polling)
+    # interval is the logger's scan interval (0.01, 0.05 or 0.1 for 100, 20
+    # or 10 Hz); all records are fetched whatever the poll interval
     LoggernetLive(filename, interval=0.01).run()
\ No newline at end of file
@@ -0,0 +1,65 @@
+"""
+In-memory history of the SMS exchanged with one phone number, merged
+incrementally from the phone's inbox and sent tables.
+
+Each table is only queried for rows past the highest ``_id`` already seen
+(``last_id``) and for recent ones, as a message can get a lower ``_id``
+than one already seen. Rows already merged are skipped and the new ones
+are inserted in time order. Readers such as the chat box take the messages
+past those they already show with ``since``; ``epoch`` changes when a
+message had to be inserted before the end, which only happens when two
+messages cross.
+"""
+import bisect
+import threading
+
+TYPES = ("received", "sent")
+
+
+class MessageStore:
+    def __init__(self, phone=None):
+        self.phone = phone
+        self.messages = []  # {"type", "body", "timestamp", "_id"}, oldest first
+        self.last_id = dict.fromkeys(TYPES, 0)
+        self.epoch = 0
+        self._times = []
+        self._ids = set()  # (type, _id)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.messages)
+
+    def merge(self, msg_type, rows):
+        """
+        Adds the rows of the ``msg_type`` table, ``{"_id", "date", "body",
+        "address"}`` as parsed from ``content query``. Rows from other
+        numbers only move ``last_id``.
+
+        :return: the new messages
+        """
+        new = []
+        with self._lock:
+            for row in rows:
+                _id = int(row["_id"])
+                self.last_id[msg_type] = max(self.last_id[msg_type], _id)
+                if (msg_type, _id) in self._ids or \
+                        self.phone not in row["address"]:
+                    continue
+                self._ids.add((msg_type, _id))
+                msg = {"type": msg_type, "body": row["body"].strip(),
+                       "timestamp": int(row["date"]), "_id": _id}
+                i = bisect.bisect_right(self._times, msg["timestamp"])
+                if i < len(self._times):
+                    self.epoch += 1
+                self._times.insert(i, msg["timestamp"])
+                self.messages.insert(i, msg)
+                new.append(msg)
+        return new
+
+    def since(self, count):
+        """
+        ``(epoch, messages)``: the messages after the first ``count``, which
+        are unchanged if ``epoch`` is.
+        """
+        with self._lock:
+            return self.epoch, self.messages[count:]
@@ -0,0 +1,176 @@
+"""
+Local stand-in for a CR6 datalogger's web API, for tests and throughput
+measurements without the logger.
+
+It answers ``DataQuery`` (``most-recent`` and ``since-record``) on a
+synthetic ``Data_Table`` that gains ``rate`` records per second: two
+surface-potential electrodes around -500 mV, their difference and the
+battery voltage. Like the CR6, it keeps ``table_size`` records and sends at
+most ``max_records`` per response, with ``"more": true`` when truncated.
+
+With ``loggers=N`` the same server stands in for N loggers, at
+``/logger<k>/cr6`` (see ``urls``), for load tests of the acquisition
+service. Loggers listed in ``down`` answer 503.
+
+Run standalone with::
+
+    python -m src.tools.mock_cr6 --port 8080 --rate 100 --loggers 40
+"""
+import argparse
+import json
+import math
+import re
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+FIELDS = ["SE1", "SE2", "voltage_diff", "BattV"]
+
+
+class MockCR6:
+    def __init__(self, rate=100.0, host="127.0.0.1", port=0,
+                 table_size=100000, max_records=1000, loggers=1):
+        self.rate = rate
+        self.table_size = table_size
+        self.max_records = max_records
+        self.loggers = loggers
+        self.down = set()  # indices of the loggers that fail every request
+        self.requests = 0
+        self._t0 = time.monotonic()
+        self._wall0 = datetime.now()
+        self._lock = threading.Lock()
+
+        server = type("Server", (ThreadingHTTPServer,),
+                      {"request_queue_size": 128})
+        self._server = server((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/cr6"
+
+    @property
+    def urls(self):
+        host, port = self._server.server_address[:2]
+        return [f"http://{host}:{port}/logger{k}/cr6"
+                for k in range(self.loggers)]
+
+    def latest_record(self):
+        return int((time.monotonic() - self._t0) * self.rate)
+
+    def record(self, no, logger=0):
+        """The synthetic record ``no``, same values on every request."""
+        t = no / self.rate
+        se1 = -500 + 20 * math.sin(t / 5 + logger) + \
+            3 * math.sin(no * 12.9898)
+        se2 = -480 + 15 * math.cos(t / 7 + logger) + \
+            3 * math.sin(no * 78.233)
+        when = self._wall0 + timedelta(seconds=t)
+        return {"no": no, "time": when.isoformat(timespec="milliseconds"),
+                "vals": [round(se1, 3), round(se2, 3), round(se1 - se2, 3),
+                         12.6]}
+
+    def data_query(self, mode, p1, logger=0):
+        latest = self.latest_record()
+        oldest = max(0, latest - self.table_size + 1)
+        if mode == "most-recent":
+            first = max(oldest, latest - max(1, p1) + 1)
+        elif mode == "since-record":
+            first = max(oldest, p1)
+        else:
+            raise ValueError(f"unsupported mode {mode}")
+
+        last = min(latest, first + self.max_records - 1)
+        return {
+            "head": {"signature": 0, "environment": {"model": "CR6"},
+                     "fields": [{"name": name, "type": "xsd:float"}
+                                for name in FIELDS]},
+            "data": [self.record(no, logger)
+                     for no in range(first, last + 1)],
+            "more": last < latest,
+        }
+
+    def _handler(self):
+        logger = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # keep-alive, like the CR6; headers and body are sent
+            # separately, without TCP_NODELAY each response waits ~40 ms
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                query = {k: v[0] for k, v in
+                         parse_qs(urlparse(self.path).query).items()}
+                match = re.match(r"/logger(\d+)/", self.path)
+                k = int(match.group(1)) if match else 0
+                with logger._lock:
+                    logger.requests += 1
+                try:
+                    if k >= logger.loggers:
+                        raise LookupError(f"no logger {k}")
+                    if k in logger.down:
+                        raise ConnectionError("logger unavailable")
+                    if query.get("command") != "DataQuery":
+                        raise ValueError("unsupported command")
+                    body = json.dumps(logger.data_query(
+                        query.get("mode", "most-recent"),
+                        int(query.get("p1", 1)), k)).encode()
+                    self.send_response(200)
+                except (ValueError, LookupError, ConnectionError) as e:
+                    body = json.dumps({"error": str(e)}).encode()
+                    self.send_response(
+                        400 if isinstance(e, ValueError) else
+                        404 if isinstance(e, LookupError) else 503)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Stand-in CR6 web API")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--rate", type=float, default=100.0,
+                        help="records per second")
+    parser.add_argument("--loggers", type=int, default=1,
+                        help="number of loggers to stand in for")
+    args = parser.parse_args()
+
+    logger = MockCR6(args.rate, host="0.0.0.0", port=args.port,
+                     loggers=args.loggers).start()
+    print(f"Serving {args.rate:g} records/s at {logger.url}, "
+          f"set LOGGERNET_URL to use it")
+    if args.loggers > 1:
+        print(f"{args.loggers} loggers at {logger.urls[0]} ... "
+              f"{logger.urls[-1]}, set LOGGERNET_URLS to use them")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        logger.stop()
@@ -0,0 +1,229 @@
+"""
+Persisted multi-resolution history of a multi-channel series, so a plot can
+show any window of a long session, from single samples to hours, without
+reading more than about ``max_points`` records of it.
+
+Level 0 holds the raw samples; every record of level ``k`` summarizes
+``factor`` records of level ``k - 1`` with the min, max and mean of each
+channel. Levels are built incrementally as samples are appended (O(1)
+amortized per sample) and written to one append-only file per level next to
+a JSON header::
+
+    <directory>/pyramid.json
+    <directory>/level0.bin ... level<levels - 1>.bin
+
+Queries memory-map the level files, so only the records in the window are
+read from disk.
+"""
+import json
+import os
+import threading
+from pathlib import Path
+
+import numpy as np
+
+FACTOR = 16
+LEVELS = 6  # the top level summarizes 16**5 ~ 1M samples per record
+
+
+def _raw_dtype(channels):
+    return np.dtype([("t", "<f8"), ("v", "<f4", (channels,))])
+
+
+def _summary_dtype(channels):
+    return np.dtype([("t", "<f8"), ("min", "<f4", (channels,)),
+                     ("max", "<f4", (channels,)),
+                     ("mean", "<f4", (channels,)),
+                     ("count", "<u4", (channels,))])
+
+
+class _Accumulator:
+    """The level ``k`` record being built from level ``k - 1`` records."""
+
+    def __init__(self, channels):
+        self.channels = channels
+        self.reset()
+
+    def reset(self):
+        self.t = None
+        self.n = 0
+        self.min = np.full(self.channels, np.nan)
+        self.max = np.full(self.channels, np.nan)
+        self.sum = np.zeros(self.channels)
+        self.count = np.zeros(self.channels, dtype=np.int64)
+
+    def add(self, t, vmin, vmax, vsum, count):
+        if self.t is None:
+            self.t = t
+        self.n += 1
+        self.min = np.fmin(self.min, vmin)
+        self.max = np.fmax(self.max, vmax)
+        self.sum += vsum
+        self.count += count
+
+    def record(self, dtype):
+        record = np.zeros(1, dtype)
+        record["t"] = self.t
+        record["min"] = self.min
+        record["max"] = self.max
+        with np.errstate(invalid="ignore", divide="ignore"):
+            record["mean"] = self.sum / self.count
+        record["count"] = self.count
+        return record
+
+
+class Pyramid:
+    def __init__(self, directory, channels=None, factor=FACTOR, levels=LEVELS,
+                 mode="w"):
+        """
+        :param mode: "w" to start a new history in ``directory``, "a" to
+            add to the one there (or start one), "r" to read an existing one
+            (``channels``, ``factor`` and ``levels`` are then read from its
+            header)
+        :raise ValueError: if "a" finds a history with other parameters
+        """
+        self.directory = Path(directory)
+        if mode == "a" and not (self.directory / "pyramid.json").exists():
+            mode = "w"
+        self.mode = mode
+        if mode in ("r", "a"):
+            with open(self.directory / "pyramid.json") as f:
+                header = json.load(f)
+            if mode == "a" and (channels, factor, levels) != (
+                    header["channels"], header["factor"], header["levels"]):
+                raise ValueError(f"{self.directory} holds a history of "
+                                 f"another shape: {header}")
+            channels, factor, levels = \
+                header["channels"], header["factor"], header["levels"]
+        elif mode == "w":
+            self.directory.mkdir(parents=True, exist_ok=True)
+            with open(self.directory / "pyramid.json", "w") as f:
+                json.dump({"channels": channels, "factor": factor,
+                           "levels": levels}, f)
+        else:
+            raise ValueError(f"unknown mode {mode}")
+
+        self.channels = channels
+        self.factor = factor
+        self.levels = levels
+        self.dtypes = [_raw_dtype(channels)] + \
+            [_summary_dtype(channels)] * (levels - 1)
+        self._lock = threading.Lock()
+        self._files = []
+        self._acc = []
+        if mode == "a":
+            # drop a record cut short by a crash, it would shift the rest
+            for k in range(levels):
+                path = self._path(k)
+                if path.exists():
+                    size = path.stat().st_size
+                    os.truncate(path, size - size % self.dtypes[k].itemsize)
+        if mode in ("w", "a"):
+            # a new session starts with empty accumulators; the partial
+            # records of the previous one are lost
+            self._files = [open(self._path(k), mode + "b", buffering=1 << 16)
+                           for k in range(levels)]
+            self._acc = [None] + [_Accumulator(channels)
+                                  for _ in range(1, levels)]
+        self.total = self._size(0)
+
+    def _path(self, k):
+        return self.directory / f"level{k}.bin"
+
+    def _size(self, k):
+        path = self._path(k)
+        return path.stat().st_size // self.dtypes[k].itemsize \
+            if path.exists() else 0
+
+    def append(self, t, vals):
+        """Adds one sample, the logger's "NAN" strings become NaN."""
+        vals = np.asarray(vals, dtype=np.float64)[:self.channels]
+        record = np.zeros(1, self.dtypes[0])
+        record["t"] = t
+        record["v"][0, :len(vals)] = vals
+        record["v"][0, len(vals):] = np.nan
+        v = record["v"][0].astype(np.float64)
+
+        with self._lock:
+            self._files[0].write(record.tobytes())
+            self.total += 1
+            finite = ~np.isnan(v)
+            self._carry(1, t, v, v, np.where(finite, v, 0), finite)
+
+    def _carry(self, k, t, vmin, vmax, vsum, count):
+        """Adds a level ``k - 1`` record to the level ``k`` accumulator."""
+        if k >= self.levels:
+            return
+        acc = self._acc[k]
+        acc.add(t, vmin, vmax, vsum, count)
+        if acc.n == self.factor:
+            record = acc.record(self.dtypes[k])
+            self._files[k].write(record.tobytes())
+            self._carry(k + 1, acc.t, acc.min, acc.max, acc.sum, acc.count)
+            acc.reset()
+
+    def _partial(self, k):
+        """
+        The level ``k`` record still being built: the accumulator of level
+        ``k`` merged with those below it, which hold the newer samples.
+        """
+        partial = _Accumulator(self.channels)
+        for acc in self._acc[k:0:-1]:
+            if acc.n:
+                partial.add(acc.t, acc.min, acc.max, acc.sum, acc.count)
+        return partial
+
+    def flush(self):
+        """Makes the appended samples visible to ``window``."""
+        with self._lock:
+            for f in self._files:
+                f.flush()
+
+    def close(self):
+        with self._lock:
+            for f in self._files:
+                f.close()
+            self._files = []
+
+    def level(self, k):
+        """Level ``k`` as a read-only memory map (empty if no record)."""
+        n = self._size(k)
+        if n == 0:
+            return np.empty(0, self.dtypes[k])
+        return np.memmap(self._path(k), self.dtypes[k], mode="r", shape=(n,))
+
+    def window(self, t0, t1, max_points=2000):
+        """
+        The samples between ``t0`` and ``t1`` at the finest level that has
+        at most ``max_points`` records in that window.
+
+        :return: ``(t, vmin, vmax, vmean)``, the values of shape
+            ``(channels, n)``; ``t`` is the start of each record
+        """
+        for k in range(self.levels):
+            data = self.level(k)
+            times = data["t"]
+            # the record containing t0 starts before it
+            lo = max(0, np.searchsorted(times, t0, side="right") - 1)
+            hi = np.searchsorted(times, t1, side="right")
+            if hi - lo <= max_points or k == self.levels - 1:
+                break
+
+        data = np.array(data[lo:hi])  # copy out of the memory map
+        if k == 0:
+            values = data["v"].T.astype(np.float64)
+            return data["t"], values, values, values
+
+        t = data["t"]
+        vmin, vmax, vmean = (data[name].T.astype(np.float64)
+                             for name in ("min", "max", "mean"))
+        with self._lock:
+            acc = self._partial(k) if self._acc else None
+            if acc is not None and acc.n and acc.t <= t1:
+                partial = acc.record(self.dtypes[k])
+                t = np.append(t, partial["t"])
+                vmin, vmax, vmean = (
+                    np.hstack([arr, partial[name].T.astype(np.float64)])
+                    for arr, name in ((vmin, "min"), (vmax, "max"),
+                                      (vmean, "mean")))
+        return t, vmin, vmax, vmean
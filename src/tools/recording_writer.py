@@ -0,0 +1,183 @@
+"""
+Background writer for Loggernet recordings.
+
+Samples are handed over with ``write`` (never blocks on disk) and written by
+a dedicated thread through one buffered file handle, which is flushed every
+``flush_rows`` rows or ``flush_ms`` milliseconds and fsynced on ``close``.
+
+Two formats are supported:
+
+* ``"csv"``: ``time, <channels>, flag`` rows, as before. Loggernet writes
+  the ``FLAGS_COLUMN`` bitfield of ``src/analysis/depolarization.py`` there
+* ``"f32"``: a flat float32 array, one row of ``t, <channels>, flag`` per
+  sample where ``t`` is seconds since the first sample ``t0`` (epoch
+  seconds), next to a JSON header with the column names and ``t0``. Load it with
+  ``np.fromfile(path, np.float32).reshape(-1, len(header["columns"]))``.
+  At 4 bytes per value it is about half the size of the CSV and loads
+  without parsing; ``t`` keeps 1 ms resolution for ~4 hours, 4 ms for 18.
+"""
+import csv
+import json
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from src.tools.cr6 import record_timestamp
+
+# Default format of new recordings, "csv" or "f32"
+RECORDING_FORMAT = os.environ.get("LOGGERNET_FORMAT", "csv")
+FLUSH_ROWS = 500
+FLUSH_MS = 1000
+CLOSE_TIMEOUT = 10  # s to write what is left when closing
+
+
+class RecordingWriter:
+    def __init__(self, path, columns, fmt=RECORDING_FORMAT,
+                 flush_rows=FLUSH_ROWS, flush_ms=FLUSH_MS):
+        """
+        :param path: CSV file to write, the binary format writes
+            ``<path stem>.f32`` and ``<path stem>.json`` instead
+        :param columns: all column names, ``columns[0]`` being the time
+        """
+        if fmt not in ("csv", "f32"):
+            raise ValueError(f"unknown recording format {fmt}")
+        self.path = Path(path)
+        self.columns = list(columns)
+        self.fmt = fmt
+        self.flush_rows = flush_rows
+        self.flush_ms = flush_ms
+
+        self._queue = queue.SimpleQueue()
+        self._sync = threading.Event()
+        self._synced = threading.Event()
+        self._closed = False
+        self.error = None  # what stopped the writer thread
+
+        self.rows_queued = 0
+        self.rows_written = 0
+        self.flushes = 0
+        self.lag_ms = 0.0
+        self.max_lag_ms = 0.0
+
+        self._file = self._open()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _open(self):
+        if self.fmt == "csv":
+            f = open(self.path, "w", newline="", buffering=1 << 16)
+            self._csv = csv.writer(f)
+            self._csv.writerow(self.columns)
+            return f
+
+        self.t0 = None  # set by the first sample, with the JSON header
+        return open(self.path.with_suffix(".f32"), "wb", buffering=1 << 16)
+
+    def _write_header(self, t0):
+        self.t0 = t0
+        with open(self.path.with_suffix(".json"), "w") as f:
+            json.dump({"columns": self.columns, "dtype": "float32",
+                       "t0": t0}, f)
+
+    def write(self, t, vals, flag=0):
+        """Queue one sample, ``t`` is the logger's time string."""
+        if self._closed:
+            return
+        self.rows_queued += 1
+        self._queue.put((time.monotonic(), t, list(vals), flag))
+
+    def flush(self, timeout=5):
+        """Write, flush and fsync everything queued so far."""
+        self._synced.clear()
+        self._sync.set()
+        self._queue.put(None)
+        self._synced.wait(timeout)
+
+    def _write_rows(self, rows):
+        if self.fmt == "csv":
+            self._csv.writerows([t] + vals + [flag]
+                                for _, t, vals, flag in rows)
+        else:
+            width = len(self.columns)
+            if self.t0 is None:
+                self._write_header(record_timestamp(rows[0][1]))
+            data = np.full((len(rows), width), np.nan, dtype=np.float32)
+            for i, (_, t, vals, flag) in enumerate(rows):
+                data[i, 0] = record_timestamp(t) - self.t0
+                vals = np.asarray(vals, dtype=np.float64)[:width - 2]
+                data[i, 1:1 + len(vals)] = vals
+                data[i, -1] = flag
+            data.tofile(self._file)
+
+    def _run(self):
+        try:
+            self._write_loop()
+        except Exception as e:
+            print(f"[RECORDING] Writing {self.path} failed: {e}")
+            self.error = e
+            self._synced.set()
+
+    def _write_loop(self):
+        rows = []
+        deadline = None
+        while True:
+            timeout = None if deadline is None else max(
+                0.0, deadline - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+                if item is not None:
+                    rows.append(item)
+                    deadline = deadline or time.monotonic() + \
+                        self.flush_ms / 1000
+            except queue.Empty:
+                pass
+
+            syncing = self._sync.is_set()
+            if rows and (syncing or len(rows) >= self.flush_rows
+                         or time.monotonic() >= deadline):
+                self._write_rows(rows)
+                self._file.flush()
+                self.flushes += 1
+                self.rows_written += len(rows)
+                self.lag_ms = (time.monotonic() - rows[0][0]) * 1000
+                self.max_lag_ms = max(self.max_lag_ms, self.lag_ms)
+                rows = []
+                deadline = None
+
+            if syncing and self._queue.empty():
+                os.fsync(self._file.fileno())
+                self._sync.clear()
+                self._synced.set()
+                if self._closed:
+                    return
+
+    def close(self, timeout=CLOSE_TIMEOUT):
+        """
+        Write what is left, fsync and close the file.
+
+        :raise: the error that stopped the writer thread, or
+            ``TimeoutError`` if it is still writing after ``timeout`` s
+        """
+        if self._closed:
+            return
+        self._closed = True
+        self.flush(timeout)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            raise TimeoutError(f"{self.path} still being written after "
+                               f"{timeout} s")
+        self._file.close()
+        if self.error:
+            raise self.error
+
+    def stats(self):
+        return {"rows_queued": self.rows_queued,
+                "rows_written": self.rows_written,
+                "backlog": self.rows_queued - self.rows_written,
+                "flushes": self.flushes,
+                "lag_ms": round(self.lag_ms, 1),
+                "max_lag_ms": round(self.max_lag_ms, 1)}
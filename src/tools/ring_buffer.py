@@ -0,0 +1,73 @@
+"""
+Fixed-size numpy storage for the most recent samples of a multi-channel
+series (Loggernet surface potentials).
+"""
+import numpy as np
+
+
+class RingBuffer:
+    """
+    Keeps the last ``capacity`` samples of ``channels`` float64 values, with a
+    timestamp and an integer flag per sample.
+
+    Every sample is written twice, ``capacity`` apart, so the last ``n``
+    samples are always one contiguous slice: appending is O(1) and ``view``
+    never copies. The views share memory with the buffer, callers that keep
+    them across appends must hold the same lock as the writer or copy them.
+    """
+
+    def __init__(self, channels, capacity):
+        self.channels = channels
+        self.capacity = capacity
+        self.values = np.full((channels, 2 * capacity), np.nan)
+        self.times = np.zeros(2 * capacity)
+        self.flags = np.zeros(2 * capacity, dtype=np.int8)
+        self._next = 0  # position of the next sample in [0, capacity)
+        self._size = 0
+        self.total = 0  # samples appended since creation
+
+    def __len__(self):
+        return self._size
+
+    def append(self, t, vals, flag=0):
+        """
+        Adds one sample. ``vals`` may contain the logger's "NAN" strings,
+        they become ``np.nan``, as do the channels missing from a short row.
+        """
+        i = self._next
+        vals = np.asarray(vals, dtype=np.float64)[:self.channels]
+        for j in (i, i + self.capacity):
+            self.values[:, j] = np.nan
+            self.values[:len(vals), j] = vals
+            self.times[j] = t
+            self.flags[j] = flag
+        self._next = (i + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+        self.total += 1
+
+    def view(self, n=None):
+        """
+        The last ``n`` samples (all of them by default), oldest first.
+
+        :return: ``(times, values, flags)`` with ``values`` of shape
+            ``(channels, n)``
+        """
+        n = self._size if n is None else max(0, min(n, self._size))
+        end = self._next + self.capacity if self._size == self.capacity \
+            else self._next
+        window = slice(end - n, end)
+        return self.times[window], self.values[:, window], self.flags[window]
+
+    def last(self):
+        """The most recent sample as ``(time, values, flag)``."""
+        times, values, flags = self.view(1)
+        return times[0], values[:, 0], flags[0]
+
+    def set_flag(self, flag, age=0):
+        """Sets the flag of the sample appended ``age`` samples ago."""
+        i = (self._next - 1 - age) % self.capacity
+        self.flags[i] = self.flags[i + self.capacity] = flag
+
+    def clear(self):
+        self._next = 0
+        self._size = 0
@@ -0,0 +1,73 @@
+"""
+Append-only storage for the whole history of a multi-channel series
+(Loggernet surface potentials), for plotting any window of it.
+
+Samples go into fixed-size numpy chunks: float64 times, float32 values and
+int8 flags, 21 bytes per sample with 3 channels, i.e. about 7.5 MB per hour
+at 100 Hz. Appending never copies earlier samples.
+"""
+import numpy as np
+
+CHUNK = 1 << 16  # samples per chunk
+
+
+class SeriesStore:
+    def __init__(self, channels, chunk=CHUNK):
+        self.channels = channels
+        self.chunk = chunk
+        self._times = []
+        self._values = []
+        self._flags = []
+        self._size = 0  # samples in the last chunk
+        self.total = 0
+
+    def __len__(self):
+        return self.total
+
+    def append(self, t, vals, flag=0):
+        """Adds one sample, the logger's "NAN" strings become ``np.nan``."""
+        if not self._times or self._size == self.chunk:
+            self._times.append(np.empty(self.chunk))
+            self._values.append(np.full((self.channels, self.chunk), np.nan,
+                                        dtype=np.float32))
+            self._flags.append(np.zeros(self.chunk, dtype=np.int8))
+            self._size = 0
+
+        i = self._size
+        vals = np.asarray(vals, dtype=np.float64)[:self.channels]
+        self._times[-1][i] = t
+        self._values[-1][:len(vals), i] = vals
+        self._flags[-1][i] = flag
+        self._size += 1
+        self.total += 1
+
+    def _chunk(self, k):
+        n = self._size if k == len(self._times) - 1 else self.chunk
+        return (self._times[k][:n], self._values[k][:, :n],
+                self._flags[k][:n])
+
+    def last_time(self):
+        return self._times[-1][self._size - 1] if self.total else None
+
+    def since(self, t0):
+        """
+        Copies of all samples at or after ``t0``, oldest first. Times must
+        not decrease for this to be exact.
+
+        :return: ``(times, values, flags)`` with ``values`` of shape
+            ``(channels, n)``
+        """
+        parts = []
+        for k in range(len(self._times) - 1, -1, -1):
+            times, values, flags = self._chunk(k)
+            start = np.searchsorted(times, t0)
+            parts.append((times[start:], values[:, start:], flags[start:]))
+            if start > 0:
+                break
+        parts.reverse()
+        if not parts:
+            return (np.empty(0), np.empty((self.channels, 0), np.float32),
+                    np.empty(0, np.int8))
+        return (np.concatenate([p[0] for p in parts]),
+                np.concatenate([p[1] for p in parts], axis=1),
+                np.concatenate([p[2] for p in parts]))
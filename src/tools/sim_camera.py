@@ -0,0 +1,286 @@
+"""
+Simulated stand-ins for the Thorlabs ``TLCameraSDK`` / ``TLCamera`` classes.
+
+Only the subset of the SDK used by ``src.ui.camera.Camera`` and
+``src.tools.image_queue.ImageAcquisitionThread`` is implemented, so the whole
+acquisition -> save -> analysis path can run on a machine without the camera
+(or the Windows-only ``dlls`` folder).
+
+Two cameras are provided:
+- ``SimulatedCamera`` generates 10-bit frames of a synthetic leaf at a
+  configurable rate and resolution, with optional "burn" / "injection"
+  events injected at given frame numbers.
+- ``ReplayCamera`` plays back the ``<n>-<timestamp>.tiff`` frames of an
+  existing recording folder, either in real time or as fast as possible.
+"""
+
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+
+import numpy as np
+from PIL import Image
+
+# Defaults match the CS165MU1 used in the lab
+SENSOR_WIDTH = 1440
+SENSOR_HEIGHT = 1080
+BIT_DEPTH = 10
+FPS = 2.0
+
+# Scene parameters (in sensor counts, 0-1023 for 10 bits)
+BACKGROUND_LEVEL = 40
+LEAF_LEVEL = 180
+NOISE_SIGMA = 2.0
+NOISE_BANK_SIZE = 8  # pre-generated noise frames, cycled to keep frames cheap
+
+# Event parameters: (relative radius of the glowing patch, peak brightness
+# increase in counts, number of frames for the signal to fade)
+EVENTS = {
+    "burn": (0.20, 120, 10),
+    "injection": (0.03, 60, 5),
+}
+
+SCENES = ("leaf", "flat", "noise")
+
+# Mirrors ``SENSOR_TYPE.MONOCHROME`` without importing the SDK
+SENSOR_TYPE_MONOCHROME = "MONOCHROME"
+
+
+class SimulatedFrame:
+    """Mimics ``dlls.thorlabs_tsi_sdk.tl_camera.Frame``."""
+
+    def __init__(self, image_buffer, frame_count, time_stamp_relative_ns):
+        self.image_buffer = image_buffer
+        self.frame_count = frame_count
+        self.time_stamp_relative_ns_or_null = time_stamp_relative_ns
+
+
+class _BaseCamera(ABC):
+    """
+    Timing and property plumbing shared by the simulated cameras. Subclasses
+    implement ``_next_buffer`` which returns the next ``uint16`` frame or
+    ``None`` when there are no more frames.
+    """
+
+    def __init__(self, width, height, bit_depth, fps):
+        self.sensor_width_pixels = width
+        self.sensor_height_pixels = height
+        self.image_width_pixels = width
+        self.image_height_pixels = height
+        self.roi = (0, 0, width, height)
+        self.binx = self.biny = 1
+        self.bit_depth = bit_depth
+        self.camera_sensor_type = SENSOR_TYPE_MONOCHROME
+
+        self.exposure_time_range_us = (34, 26843432)
+        self.exposure_time_us = 1000
+        self.gain_range = (0, 480)
+        self.gain = 0
+        self.image_poll_timeout_ms = 0
+        self.frames_per_trigger_zero_for_unlimited = 0
+
+        # ``fps <= 0`` means "as fast as possible"
+        self.frame_rate_control_value = fps
+        self.is_frame_rate_control_enabled = fps > 0
+
+        self._lock = threading.Lock()
+        self._armed = False
+        self._triggered = False
+        self._start_ns = 0
+        self._frame_count = 0
+        self._disposed = False
+
+    @property
+    def frames_delivered(self):
+        return self._frame_count
+
+    def arm(self, frames_to_buffer):
+        self._armed = True
+
+    def disarm(self):
+        self._armed = False
+        self._triggered = False
+
+    def issue_software_trigger(self):
+        if not self._armed:
+            raise RuntimeError("Camera must be armed before triggering")
+        self._start_ns = time.perf_counter_ns()
+        self._frame_count = 0
+        self._triggered = True
+
+    def dispose(self):
+        self.disarm()
+        self._disposed = True
+
+    def get_pending_frame_or_null(self):
+        """
+        Returns the next frame once it is due according to the frame rate,
+        waiting at most ``image_poll_timeout_ms``. Returns ``None`` otherwise.
+        """
+        with self._lock:
+            if not self._triggered or self._disposed:
+                return None
+
+            limit = self.frames_per_trigger_zero_for_unlimited
+            if limit and self._frame_count >= limit:
+                return None
+
+            if self.is_frame_rate_control_enabled \
+                    and self.frame_rate_control_value > 0:
+                due_ns = self._start_ns + int(
+                    self._frame_count * 1e9 / self.frame_rate_control_value)
+                wait_s = (due_ns - time.perf_counter_ns()) / 1e9
+                if wait_s > self.image_poll_timeout_ms / 1000:
+                    return None
+                if wait_s > 0:
+                    time.sleep(wait_s)
+
+            buffer = self._next_buffer(self._frame_count)
+            if buffer is None:
+                return None
+
+            frame = SimulatedFrame(buffer, self._frame_count,
+                                   time.perf_counter_ns() - self._start_ns)
+            self._frame_count += 1
+            return frame
+
+    @abstractmethod
+    def _next_buffer(self, frame_count):
+        """The ``uint16`` frame ``frame_count``, None if there is none."""
+
+
+class SimulatedCamera(_BaseCamera):
+    """
+    Generates synthetic 10-bit frames.
+
+    :param scene: one of ``SCENES``. "leaf" is an elliptical bright leaf on a
+                  dark background, "flat" a uniform field, "noise" pure noise.
+    :param events: mapping of frame number -> event name (a key of
+                   ``EVENTS``). The event starts on that frame and fades out.
+    :param seed: seed for the noise generator, so recordings are repeatable.
+    """
+
+    def __init__(self, width=SENSOR_WIDTH, height=SENSOR_HEIGHT,
+                 bit_depth=BIT_DEPTH, fps=FPS, scene="leaf", events=None,
+                 seed=0):
+        super().__init__(width, height, bit_depth, fps)
+        if scene not in SCENES:
+            raise ValueError(f"Unknown scene {scene!r}, expected one of "
+                             f"{SCENES}")
+        for name in (events or {}).values():
+            if name not in EVENTS:
+                raise ValueError(f"Unknown event {name!r}, expected one of "
+                                 f"{tuple(EVENTS)}")
+
+        self.scene = scene
+        self.events = dict(events or {})
+        self._max_value = (1 << bit_depth) - 1
+
+        rng = np.random.default_rng(seed)
+        self._base = self._make_scene(scene)
+        self._noise = rng.normal(0, NOISE_SIGMA, (NOISE_BANK_SIZE, height,
+                                                  width)).astype(np.float32)
+        self._noise_order = rng.integers(0, NOISE_BANK_SIZE, 1024)
+
+        yy, xx = np.mgrid[0:height, 0:width]
+        self._yy = yy.astype(np.float32)
+        self._xx = xx.astype(np.float32)
+
+    def _make_scene(self, scene):
+        h, w = self.image_height_pixels, self.image_width_pixels
+        if scene == "noise":
+            return np.zeros((h, w), np.float32)
+        if scene == "flat":
+            return np.full((h, w), LEAF_LEVEL, np.float32)
+
+        yy, xx = np.mgrid[0:h, 0:w].astype(np.float32)
+        ellipse = ((xx - w / 2) / (w * 0.35)) ** 2 + \
+                  ((yy - h / 2) / (h * 0.25)) ** 2
+        leaf = np.where(ellipse <= 1, LEAF_LEVEL, BACKGROUND_LEVEL)
+        return leaf.astype(np.float32)
+
+    def _event_signal(self, frame_count):
+        """Returns the extra brightness contributed by active events."""
+        signal = None
+        h, w = self.image_height_pixels, self.image_width_pixels
+        for start, name in self.events.items():
+            radius, peak, fade = EVENTS[name]
+            age = frame_count - start
+            if not 0 <= age < fade:
+                continue
+            # The patch flashes at `peak` and then spreads while fading, so
+            # each frame lights up a new ring, like the real fluorescence wave
+            r = radius * min(h, w) * (1 + age) / fade
+            patch = ((self._xx - w / 2) ** 2 + (self._yy - h / 2) ** 2) <= r * r
+            level = peak * (fade - age) / fade
+            contribution = patch.astype(np.float32) * level
+            signal = contribution if signal is None else signal + contribution
+        return signal
+
+    def _next_buffer(self, frame_count):
+        noise = self._noise[
+            self._noise_order[frame_count % len(self._noise_order)]]
+        frame = self._base + noise
+        signal = self._event_signal(frame_count)
+        if signal is not None:
+            frame += signal
+        return np.clip(frame, 0, self._max_value).astype(np.uint16)
+
+
+class ReplayCamera(_BaseCamera):
+    """
+    Replays the TIFF frames of a recording folder written by
+    ``ImageAcquisitionThread.save_images``.
+
+    :param directory: recording folder containing ``<n>-<timestamp>.tiff``
+    :param real_time: deliver frames at ``fps``; otherwise as fast as possible
+    :param loop: restart from the first frame after the last one
+    """
+
+    def __init__(self, directory, fps=FPS, real_time=True, loop=False,
+                 bit_depth=BIT_DEPTH):
+        self.directory = Path(directory)
+        self.files = sorted(
+            (f for f in os.listdir(self.directory) if f.endswith(".tiff")),
+            key=lambda x: int(x.split('-')[0]))
+        if not self.files:
+            raise FileNotFoundError(f"No .tiff frames in {self.directory}")
+        self.loop = loop
+
+        with Image.open(self.directory / self.files[0]) as img:
+            width, height = img.size
+        super().__init__(width, height, bit_depth, fps if real_time else 0)
+
+    def _next_buffer(self, frame_count):
+        if frame_count >= len(self.files) and not self.loop:
+            return None
+        path = self.directory / self.files[frame_count % len(self.files)]
+        with Image.open(path) as img:
+            return np.asarray(img, dtype=np.uint16).copy()
+
+
+class SimulatedCameraSDK:
+    """
+    Mimics ``TLCameraSDK``: ``discover_available_cameras`` returns one serial
+    number and ``open_camera`` returns a camera created by ``camera_factory``.
+    """
+
+    def __init__(self, camera_factory=SimulatedCamera, **camera_kwargs):
+        self._camera_factory = camera_factory
+        self._camera_kwargs = camera_kwargs
+        self._cameras = []
+
+    def discover_available_cameras(self):
+        return ["SIM00001"]
+
+    def open_camera(self, serial_number):
+        camera = self._camera_factory(**self._camera_kwargs)
+        self._cameras.append(camera)
+        return camera
+
+    def dispose(self):
+        for camera in self._cameras:
+            camera.dispose()
+        self._cameras.clear()
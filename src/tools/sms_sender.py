@@ -1,4 +1,3 @@
-import difflib
 import json
 import os
 import queue
@@ -11,11 +10,17 @@ import tkinter.messagebox
 
 from pathlib import Path
 
+from src.tools.adb import AdbPool
+from src.tools.message_store import MessageStore
+
 # Resolve paths without importing src.app (avoids circular import)
 _ROOT_PATH = Path(__file__).resolve().parents[2]
 _DATA_PATH = _ROOT_PATH / "src" / "data"
 _BG_PATH = _ROOT_PATH / "assets" / "cropps_background.png"
 
+# Rows of the sent table this recent (ms) are queried again at every poll
+RESCAN_MS = 10 * 60 * 1000
+
 
 def fix_encoding(data):
     """
@@ -26,16 +31,55 @@ def fix_encoding(data):
                   .decode('unicode_escape'), data)
 
 
+def parse_rows(output, columns):
+    """
+    Rows of a ``content query`` output as dicts of ``columns``, the
+    projection of the query. The last column may contain commas and
+    newlines (message bodies).
+    """
+    pattern = re.compile(", ".join(f"{c}=(.*?)" for c in columns[:-1]) +
+                         f"{', ' if len(columns) > 1 else ''}"
+                         f"{columns[-1]}=(.*)", re.DOTALL)
+    rows = []
+    for block in re.split(r"^Row:\s*\d+\s*", output, flags=re.MULTILINE):
+        match = pattern.match(block.rstrip("\r\n"))
+        if match:
+            rows.append(dict(zip(columns, match.groups())))
+    return rows
+
+
+def where_new(last_id, init_ms, rescan=False):
+    """
+    ``content query`` condition of the rows past ``last_id`` from after
+    ``init_ms``. With ``rescan``, also of those from the last RESCAN_MS,
+    for the sent table: it shares one ``_id`` sequence with the inbox and a
+    queued message keeps its ``_id`` once sent, so a new sent row can have
+    a lower ``_id`` than one already read; callers skip the rows they have.
+    """
+    if not rescan:
+        return f"'_id>{last_id} AND date>={init_ms}'"
+    recent = max(init_ms, int(time.time() * 1000) - RESCAN_MS)
+    return f"'(_id>{last_id} OR date>={recent}) AND date>={init_ms}'"
+
+
 class SmsSender:
-    def __init__(self):
+    def __init__(self, adb=None):
+        """
+        :param adb: command line of adb, the one in platform-tools by
+            default
+        """
         # The path where adb was installed
         self.dir = str(_ROOT_PATH / "platform-tools")
-        self.adb = os.path.join(self.dir, "adb")
+        self.adb = adb or os.path.join(self.dir, "adb")
         self.name = ""   # empty string so message.replace("$NAME", self.name) is safe
         self.phone = None
         self.phone_for_debug = ""  # change
 
-        self.sms_msgs = ""  # full output
+        # Inbox rows up to this _id have been read by `read_msg`; a received
+        # message gets the next _id, so each poll only queries the newer rows
+        self.last_inbox_id = 0
+        # Conversation with `phone`, see `fetch_new_msgs`
+        self.history = MessageStore()
         self.new_msg_event = threading.Event()
         self.msg_changed_event = threading.Event()
         self.new_msgs = queue.Queue()  # individual msgs
@@ -45,26 +89,30 @@ class SmsSender:
         with open(str(_DATA_PATH / "sms_template.json")) as f:
             self.template = json.load(f)
 
-        if not os.path.isdir(self.dir):
+        if adb is None and not os.path.isdir(self.dir):
             raise FileNotFoundError(
                 f"ADB platform-tools directory not found: {self.dir}"
             )
 
+        # Long-lived `adb shell` sessions, instead of one adb process per
+        # command (see adb.py)
+        self.shell = AdbPool(self.adb, cwd=None if adb else self.dir)
+
         try:
             # Increase the SMS sending limit
-            subprocess.run([
-                self.adb, "shell", "settings", "put", "global",
+            self.shell.run([
+                "settings", "put", "global",
                 "sms_outgoing_check_max_count", "99999"
-            ], cwd=self.dir, check=True)
+            ])
 
             # Increase the SMS sending interval window (in milliseconds)
-            subprocess.run([
-                self.adb, "shell", "settings", "put", "global",
+            self.shell.run([
+                "settings", "put", "global",
                 "sms_outgoing_check_interval_ms", "9000000"
-            ], cwd=self.dir, check=True)
+            ])
 
             print("SMS sending limit increased.")
-        except subprocess.CalledProcessError as e:
+        except subprocess.SubprocessError as e:
             print(f"An error occurred: {e}")
 
     def show_dialog(self, dialog):
@@ -159,83 +207,33 @@ class SmsSender:
         """
         self.name = contact_name
         self.phone = contact_phone
+        # the chat box switches to this conversation
+        self.msg_changed_event.set()
 
-    def get_msg_history(self, phone: str):
+    def fetch_new_msgs(self, phone: str):
         """
-        Returns a list of messages (both sent and received) for the given phone
-        number, starting from self.init_ms. Each message is represented as a dict:
-        {
-            "type": "sent" | "received",
-            "body": <message text>,
-            "timestamp": <epoch ms>
-        }
+        Merges the messages exchanged with `phone` since the previous call
+        into `self.history`, querying only the newer rows of the inbox, and
+        the newer and recent rows of the sent table.
+
+        :return: the new messages
         """
+        if self.history.phone != phone:
+            self.history = MessageStore(phone)
 
-        # Read received (inbox) messages
-        inbox_cmd = [
-            self.adb, 'shell', 'content', 'query',
-            '--uri', 'content://sms/inbox',
-            '--projection', 'address,body,date',
-            '--where', f"date\\>={self.init_ms}"
-        ]
-        inbox_output = subprocess.run(inbox_cmd, cwd=self.dir, check=True,
-                                      capture_output=True).stdout.decode(
-            "utf-8", errors="ignore")
-
-        # Read sent messages
-        sent_cmd = [
-            self.adb, 'shell', 'content', 'query',
-            '--uri', 'content://sms/sent',
-            '--projection', 'address,body,date',
-            '--where', f"date\\>={self.init_ms}"
-        ]
-        sent_output = subprocess.run(sent_cmd, cwd=self.dir, check=True,
-                                     capture_output=True).stdout.decode(
-            "utf-8", errors="ignore")
-
-        def parse_sms_output(output: str, msg_type: str, phone: str):
-            msgs = []
-            if not output:
-                return msgs
-
-            # Split by "Row:" lines
-            row_blocks = re.split(r"Row:\s*\d+\s*", output)
-            for block in row_blocks:
-                block = block.strip()
-                if not block:
-                    continue
-
-                # Match fields using a more tolerant regex
-                # Handles commas inside body and trailing whitespace
-                match = re.search(
-                    r"address=([^,]+),\s*body=(.*),\s*date=(\d+)", block,
-                    re.DOTALL
-                )
-                if not match:
-                    continue
-
-                address, body, date = match.groups()
-                if phone not in address:
-                    continue
-
-                body = body.strip()
-
-                msgs.append({
-                    "type": msg_type,
-                    "body": body,
-                    "timestamp": int(date)
-                })
-
-            return msgs
-
-        inbox_msgs = parse_sms_output(inbox_output, "received", phone)
-        sent_msgs = parse_sms_output(sent_output, "sent", phone)
-
-        # Merge and sort chronologically
-        all_msgs = inbox_msgs + sent_msgs
-        all_msgs.sort(key=lambda m: m["timestamp"])
-
-        return all_msgs
+        columns = ['_id', 'address', 'date', 'body']
+        new = []
+        for msg_type, table in (("received", "inbox"), ("sent", "sent")):
+            cmd = [
+                'content', 'query',
+                '--uri', f'content://sms/{table}',
+                '--projection', ','.join(columns),
+                '--where', where_new(self.history.last_id[msg_type],
+                                     self.init_ms, rescan=table == "sent")
+            ]
+            rows = parse_rows(self.shell.run(cmd), columns)
+            new += self.history.merge(msg_type, rows)
+        return new
 
     def read_msg(self):
         """
@@ -244,41 +242,44 @@ class SmsSender:
         :param days_ago: Read messages received up to `days_ago` days ago.
         """
         # not_TODO: only read messages from the contact added in the box 
-        # Handled by `get_msg_history`. This function is useful since it only
+        # Handled by `fetch_new_msgs`. This function is useful since it only
         #  execute one command per cycle. Also controls `new_msg_event`.
 
         while True:
-            cmd = [
-                self.adb, 'shell', 'content', 'query',
-                '--uri', 'content://sms/inbox',
-                '--where', f'date\\>={self.init_ms}',
-                '--projection', 'body'
-            ]
-
             try:
-                output = subprocess.run(cmd, cwd=self.dir, check=True,
-                                        capture_output=True, text=True).stdout
-                orig = [r.partition("body=")[2].strip() for r in
-                        self.sms_msgs.splitlines() if "body=" in r]
-                new = [r.partition("body=")[2].strip() for r in
-                       output.splitlines() if "body=" in r]
-
-                diff = difflib.unified_diff(orig, new, fromfile='original',
-                                            tofile='new', lineterm='')
-
-                for line in diff:
-                    if line.startswith('+') and not line.startswith('+++'):
-                        self.new_msgs.put(line[1:].lower().strip())
-                        self.new_msg_event.set()
-                        self.msg_changed_event.set()
-
-                self.sms_msgs = output
-            except subprocess.CalledProcessError:
+                self.poll_inbox()
+            except subprocess.SubprocessError:
                 pass
             finally:
                 # 2 seconds ok?
                 time.sleep(2)
 
+    def poll_inbox(self):
+        """
+        Queues the messages received since the previous poll in
+        `new_msgs`, lower-cased.
+
+        :return: the new messages
+        """
+        columns = ['_id', 'date', 'body']
+        cmd = [
+            'content', 'query',
+            '--uri', 'content://sms/inbox',
+            '--where', where_new(self.last_inbox_id, self.init_ms),
+            '--projection', ','.join(columns)
+        ]
+        new = []
+        rows = parse_rows(self.shell.run(cmd), columns)
+        for row in sorted(rows, key=lambda r: int(r['_id'])):
+            self.last_inbox_id = max(self.last_inbox_id, int(row['_id']))
+            new.append(row['body'].lower().strip())
+            self.new_msgs.put(new[-1])
+
+        if new:
+            self.new_msg_event.set()
+            self.msg_changed_event.set()
+        return new
+
     def send_debug_msg(self, message: str):
         self.send_msg(self.phone_for_debug, message)
 
@@ -289,8 +290,6 @@ class SmsSender:
         message = fix_encoding(message).replace("$NAME", self.name)
 
         command = [
-            self.adb,
-            "shell",
             "am",
             "startservice",
             "--user", "0",
@@ -300,10 +299,10 @@ class SmsSender:
         ]
 
         try:
-            subprocess.run(command, cwd=self.dir, check=True)
+            self.shell.run(command)
             self.msg_changed_event.set()
             print("[send_msg]: A message has been sent.")
-        except subprocess.CalledProcessError as e:
+        except subprocess.SubprocessError as e:
             raise RuntimeError(e)
 
     def send_msg_after_analysis(self, result):
@@ -315,6 +314,8 @@ class SmsSender:
                 self.send_msg(self.template["detected"]["trigger"])
             case "burn":
                 self.send_msg(self.template["detected"]["burn"])
+            case "depolarization":
+                self.send_msg(self.template["detected"]["depolarization"])
             case _:
                 self.send_msg(self.template["detected"]["else"])
 
@@ -1,3 +1,4 @@
+import os
 import threading
 import time
 import tkinter as tk
@@ -8,8 +9,8 @@ from pathlib import Path
 import numpy as np
 from PIL import Image
 
-from dlls.thorlabs_tsi_sdk.tl_camera import TLCameraSDK
 from src.tools.image_queue import ImageAcquisitionThread
+from src.tools.sim_camera import ReplayCamera, SimulatedCameraSDK
 
 _ROOT_PATH = Path(__file__).resolve().parents[2]
 
@@ -18,10 +19,36 @@ TARGET_FPS = 2.0  # frames per second (0.5 s gap between frames)
 DEFAULT_EXPOSURE_MS = 1  # must be < (1000 / TARGET_FPS) - readout (~20 ms)
 DEFAULT_GAIN = 20
 
+# Camera backend: "thorlabs" for the real camera, "sim" for a synthetic
+# camera, or "replay" to play back the recording in CAMERA_REPLAY_DIR
+CAMERA_BACKEND = os.environ.get("CAMERA_BACKEND", "thorlabs")
+
+
+def get_camera_sdk(backend: str = CAMERA_BACKEND):
+    """
+    Returns an SDK object for `backend`. Every backend exposes the subset of
+    ``TLCameraSDK`` used here: ``discover_available_cameras``,
+    ``open_camera`` and ``dispose``.
+    """
+    match backend:
+        case "thorlabs":
+            from dlls.thorlabs_tsi_sdk.tl_camera import TLCameraSDK
+            return TLCameraSDK()
+        case "sim":
+            return SimulatedCameraSDK(fps=TARGET_FPS)
+        case "replay":
+            return SimulatedCameraSDK(
+                ReplayCamera, directory=os.environ["CAMERA_REPLAY_DIR"],
+                fps=TARGET_FPS)
+        case _:
+            raise ValueError(f"Unknown camera backend: {backend}")
+
 
 class Camera:
-    def __init__(self, setup_ok_event: threading.Event):
+    def __init__(self, setup_ok_event: threading.Event,
+                 backend: str = CAMERA_BACKEND):
         self.setup_ok_event = setup_ok_event
+        self.backend = backend
         self.setup_failed_event = threading.Event()
         self.err = ""
 
@@ -30,7 +57,7 @@ class Camera:
 
     def setup(self):
         try:
-            self.sdk = TLCameraSDK()
+            self.sdk = get_camera_sdk(self.backend)
             camera_list = self.sdk.discover_available_cameras()
             self.camera = self.sdk.open_camera(camera_list[0])
         except Exception as e:
@@ -87,13 +114,16 @@ class Camera:
         except Exception as e:
             print(f"[CAMERA] Could not set gain: {e}")
 
-        # Enable hardware frame rate control for exact fps (must be set before arm)
-        try:
-            self.camera.frame_rate_control_value = TARGET_FPS
-            self.camera.is_frame_rate_control_enabled = True
-            print(f"[CAMERA] Frame rate locked at {TARGET_FPS} fps")
-        except Exception as e:
-            print(f"[CAMERA] Frame rate control unavailable: {e}")
+        # Enable hardware frame rate control for exact fps (must be set before arm).
+        # The simulated backends are created with their own rate: a replay
+        # that isn't real time runs as fast as it can.
+        if self.backend == "thorlabs":
+            try:
+                self.camera.frame_rate_control_value = TARGET_FPS
+                self.camera.is_frame_rate_control_enabled = True
+                print(f"[CAMERA] Frame rate locked at {TARGET_FPS} fps")
+            except Exception as e:
+                print(f"[CAMERA] Frame rate control unavailable: {e}")
 
         self.camera.frames_per_trigger_zero_for_unlimited = 0
         self.camera.arm(2)
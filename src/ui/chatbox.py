@@ -9,43 +9,41 @@ class Chatbox(ScrolledText):
                          font=("Segoe UI Emoji", 20),
                          bg=bg, bd=0)
         self.sms_sender = sms_sender
+        # What is shown: the store, its epoch and how many of its messages
+        self._store = None
+        self._epoch = None
+        self._shown = 0
 
-    def poll_messages(self, exec_func, truncate_msgs):
-        """Periodically refresh chatbox with updated message history."""
-        print("[poll_messages]: waiting")
-        self.sms_sender.msg_changed_event.wait()
-        self.sms_sender.msg_changed_event.clear()
-        print("[poll_messages]: finished waiting")
-
-        try:
-            if self.sms_sender.new_msg_event.is_set():
-                self.sms_sender.new_msg_event.clear()
-                exec_func()
-
-            if self.sms_sender and self.sms_sender.phone:
-                msgs = self.sms_sender.get_msg_history(
-                    self.sms_sender.phone)
-
-                # Only update if there’s new content
-                # UPDATE v2.1.0: added `wait` above.
-                # This checks for correct phone number
-                if msgs != getattr(self, "_last_msg_history", []):
-                    self._last_msg_history = msgs
-                    self.refresh_chatbox(truncate_msgs)
-
-        except Exception as e:
-            print("Error polling messages:", e)
+    def show_new_msgs(self, truncate_msgs):
+        """Append the messages of the history that aren't shown yet."""
+        store = self.sms_sender.history
+        epoch, msgs = store.since(self._shown)
+        if store is not self._store or epoch != self._epoch:
+            # a message was inserted before those shown
+            self.refresh_chatbox(truncate_msgs)
+            return
+        self._append(msgs, truncate_msgs)
 
     def refresh_chatbox(self, truncate_msgs):
         """Replace chatbox content with current message history."""
+        self._store = self.sms_sender.history
+        self._epoch, msgs = self._store.since(0)
+        self._shown = 0
         self.configure(state="normal")
         self.delete("1.0", "end")
+        self.configure(state="disabled")
+        self._append(msgs, truncate_msgs)
+
+    def _append(self, msgs, truncate_msgs):
+        if not msgs:
+            return
+        self.configure(state="normal")
 
         # Message color
         self.tag_config('r', foreground="red")
         self.tag_config('b', foreground="blue")
 
-        for m in getattr(self, "_last_msg_history", []):
+        for m in msgs:
             sender = "You" if m["type"] == "sent" \
                 else self.sms_sender.name or "Contact"
             tag = 'b' if m["type"] == "sent" else 'r'
@@ -61,5 +59,6 @@ class Chatbox(ScrolledText):
                 body = body[:max_length] + "..."
             self.insert("end", f"[{ts}]\n{sender}:\n{body}\n\n", tag)
 
+        self._shown += len(msgs)
         self.configure(state="disabled")
         self.yview("end")
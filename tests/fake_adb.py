@@ -0,0 +1,118 @@
+"""
+Stand-in for ``adb`` in the tests: ``python fake_adb.py shell [command]``.
+
+Understands one command per line, with the phone's ``content query`` of
+the SMS tables, ``am startservice`` (sending an SMS), ``settings put``,
+``echo`` with ``$?`` and ``sleep``. The inbox, and sent messages the
+phone had before, are read from the JSON file of FAKE_ADB_STATE::
+
+    {"inbox": [{"_id": 1, "address": "+1555", "body": "1", "date": 1}],
+     "sent": []}
+
+Every adb process started and every SMS sent is appended to
+``<FAKE_ADB_STATE>.log``, one JSON object per line, so that concurrent
+sessions don't overwrite each other.
+"""
+import json
+import os
+import re
+import shlex
+import sys
+import time
+
+STATE = os.environ.get("FAKE_ADB_STATE")
+
+
+def load():
+    state = {}
+    if STATE and os.path.exists(STATE):
+        with open(STATE) as f:
+            state = json.load(f)
+    return {"inbox": state.get("inbox", []),
+            "sent": state.get("sent", []) +
+            [e["sent"] for e in log() if "sent" in e]}
+
+
+def log(entry=None):
+    """Appends ``entry`` to the log, or reads it."""
+    if not STATE:
+        return []
+    if entry is not None:
+        with open(STATE + ".log", "a") as f:
+            f.write(json.dumps(entry) + "\n")
+        return []
+    if not os.path.exists(STATE + ".log"):
+        return []
+    with open(STATE + ".log") as f:
+        return [json.loads(line) for line in f]
+
+
+def option(args, name, default=None):
+    return args[args.index(name) + 1] if name in args else default
+
+
+def content_query(args):
+    table = option(args, "--uri").rsplit("/", 1)[-1]
+    projection = option(args, "--projection", "_id,address,body,date")
+    rows = load()[table]
+    where = option(args, "--where")
+    if where:
+        # comparisons of columns with numbers, AND, OR and parentheses
+        condition = re.sub(r"\b(AND|OR)\b", lambda m: m.group(1).lower(),
+                           where.replace("\\", ""))
+        condition = re.sub(r"\b(_id|date)\b", r"r['\1']", condition)
+        rows = [r for r in rows if eval(condition, {"r": r})]
+    if not rows:
+        return "No result found.\n"
+    return "".join(
+        f"Row: {i} " + ", ".join(f"{c}={r[c]}" for c in projection.split(","))
+        + "\n" for i, r in enumerate(rows))
+
+
+def execute(line, status):
+    args = shlex.split(line.replace("$?", str(status)))
+    if not args:
+        return "", status
+    match args[0]:
+        case "echo":
+            if args[1:2] == ["-n"]:
+                return " ".join(args[2:]), 0
+            return " ".join(args[1:]) + "\n", 0
+        case "sleep":
+            time.sleep(float(args[1]))
+            return "", 0
+        case "settings":
+            return "", 0
+        case "content":
+            return content_query(args), 0
+        case "am":
+            log({"sent": {"_id": len(load()["sent"]) + 1,
+                          "address": option(args, "contact"),
+                          "body": option(args, "msg"),
+                          "date": int(time.time() * 1000)}})
+            return "Starting service: Intent { cmp=com.android.shellms/.sendSMS }\n", 0
+        case "false":
+            return "", 1
+        case _:
+            return f"/system/bin/sh: {args[0]}: not found\n", 127
+
+
+def main(argv):
+    log({"process": os.getpid()})
+    if argv[:1] != ["shell"]:
+        return 1
+    if len(argv) > 1:
+        output, status = execute(" ".join(argv[1:]), 0)
+        sys.stdout.write(output)
+        return status
+
+    status = 0
+    for line in sys.stdin:
+        output, status = execute(line.strip(), status)
+        sys.stdout.write(output)
+        sys.stdout.flush()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,51 @@
+import os
+import sys
+import time
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import unittest
+from collections import defaultdict
+
+from src.tools.acquisition import AcquisitionService, loggers_from_env
+from src.tools.mock_cr6 import MockCR6
+
+
+class TestAcquisitionService(unittest.TestCase):
+    def test_several_loggers(self):
+        received = defaultdict(list)
+        first = []
+        with MockCR6(rate=200, loggers=3) as mock:
+            mock.down.add(2)
+            loggers = {f"logger{k}": url for k, url in enumerate(mock.urls)}
+            service = AcquisitionService(loggers, poll_interval=0.05)
+            service.subscribe(lambda samples: [
+                received[s.logger].append(s.no) for s in samples])
+            service.subscribe(first.extend, logger="logger0")
+            with service:
+                time.sleep(1)
+
+        for name in ("logger0", "logger1"):
+            numbers = received[name]
+            self.assertGreater(len(numbers), 100)
+            self.assertEqual(numbers,
+                             list(range(numbers[0], numbers[-1] + 1)))
+        self.assertEqual([s.no for s in first], received["logger0"])
+        self.assertLessEqual(first[0].arrival, first[-1].arrival)
+
+        # the logger that is down backs off and doesn't hold up the others
+        self.assertNotIn("logger2", received)
+        self.assertGreaterEqual(service.stats["logger2"]["errors"], 1)
+        self.assertLess(service.stats["logger2"]["errors"], 5)
+
+    def test_loggers_from_env(self):
+        os.environ["LOGGERNET_URLS"] = "a=http://x/cr6, http://y/cr6"
+        try:
+            self.assertEqual(loggers_from_env(),
+                             {"a": "http://x/cr6", "cr6_1": "http://y/cr6"})
+        finally:
+            del os.environ["LOGGERNET_URLS"]
+
+
+if __name__ == '__main__':
+    unittest.main()
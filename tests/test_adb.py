@@ -0,0 +1,97 @@
+import os
+import sys
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+import subprocess
+import tempfile
+import threading
+import unittest
+
+from src.tools.adb import AdbPool, AdbShell
+
+FAKE_ADB = [sys.executable,
+            os.path.join(os.path.dirname(__file__), "fake_adb.py")]
+
+
+class TestAdbShell(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.state = os.path.join(self.dir.name, "adb.json")
+        with open(self.state, "w") as f:
+            json.dump({"inbox": [
+                {"_id": 1, "address": "+1555", "body": "hello, plant",
+                 "date": 1000},
+                {"_id": 2, "address": "+1555", "body": "2", "date": 2000}]},
+                f)
+        os.environ["FAKE_ADB_STATE"] = self.state
+
+    def tearDown(self):
+        del os.environ["FAKE_ADB_STATE"]
+        self.dir.cleanup()
+
+    def log(self, key):
+        with open(self.state + ".log") as f:
+            return [entry[key] for entry in map(json.loads, f)
+                    if key in entry]
+
+    def test_one_process_for_many_commands(self):
+        shell = AdbShell(FAKE_ADB)
+        try:
+            for _ in range(20):
+                output = shell.run(['content', 'query', '--uri',
+                                    'content://sms/inbox', '--projection',
+                                    'body', '--where', 'date\\>=2000'])
+                self.assertEqual(output, "Row: 0 body=2\n")
+            # output that doesn't end with a newline
+            self.assertEqual(shell.run("echo -n partial"), "partial")
+            self.assertEqual(shell.commands, 21)
+            self.assertEqual(len(self.log("process")), 1)
+        finally:
+            shell.close()
+
+    def test_errors(self):
+        shell = AdbShell(FAKE_ADB)
+        try:
+            with self.assertRaises(subprocess.CalledProcessError) as error:
+                shell.run("no-such-command")
+            self.assertEqual(error.exception.returncode, 127)
+            self.assertIn("not found", error.exception.output)
+            # the session is still usable
+            self.assertEqual(shell.run(["echo", "ok"]), "ok\n")
+
+            with self.assertRaises(subprocess.TimeoutExpired):
+                shell.run("sleep 2", timeout=0.2)
+            self.assertFalse(shell.alive())
+            self.assertEqual(shell.run(["echo", "again"]), "again\n")
+            self.assertEqual(len(self.log("process")), 2)
+        finally:
+            shell.close()
+
+    def test_pool(self):
+        pool = AdbPool(FAKE_ADB, sessions=2)
+        outputs = []
+
+        def send(k):
+            pool.run(["am", "startservice", "-e", "contact", "+1555",
+                      "-e", "msg", f"'message {k}'"])
+            outputs.append(pool.run(["echo", k]))
+
+        try:
+            threads = [threading.Thread(target=send, args=(k,))
+                       for k in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            pool.close()
+        self.assertEqual(sorted(outputs), [f"{k}\n" for k in range(8)])
+        self.assertEqual(sorted(m["body"] for m in self.log("sent")),
+                         [f"message {k}" for k in range(8)])
+        self.assertLessEqual(len(self.log("process")), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
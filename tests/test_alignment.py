@@ -0,0 +1,83 @@
+import os
+import sys
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import csv
+import json
+import tempfile
+import unittest
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+
+from src.tools.alignment import ClockMap, align_recording, asof_join
+from src.tools.recording_writer import RecordingWriter
+
+
+class TestAsofJoin(unittest.TestCase):
+    def test_interpolates(self):
+        sample_t = np.array([0.0, 1.0, 2.0, 5.0, 6.0])
+        values = np.array([[0, 10, 20, 50, 60], [1, 1, 1, 1, 1]], float)
+        flags = np.array([0, 1, 0, 1, 1])
+        out, wounded = asof_join([-1, 0.5, 2.0, 3.0, 5.5, 7], sample_t,
+                                 values, flags, max_gap=2)
+
+        np.testing.assert_allclose(out[0], [np.nan, 5, 20, np.nan, 55,
+                                            np.nan])
+        # flags since the previous frame
+        np.testing.assert_array_equal(wounded, [0, 0, 1, 0, 1, 1])
+
+    def test_clock(self):
+        clock = ClockMap()
+        clock.update(100.0, 5.3)
+        clock.update(101.0, 6.1)
+        self.assertAlmostEqual(clock.offset, -94.9)
+        self.assertAlmostEqual(float(clock.to_logger(6.1)), 101.0)
+
+
+class TestAlignRecording(unittest.TestCase):
+    def _recording(self, directory, fmt):
+        start = datetime(2025, 6, 1, 12).timestamp()
+        writer = RecordingWriter(directory / "data.csv",
+                                 ["Time", "SE1", "SE2", "voltage diff",
+                                  "Flags"], fmt=fmt)
+        for i in range(1000):  # 100 Hz
+            t = datetime.fromtimestamp(start + i / 100)
+            # wounded at sample 450, detected at 450 and 720
+            writer.write(t.isoformat(timespec="milliseconds"),
+                         [i, -i, 2 * i],
+                         (i == 450) * 1 + (i in (450, 720)) * 2)
+        writer.close()
+
+        offset = 50.0  # monotonic = logger time - offset
+        with open(directory / "frames.csv", "w") as f:
+            f.write("frame,file,t\n")
+            for n in range(11):
+                f.write(f"{n},{n}-x.tiff,{start - offset + n + 0.005:.6f}\n")
+        with open(directory / "clock.json", "w") as f:
+            json.dump({"offset": -offset}, f)
+
+    def test_align(self):
+        for fmt in ("csv", "f32"):
+            with tempfile.TemporaryDirectory() as directory:
+                directory = Path(directory)
+                self._recording(directory, fmt)
+                with open(align_recording(directory), newline='') as f:
+                    rows = list(csv.DictReader(f))
+
+                self.assertEqual(len(rows), 11)
+                self.assertEqual(rows[3]["file"], "3-x.tiff")
+                # frame n is 0.5 samples after sample 100 n
+                self.assertAlmostEqual(float(rows[3]["SE1"]), 300.5, 1)
+                self.assertAlmostEqual(float(rows[3]["voltage diff"]), 601, 0)
+                self.assertEqual([r["wounded"] for r in rows].count("1"), 1)
+                self.assertEqual(rows[5]["wounded"], "1")
+                self.assertEqual([r["detected"] for r in rows],
+                                 ["0"] * 5 + ["1", "0", "0", "1", "0", "0"])
+                self.assertEqual(rows[10]["SE1"], "nan")
+
+
+if __name__ == '__main__':
+    unittest.main()
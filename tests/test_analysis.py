@@ -3,8 +3,11 @@ import sys
 
 sys.path.insert(0,
                 os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import tempfile
+
 import archive.analyzer
 import numpy as np
+import src.analysis.db
 import unittest
 
 
@@ -13,28 +16,65 @@ class TestAnalysis(unittest.TestCase):
         super().setUp()
         self.analyzer = archive.analyzer.Analyzer()
         self.analyzer.testing_init()
+        # keep the processed images and the results out of the real folders
+        self.tmp = tempfile.TemporaryDirectory()
+        self.analyzer.processed_dir = self.tmp.name
+        self.results_backend = src.analysis.db.RESULTS_BACKEND
+        src.analysis.db.RESULTS_BACKEND = "none"
 
         # maximum number of images allowed to fail for each function
         self.max_value = 10
 
+    def tearDown(self):
+        src.analysis.db.RESULTS_BACKEND = self.results_backend
+        self.analyzer.close()
+        self.tmp.cleanup()
+
+    def _paths(self, directory):
+        directory = os.path.join(self.analyzer.dir, directory)
+        return [p for p in (os.path.join(directory, f)
+                            for f in sorted(os.listdir(directory)))
+                if os.path.isfile(p)]
+
     def _failed_count(self):
         def failed_count_helper(failed, directory):
-            files = os.listdir(self.analyzer.dir + directory)
-            count = [0 for _ in range(len(self.analyzer.functions))]
-            for file in files:
-                p = os.path.join(self.analyzer.dir + directory, file)
-                if os.path.isfile(p):
-                    for i in range(len(self.analyzer.functions)):
-                        if self.analyzer.functions[i](p)[0] == failed:
-                            count[i] += 1
-            return count
-
-        agitated_count = failed_count_helper(False, '/agitated')
-        base_count = failed_count_helper(True, '/base')
+            # every image is decoded once (files in parallel) and the
+            # verdict metrics are evaluated on the whole batch; an image
+            # that could not be analyzed (None) counts as failed
+            verdicts = self.analyzer.combin_batch(self._paths(directory))
+            return [sum(1 for v in verdicts if v is None or v[0] == failed)]
+
+        agitated_count = failed_count_helper(False, 'agitated')
+        base_count = failed_count_helper(True, 'base')
         print(f"Failed count: {agitated_count}")
         print(f"Failed count: {base_count}")
         return [agitated_count, base_count]
 
+    def _metric_failures(self, directory, expected):
+        """Images of `directory` each metric gets wrong, as a dict."""
+        results = self.analyzer.analyze_files(self._paths(directory))
+        return {name: sum(1 for result in results
+                          if result is None or result[name][0] != expected)
+                for name in self.analyzer.metrics}
+
+    def test_metrics(self):
+        agitated = self._metric_failures('agitated', True)
+        base = self._metric_failures('base', False)
+        print(f"Failed count per metric: {agitated}, {base}")
+        self.assertEqual(agitated, {"yellow": 15, "normalized": 0,
+                                    "sparse": 7})
+        self.assertEqual(base, {"yellow": 0, "normalized": 0, "sparse": 0})
+
+        # the batch gives the same results as one image at a time
+        paths = self._paths('agitated')
+        path, result = paths[-1], self.analyzer.analyze_files(paths)[-1]
+        self.assertEqual(self.analyzer.detect_yellow_num(path),
+                         result["yellow"])
+        self.assertEqual(self.analyzer.normalize_brightness(path),
+                         result["normalized"])
+        self.assertEqual(self.analyzer.detect_sparse_bright_pixels(path),
+                         result["sparse"])
+
     def test_analysis(self):
         self.assertTrue(np.all(np.array(
             self._failed_count(), dtype=np.float32).flatten() < self.max_value))
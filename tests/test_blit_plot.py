@@ -0,0 +1,72 @@
+import os
+import sys
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import unittest
+
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+import numpy as np
+
+from src.tools.blit_plot import BlitPlot, minmax_decimate
+
+
+class TestMinMaxDecimate(unittest.TestCase):
+    def test_keeps_extremes(self):
+        y = np.sin(np.linspace(0, 20, 10000))[None]
+        y[0, 1234] = 5
+        y[0, 4321] = -5
+        x, out = minmax_decimate(y, 100)
+        self.assertEqual(out.shape, (1, 200))
+        self.assertEqual(len(x), 200)
+        self.assertEqual(out.max(), 5)
+        self.assertEqual(out.min(), -5)
+        self.assertTrue(np.all(np.diff(x) >= 0))
+
+    def test_short_and_nan(self):
+        y = np.array([[1.0, np.nan, 3.0]])
+        x, out = minmax_decimate(y, 100)
+        np.testing.assert_array_equal(x, [0, 1, 2])
+        self.assertIs(out, y)
+
+        y = np.full((2, 1000), np.nan)
+        y[0, 1] = 7
+        _, out = minmax_decimate(y, 10)
+        self.assertEqual(out[0, 0], 7)
+        self.assertTrue(np.isnan(out[1]).all())
+
+
+class TestBlitPlot(unittest.TestCase):
+    def test_render(self):
+        fig, ax = plt.subplots()
+        line, = ax.plot([], [])
+        renderer = BlitPlot(fig, [line], max_fps=1000)
+        fig.canvas.draw()
+        self.assertEqual(renderer.full_draws, 1)
+
+        line.set_data([0, 1], [0, 1])
+        ax.set_ylim(0, 1)
+        renderer.fit_y(ax, 0.2, 0.8)  # inside the limits, no redraw
+        self.assertTrue(renderer.render())
+        self.assertEqual((renderer.frames, renderer.full_draws), (1, 1))
+
+        renderer.fit_y(ax, 0.2, 1.8)
+        self.assertLess(ax.get_ylim()[0], 0.2)
+        self.assertGreater(ax.get_ylim()[1], 1.8)
+        self.assertEqual(renderer.full_draws, 2)
+        plt.close(fig)
+
+    def test_rate_limit(self):
+        fig, ax = plt.subplots()
+        renderer = BlitPlot(fig, ax.plot([], []), max_fps=1)
+        fig.canvas.draw()
+        self.assertTrue(renderer.render())
+        self.assertFalse(renderer.render())
+        plt.close(fig)
+
+
+if __name__ == '__main__':
+    unittest.main()
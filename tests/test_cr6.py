@@ -0,0 +1,43 @@
+import os
+import sys
+import time
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import unittest
+
+from src.tools.cr6 import CR6Client
+from src.tools.mock_cr6 import FIELDS, MockCR6
+
+
+class TestCR6Client(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.logger = MockCR6(rate=500, max_records=20).start()
+        self.client = CR6Client(self.logger.url)
+
+    def tearDown(self):
+        self.client.close()
+        self.logger.stop()
+
+    def test_first_poll_is_most_recent(self):
+        time.sleep(0.05)
+        records = self.client.poll()
+        self.assertEqual(len(records), 1)
+        self.assertEqual(self.client.fields, FIELDS)
+        self.assertEqual(len(records[0].vals), len(FIELDS))
+
+    def test_lossless(self):
+        numbers = []
+        for _ in range(5):
+            numbers.extend(r.no for r in self.client.poll())
+            time.sleep(0.1)
+
+        # more records than max_records per poll: pages were followed
+        self.assertGreater(len(numbers), 5 * 20)
+        self.assertEqual(numbers, list(range(numbers[0], numbers[-1] + 1)))
+        self.assertLess(self.client.requests, len(numbers) / 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,124 @@
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import unittest
+
+from src.analysis.db import DbSink
+
+
+class TestDbSink(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.tmp.name, "plantdata.db")
+        self.spill_path = os.path.join(self.tmp.name, "spill.jsonl")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _count(self):
+        with sqlite3.connect(self.db_path) as conn:
+            return conn.execute("SELECT COUNT(*) FROM plant_logs").fetchone()[0]
+
+    def test_batches(self):
+        sink = DbSink.sqlite(self.db_path, batch_size=10, flush_ms=50,
+                             spill_path=self.spill_path)
+        for i in range(25):
+            sink.add(i, i % 2 == 0, i / 10, f"/images/{i}.png")
+        sink.close()
+
+        self.assertEqual(self._count(), 25)
+        self.assertEqual(sink.stats()["rows_written"], 25)
+        self.assertGreaterEqual(sink.stats()["flushes"], 3)
+        self.assertFalse(os.path.exists(self.spill_path))
+
+    def test_spill_and_replay(self):
+        db_up = False
+        stand_in = DbSink.sqlite(self.db_path, spill_path=self.spill_path)
+
+        def connect():
+            if not db_up:
+                raise ConnectionError("database down")
+            return stand_in.pool.connect()
+
+        sink = DbSink(connect, "?", batch_size=5, flush_ms=50,
+                      spill_path=self.spill_path, max_retries=2,
+                      retry_backoff=0.01)
+        for i in range(5):
+            sink.add(i, False, 0.0, f"/images/{i}.png")
+        sink.flush()
+        self.assertEqual(sink.stats()["rows_retried"], 10)
+        self.assertEqual(sink.stats()["rows_failed"], 5)
+        self.assertEqual(sink.stats()["rows_spilled"], 5)
+        self.assertTrue(os.path.exists(self.spill_path))
+
+        db_up = True
+        sink.add(5, True, 0.0, "/images/5.png")
+        sink.close()
+        stand_in.close()
+
+        self.assertEqual(self._count(), 6)
+        self.assertEqual(sink.stats()["rows_queued"], 6)
+        self.assertFalse(os.path.exists(self.spill_path))
+
+    def test_replay_keeps_leftovers_and_skips_bad_lines(self):
+        # an interrupted replay and newer spilled rows, one of them corrupt
+        with open(self.spill_path + ".replay", "w") as f:
+            f.write('["2024-01-01T00:00:00", 1, false, 0.0, "/a.png"]\n')
+        with open(self.spill_path, "w") as f:
+            f.write('["2024-01-01T00:00:01", 2, false, 0.0, "/b.png"]\n'
+                    '["2024-01-01T00:0\n')
+
+        sink = DbSink.sqlite(self.db_path, batch_size=1, flush_ms=10,
+                             spill_path=self.spill_path)
+        sink.add(3, False, 0.0, "/c.png")
+        sink.close()
+
+        self.assertEqual(self._count(), 3)
+        self.assertFalse(os.path.exists(self.spill_path))
+        self.assertFalse(os.path.exists(self.spill_path + ".replay"))
+
+    def test_replay_leftover_without_spill(self):
+        # interrupted replay, nothing spilled since
+        with open(self.spill_path + ".replay", "w") as f:
+            f.write('["2024-01-01T00:00:00", 1, false, 0.0, "/a.png"]\n')
+
+        sink = DbSink.sqlite(self.db_path, batch_size=1, flush_ms=10,
+                             spill_path=self.spill_path)
+        sink.add(2, False, 0.0, "/b.png")
+        sink.close()
+
+        self.assertEqual(self._count(), 2)
+        self.assertFalse(os.path.exists(self.spill_path + ".replay"))
+
+    def test_add_does_not_block(self):
+        def connect():
+            time.sleep(0.5)
+            raise ConnectionError("connect timeout")
+
+        sink = DbSink(connect, "?", batch_size=1, flush_ms=10,
+                      spill_path=self.spill_path, max_retries=0)
+        start = time.perf_counter()
+        for i in range(50):
+            sink.add(i, False, 0.0, "")
+        self.assertLess(time.perf_counter() - start, 0.1)
+        sink.close()
+
+    def test_bounded_buffer(self):
+        sink = DbSink(lambda: (_ for _ in ()).throw(ConnectionError()), "?",
+                      batch_size=1000, flush_ms=10000, max_buffer=3,
+                      spill_path=self.spill_path)
+        for i in range(5):
+            sink.add(i, False, 0.0, "")
+        self.assertEqual(sink.stats()["buffered"], 3)
+        self.assertEqual(sink.stats()["rows_spilled"], 2)
+        sink.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
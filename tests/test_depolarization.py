@@ -0,0 +1,91 @@
+import os
+import sys
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import unittest
+
+import numpy as np
+
+from src.analysis.depolarization import DepolarizationDetector
+
+RATE = 100.0
+
+
+def surface_potential(seconds, events=(), seed=0):
+    """Two noisy channels, ``events`` are (start s, channel, mV) steps."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * RATE)) / RATE
+    values = np.vstack([-400 + rng.normal(0, 2, len(t)),
+                        -250 + rng.normal(0, 2, len(t))])
+    for start, ch, amplitude in events:
+        # a 0.5 s ramp, then the new level
+        values[ch] += amplitude * np.clip((t - start) / 0.5, 0, 1)
+    return t, values
+
+
+def run(detector, t, values):
+    return [e for i in range(len(t))
+            if (e := detector.update(t[i], values[:, i])) is not None]
+
+
+class TestDepolarizationDetector(unittest.TestCase):
+    def test_quiet_signal(self):
+        t, values = surface_potential(120)
+        detector = DepolarizationDetector(2, rate=RATE)
+        self.assertEqual(run(detector, t, values), [])
+
+    def test_detects_step_within_latency(self):
+        t, values = surface_potential(40, [(20.0, 1, 40.0)])
+        detector = DepolarizationDetector(2, ["SE1", "SE2"], rate=RATE)
+        seen = []
+        detector.subscribe(seen.append)
+        events = run(detector, t, values)
+
+        self.assertEqual(len(events), 1)
+        self.assertEqual(seen, events)
+        event = events[0]
+        self.assertEqual((event.channel, event.label), (1, "SE2"))
+        self.assertGreater(event.slope, 0)
+        self.assertAlmostEqual(event.baseline, -250, delta=1)
+        self.assertLess(event.t - 20.0, 0.5)
+
+    def test_deferred_notify(self):
+        t, values = surface_potential(40, [(20.0, 1, 40.0)])
+        detector = DepolarizationDetector(2, rate=RATE)
+        seen = []
+        detector.subscribe(seen.append)
+        events = [e for i in range(len(t)) if (e := detector.update(
+            t[i], values[:, i], notify=False)) is not None]
+        self.assertEqual(len(events), 1)
+        self.assertEqual(seen, [])
+        detector.notify(events[0])
+        self.assertEqual(seen, events)
+
+    def test_negative_event_and_refractory(self):
+        # the second drop comes while the first one is still going on
+        t, values = surface_potential(60, [(15.0, 0, -50.0),
+                                           (15.3, 0, -30.0)])
+        detector = DepolarizationDetector(2, rate=RATE)
+        events = run(detector, t, values)
+        self.assertEqual(len(events), 1)
+        self.assertLess(events[0].z, 0)
+
+    def test_relearns_new_resting_level(self):
+        t, values = surface_potential(150, [(20.0, 0, 40.0), (120.0, 0, 40.0)])
+        detector = DepolarizationDetector(2, rate=RATE, max_event=30)
+        events = run(detector, t, values)
+        # the first step becomes the baseline the second one is seen from
+        self.assertEqual(len(events), 2)
+        self.assertAlmostEqual(events[1].baseline, -360, delta=1)
+
+    def test_ignores_nan_samples(self):
+        t, values = surface_potential(30)
+        values[0, ::7] = np.nan
+        detector = DepolarizationDetector(2, rate=RATE)
+        self.assertEqual(run(detector, t, values), [])
+        self.assertIsNone(detector.update(31.0, ["NAN", -250]))
+
+
+if __name__ == '__main__':
+    unittest.main()
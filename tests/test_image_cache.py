@@ -0,0 +1,77 @@
+import os
+import sys
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import tempfile
+import threading
+import unittest
+
+import cv2
+import numpy as np
+
+from archive.analyzer import DecodedImageCache
+
+
+class TestDecodedImageCache(unittest.TestCase):
+    def test_byte_budget_eviction(self):
+        cache = DecodedImageCache(max_bytes=250)
+        for k in range(3):
+            cache.put(("img", k, 0), np.zeros(100, np.uint8))
+        # the oldest image made room for the third
+        self.assertEqual(cache.size, 200)
+        self.assertIsNone(cache.get(("img", 0, 0)))
+
+        # reading an image makes it the most recent one
+        self.assertIsNotNone(cache.get(("img", 1, 0)))
+        cache.put(("img", 3, 0), np.zeros(100, np.uint8))
+        self.assertIsNotNone(cache.get(("img", 1, 0)))
+        self.assertIsNone(cache.get(("img", 2, 0)))
+
+        # larger than the whole budget: never cached
+        cache.put(("big", 0, 0), np.zeros(300, np.uint8))
+        self.assertIsNone(cache.get(("big", 0, 0)))
+        self.assertLessEqual(cache.size, 250)
+
+    def test_read_only_and_accounting(self):
+        cache = DecodedImageCache()
+        img = np.zeros((4, 4), np.uint8)
+        cache.put("key", img)
+        with self.assertRaises(ValueError):
+            cache.get("key")[0, 0] = 1
+        cache.get("missing")
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_key_follows_mtime(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "frame.png")
+            cv2.imwrite(path, np.zeros((4, 4), np.uint8))
+            key = DecodedImageCache.key(path, cv2.IMREAD_GRAYSCALE)
+            os.utime(path, ns=(0, key[1] + 10 ** 9))
+            self.assertNotEqual(
+                DecodedImageCache.key(path, cv2.IMREAD_GRAYSCALE), key)
+            self.assertNotEqual(
+                DecodedImageCache.key(path, cv2.IMREAD_COLOR), key)
+        self.assertIsNone(DecodedImageCache.key(path, cv2.IMREAD_GRAYSCALE))
+
+    def test_one_executor(self):
+        cache = DecodedImageCache(workers=2)
+        threads = set()
+
+        def record(x):
+            threads.add(threading.current_thread().name)
+            return x * 2
+
+        self.assertEqual(cache.map(record, [1, 2, 3]), [2, 4, 6])
+        executor = cache._executor
+        self.assertEqual(cache.map(record, [4, 5]), [8, 10])
+        self.assertIs(cache._executor, executor)
+        self.assertLessEqual(len(threads), 2)
+
+        cache.close()
+        self.assertIsNone(cache._executor)
+        self.assertEqual(cache.size, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
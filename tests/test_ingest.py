@@ -0,0 +1,205 @@
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import unittest
+
+from archive.ingest import IngestQueue
+
+
+class FakeAnalyzer:
+    def __init__(self):
+        self.analyzed = []
+
+    def combin_batch(self, image_paths):
+        self.analyzed.extend(image_paths)
+        return [(False, None)] * len(image_paths)
+
+
+class RaisingAnalyzer(FakeAnalyzer):
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+        self.calls = 0
+
+    def combin_batch(self, image_paths):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RuntimeError("analysis failed")
+        return super().combin_batch(image_paths)
+
+
+class FailingAnalyzer(FakeAnalyzer):
+    """Can't analyze the files named in `failures` that many times."""
+
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = dict(failures)
+
+    def combin_batch(self, image_paths):
+        verdicts = super().combin_batch(image_paths)
+        for i, path in enumerate(image_paths):
+            name = os.path.basename(path)
+            if self.failures.get(name, 0) > 0:
+                self.failures[name] -= 1
+                verdicts[i] = None
+        return verdicts
+
+
+class TestIngest(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = self.tmp.name
+        self.state = os.path.join(self.dir, "state.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _write(self, name):
+        path = os.path.join(self.dir, name)
+        with open(path, "wb") as f:
+            f.write(b"\0" * 100)
+        return path
+
+    def _run(self, ingest):
+        ingest.start()
+        deadline = time.time() + 5
+        while ingest.stats()["backlog"] and time.time() < deadline:
+            time.sleep(0.05)
+        ingest.stop()
+
+    def test_deduplicates(self):
+        analyzer = FakeAnalyzer()
+        ingest = IngestQueue(analyzer, self.state, settle_interval=0.01)
+        path = self._write("a.png")
+        self._write("notes.txt")
+        ingest.submit(path)
+        ingest.submit(path)
+        ingest.scan(self.dir)
+        self._run(ingest)
+
+        self.assertEqual(analyzer.analyzed, [path])
+        self.assertEqual(ingest.stats()["processed"], 1)
+        self.assertEqual(ingest.stats()["duplicates"], 2)
+
+    def test_restart_does_not_rescan(self):
+        first = FakeAnalyzer()
+        ingest = IngestQueue(first, self.state, settle_interval=0.01)
+        old = self._write("old.png")
+        ingest.scan(self.dir)
+        self._run(ingest)
+
+        time.sleep(0.01)  # make sure the new file has a later mtime
+        new = self._write("new.png")
+        second = FakeAnalyzer()
+        ingest = IngestQueue(second, self.state, settle_interval=0.01)
+        ingest.scan(self.dir)
+        self._run(ingest)
+
+        self.assertEqual(first.analyzed, [old])
+        self.assertEqual(second.analyzed, [new])
+
+    def test_failed_batch_is_retried(self):
+        path = self._write("a.png")
+        analyzer = RaisingAnalyzer(failures=1)
+        ingest = IngestQueue(analyzer, self.state, settle_interval=0.01,
+                             retry_delay=0.01)
+        ingest.scan(self.dir)
+        self._run(ingest)
+        self.assertEqual(analyzer.analyzed, [path])
+        self.assertEqual(ingest.stats()["retried"], 1)
+        self.assertEqual(ingest.stats()["failed"], 0)
+
+    def test_only_failed_files_are_retried(self):
+        good = self._write("a.png")
+        bad = self._write("b.png")
+        analyzer = FailingAnalyzer({"b.png": 1})
+        ingest = IngestQueue(analyzer, self.state, settle_interval=0.01,
+                             retry_delay=0.01)
+        ingest.submit(good)
+        ingest.submit(bad)
+        self._run(ingest)
+        self.assertEqual(analyzer.analyzed.count(good), 1)
+        self.assertEqual(analyzer.analyzed.count(bad), 2)
+        self.assertEqual(ingest.stats()["retried"], 1)
+        self.assertEqual(ingest.stats()["processed"], 2)
+
+    def test_failed_files_are_not_recorded(self):
+        path = self._write("a.png")
+        ingest = IngestQueue(FailingAnalyzer({"a.png": 10}), self.state,
+                             settle_interval=0.01, retries=1,
+                             retry_delay=0.01, late_events=0)
+        ingest.scan(self.dir)
+        self._run(ingest)
+        self.assertEqual(ingest.stats()["failed"], 1)
+        self.assertEqual(ingest.failed_paths, {path})
+        # the watermark moved past it
+        self.assertGreater(ingest.watermark_ns, os.stat(path).st_ctime_ns)
+
+        # the next run tries it again
+        analyzer = FakeAnalyzer()
+        ingest = IngestQueue(analyzer, self.state, settle_interval=0.01,
+                             late_events=0)
+        ingest.scan(self.dir)
+        self._run(ingest)
+        self.assertEqual(analyzer.analyzed, [path])
+
+    def test_processed_files_below_watermark_are_forgotten(self):
+        analyzer = FakeAnalyzer()
+        ingest = IngestQueue(analyzer, self.state, settle_interval=0.01,
+                             late_events=0)
+        paths = [self._write(f"{i}.png") for i in range(3)]
+        ingest.scan(self.dir)
+        self._run(ingest)
+        self.assertEqual(sorted(analyzer.analyzed), sorted(paths))
+        self.assertEqual(ingest._done, {})
+
+        analyzer = FakeAnalyzer()
+        ingest = IngestQueue(analyzer, self.state, settle_interval=0.01,
+                             late_events=0)
+        ingest.scan(self.dir)
+        self._run(ingest)
+        self.assertEqual(analyzer.analyzed, [])
+        self.assertEqual(ingest.stats()["duplicates"], 3)
+
+    def test_late_file_with_old_mtime(self):
+        first = FakeAnalyzer()
+        ingest = IngestQueue(first, self.state, settle_interval=0.01,
+                             late_events=0)
+        self._write("new.png")
+        ingest.scan(self.dir)
+        self._run(ingest)
+
+        # copied in afterwards with its original time, like cp -p
+        late = self._write("late.png")
+        os.utime(late, (1_000_000, 1_000_000))
+        second = FakeAnalyzer()
+        ingest = IngestQueue(second, self.state, settle_interval=0.01,
+                             late_events=0)
+        ingest.scan(self.dir)
+        self._run(ingest)
+        self.assertEqual(second.analyzed, [late])
+
+    def test_corrupt_state(self):
+        path = self._write("a.png")
+        ingest = IngestQueue(FakeAnalyzer(), self.state, settle_interval=0.01)
+        ingest.scan(self.dir)
+        self._run(ingest)
+        with open(self.state, "w") as f:
+            f.write('{"watermark_ns": 1, "done": {"trunc')
+
+        # starts over instead of crashing
+        analyzer = FakeAnalyzer()
+        ingest = IngestQueue(analyzer, self.state, settle_interval=0.01)
+        ingest.scan(self.dir)
+        self._run(ingest)
+        self.assertEqual(analyzer.analyzed, [path])
+        self.assertEqual(ingest.stats()["failed"], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
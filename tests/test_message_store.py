@@ -0,0 +1,43 @@
+import os
+import sys
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import unittest
+
+from src.tools.message_store import MessageStore
+
+
+def row(_id, date, body, address="+15551234"):
+    return {"_id": str(_id), "address": address, "date": str(date),
+            "body": body}
+
+
+class TestMessageStore(unittest.TestCase):
+    def test_merge(self):
+        store = MessageStore("5551234")
+        new = store.merge("received", [row(2, 2000, "1 "), row(1, 1000, "hi"),
+                                       row(3, 3000, "x", "+1999")])
+        self.assertEqual([m["body"] for m in new], ["1", "hi"])
+        self.assertEqual([m["body"] for m in store.messages], ["hi", "1"])
+        # rows of other numbers are not fetched again either
+        self.assertEqual(store.last_id["received"], 3)
+        self.assertEqual(store.merge("received", [row(2, 2000, "1")]), [])
+
+    def test_since_and_epoch(self):
+        store = MessageStore("555")
+        store.merge("received", [row(1, 1000, "a", "555")])
+        epoch, msgs = store.since(0)
+        self.assertEqual(len(msgs), 1)
+
+        store.merge("sent", [row(1, 3000, "b", "555")])
+        self.assertEqual(store.since(1), (epoch, [store.messages[1]]))
+
+        # sent before the last message shown: readers must start over
+        store.merge("received", [row(2, 2000, "c", "555")])
+        self.assertNotEqual(store.since(2)[0], epoch)
+        self.assertEqual([m["body"] for m in store.messages], ["a", "c", "b"])
+
+
+if __name__ == '__main__':
+    unittest.main()
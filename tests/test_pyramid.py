@@ -0,0 +1,81 @@
+import os
+import sys
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import tempfile
+import unittest
+
+import numpy as np
+
+from src.tools.pyramid import Pyramid
+
+
+class TestPyramid(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.pyramid = Pyramid(self.dir.name, 2, factor=4, levels=3)
+        for i in range(100):
+            self.pyramid.append(float(i), [i, "NAN" if i % 2 else -i])
+        self.pyramid.flush()
+
+    def tearDown(self):
+        self.pyramid.close()
+        self.dir.cleanup()
+
+    def test_raw(self):
+        t, vmin, vmax, vmean = self.pyramid.window(10, 20)
+        np.testing.assert_array_equal(t, np.arange(10, 21))
+        np.testing.assert_array_equal(vmin, vmax)
+        self.assertTrue(np.isnan(vmean[1, 1]))
+
+    def test_levels(self):
+        # 100 raw samples > 30, 25 records of 4 samples
+        t, vmin, vmax, vmean = self.pyramid.window(0, 99, max_points=30)
+        self.assertEqual(len(t), 25)
+        np.testing.assert_array_equal(t[:3], [0, 4, 8])
+        np.testing.assert_array_equal(vmin[0, :2], [0, 4])
+        np.testing.assert_array_equal(vmax[0, :2], [3, 7])
+        # NaNs are left out of the means
+        np.testing.assert_array_equal(vmean[:, 0], [1.5, -1])
+
+        # 6 records of 16 samples, and the one being built
+        t, vmin, vmax, _ = self.pyramid.window(0, 99, max_points=10)
+        np.testing.assert_array_equal(t, [0, 16, 32, 48, 64, 80, 96])
+        self.assertEqual(vmax[0, -1], 99)
+        self.assertEqual(vmin[1].min(), -98)
+
+        # samples not in a level 1 record yet are in the last one too
+        self.pyramid.append(100.0, [100, -100])
+        t, vmin, vmax, vmean = self.pyramid.window(0, 100, max_points=10)
+        self.assertEqual(t[-1], 96)
+        self.assertEqual(vmax[0, -1], 100)
+        self.assertEqual(vmin[1, -1], -100)
+        self.assertEqual(vmean[0, -1], 98)
+
+    def test_reopen(self):
+        history = Pyramid(self.dir.name, mode="r")
+        self.assertEqual((history.channels, history.factor), (2, 4))
+        self.assertEqual(history.total, 100)
+        self.assertEqual(len(history.window(0, 99, max_points=30)[0]), 25)
+
+    def test_append_session(self):
+        self.pyramid.close()
+        history = Pyramid(self.dir.name, 2, factor=4, levels=3, mode="a")
+        for i in range(100, 108):
+            history.append(float(i), [i, i])
+        history.close()
+
+        history = Pyramid(self.dir.name, mode="r")
+        self.assertEqual(history.total, 108)
+        t, _, vmax, _ = history.window(90, 107)
+        np.testing.assert_array_equal(t, np.arange(90, 108))
+        # the second session's records start with its first sample
+        self.assertEqual(list(history.level(1)["t"][-2:]), [100, 104])
+
+        with self.assertRaises(ValueError):
+            Pyramid(self.dir.name, 3, factor=4, levels=3, mode="a")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import os
+import sys
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import csv
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+
+from src.tools.recording_writer import RecordingWriter
+
+COLUMNS = ["Time", "SE1", "SE2", "Flag"]
+
+
+class TestRecordingWriter(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = Path(self.dir.name) / "data.csv"
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_csv(self):
+        writer = RecordingWriter(self.path, COLUMNS, flush_rows=3)
+        for i in range(10):
+            writer.write(f"2025-01-01T00:00:{i:02d}", [i, "NAN"], i % 2)
+        writer.close()
+
+        with open(self.path, newline='') as f:
+            rows = list(csv.reader(f))
+        self.assertEqual(rows[0], COLUMNS)
+        self.assertEqual(len(rows), 11)
+        self.assertEqual(rows[4], ["2025-01-01T00:00:03", "3", "NAN", "1"])
+        stats = writer.stats()
+        self.assertEqual(stats["rows_written"], 10)
+        self.assertEqual(stats["backlog"], 0)
+        self.assertGreaterEqual(stats["flushes"], 3)
+
+    def test_flush(self):
+        writer = RecordingWriter(self.path, COLUMNS, flush_ms=60000)
+        writer.write("2025-01-01T00:00:00", [1, 2], 0)
+        writer.flush()
+        with open(self.path) as f:
+            self.assertEqual(len(f.readlines()), 2)
+        writer.close()
+        writer.write("2025-01-01T00:00:01", [1, 2], 0)  # ignored once closed
+        self.assertEqual(writer.stats()["rows_queued"], 1)
+
+    def test_f32(self):
+        writer = RecordingWriter(self.path, COLUMNS, fmt="f32")
+        for i in range(5):
+            writer.write(f"2025-01-01T00:00:0{i}", [i, -i], i == 2)
+        writer.close()
+
+        with open(self.path.with_suffix(".json")) as f:
+            header = json.load(f)
+        self.assertEqual(header["columns"], COLUMNS)
+        self.assertEqual(header["t0"], writer.t0)
+        data = np.fromfile(self.path.with_suffix(".f32"), np.float32) \
+            .reshape(-1, len(header["columns"]))
+        self.assertEqual(data.shape, (5, 4))
+        np.testing.assert_array_equal(data[:, 1], np.arange(5))
+        np.testing.assert_array_equal(data[:, 3], [0, 0, 1, 0, 0])
+        np.testing.assert_allclose(np.diff(data[:, 0]), 1, atol=1e-2)
+
+    def test_write_error(self):
+        writer = RecordingWriter(self.path, COLUMNS, fmt="f32")
+        writer.write("2025-01-01T00:00:00", ["not a number", 2], 0)
+        with self.assertRaises(ValueError):
+            writer.close(timeout=5)
+        self.assertFalse(writer._thread.is_alive())
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            RecordingWriter(self.path, COLUMNS, fmt="parquet")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,147 @@
+import os
+import sys
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# the server imports its modules as the Docker image lays them out
+sys.path.insert(0, os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..', 'archive', 'remote')))
+import unittest
+
+import cv2
+import numpy as np
+
+import codec
+import protocol
+from cache import ResultCache
+from image_analysis import IncrementalAnalysis, MissingFrame
+
+PARAMS = {"width": 32, "height": 16, "min_intensity": 20}
+
+
+def frame_hash(frame):
+    return protocol.frame_digest(frame.data, frame.shape, frame.dtype.name)
+
+
+class TestIncrementalAnalysis(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(0)
+        base = rng.integers(100, 400, (16, 32))
+        self.frames = [np.clip(base + rng.integers(-60, 60, base.shape), 0,
+                               1023).astype(np.uint16) for _ in range(5)]
+        self.frames[3][:8] += 200  # burn
+        self.hashes = [frame_hash(f) for f in self.frames]
+
+    def analyze(self, cache=None):
+        analysis = IncrementalAnalysis(**PARAMS, cache=cache)
+        for frame in self.frames:
+            analysis.add_frame(frame)
+        return analysis
+
+    def expected(self, reference):
+        counts = []
+        for i in range(1, len(self.frames)):
+            diff = cv2.subtract(self.frames[i],
+                                self.frames[0 if reference == "bg" else i - 1])
+            counts.append(int(np.count_nonzero((diff >= 20) & (diff <= 170))))
+        return counts
+
+    def test_full_frames(self):
+        analysis = self.analyze()
+        self.assertEqual(analysis.pixel_counts_vs_prev, self.expected("prev"))
+        self.assertEqual(analysis.pixel_counts_vs_bg, self.expected("bg"))
+        self.assertEqual(analysis.n_frames, 5)
+
+    def test_deltas_match_full_frames(self):
+        analysis = IncrementalAnalysis(**PARAMS)
+        analysis.add_frame(self.frames[0])
+        for prev, frame, frame_hash in zip(self.frames, self.frames[1:],
+                                           self.hashes[1:]):
+            header, payload = codec.encode_delta(frame, prev)
+            analysis.add_delta(codec.decode_delta(header, payload),
+                               frame_hash)
+
+        full = self.analyze()
+        self.assertEqual(analysis.pixel_counts_vs_prev,
+                         full.pixel_counts_vs_prev)
+        self.assertEqual(analysis.pixel_counts_vs_bg, full.pixel_counts_vs_bg)
+        self.assertEqual(analysis.verdict(), full.verdict())
+
+    def test_known_frames_from_cache(self):
+        cache = ResultCache()
+        full = self.analyze(cache)
+        full.result()
+        hits = cache.stats()["hits"]
+
+        analysis = IncrementalAnalysis(**PARAMS, cache=cache)
+        analysis.add_frame(self.frames[0])
+        for frame_hash in self.hashes[1:]:
+            analysis.add_known(frame_hash)
+        self.assertEqual(analysis.pixel_counts_vs_prev,
+                         full.pixel_counts_vs_prev)
+        self.assertEqual(analysis.pixel_counts_vs_bg, full.pixel_counts_vs_bg)
+        self.assertEqual(cache.stats()["hits"] - hits, 8)
+        self.assertEqual(analysis.recording_key(), full.recording_key())
+        self.assertEqual(cache.get(full.recording_key())["result"],
+                         full.verdict())
+
+    def test_needed_frames_after_eviction(self):
+        cache = ResultCache()
+        analysis = IncrementalAnalysis(**PARAMS, cache=cache)
+        self.assertEqual(analysis.needed_frames(self.hashes), [0, 1, 2, 3, 4])
+        self.analyze(cache)
+        self.assertEqual(analysis.needed_frames(self.hashes), [])
+        self.assertEqual(analysis.needed_frames(self.hashes[:1]), [0])
+
+        # the oldest entry, frame 1 against frame 0, makes room for another
+        cache.max_bytes = cache.stats()["bytes"]
+        cache.put("x", 0)
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertEqual(analysis.needed_frames(self.hashes), [0, 1])
+
+    def test_missing_frame(self):
+        cache = ResultCache()
+        analysis = IncrementalAnalysis(**PARAMS, cache=cache)
+        analysis.add_frame(self.frames[0])
+        with self.assertRaises(MissingFrame) as error:
+            analysis.add_known(self.hashes[1])
+        self.assertEqual(error.exception.index, 1)
+
+        # counts against a reference sent by hash only
+        analysis = IncrementalAnalysis(**PARAMS, cache=cache)
+        analysis.add_known(self.hashes[0])
+        with self.assertRaises(MissingFrame) as error:
+            analysis.add_frame(self.frames[1])
+        self.assertEqual(error.exception.index, 0)
+
+    def test_delta_hash_is_computed(self):
+        cache = ResultCache()
+        header, payload = codec.encode_delta(self.frames[1], self.frames[0])
+        delta = codec.decode_delta(header, payload)
+
+        analysis = IncrementalAnalysis(**PARAMS, cache=cache)
+        analysis.add_frame(self.frames[0])
+        with self.assertRaises(ValueError):
+            analysis.add_delta(delta, self.hashes[2])
+
+        # without a hash the counts are cached under the real one
+        analysis = IncrementalAnalysis(**PARAMS, cache=cache)
+        analysis.add_frame(self.frames[0])
+        analysis.add_delta(delta)
+        self.assertEqual(analysis.hashes, self.hashes[:2])
+        self.assertEqual(analysis.needed_frames(self.hashes[:2]), [])
+
+        # nothing to apply a delta to after a frame sent by hash only
+        self.analyze(cache)
+        analysis = IncrementalAnalysis(**PARAMS, cache=cache)
+        analysis.add_frame(self.frames[0])
+        analysis.add_known(self.hashes[1])
+        header, payload = codec.encode_delta(self.frames[2], self.frames[1])
+        with self.assertRaises(MissingFrame) as error:
+            analysis.add_delta(codec.decode_delta(header, payload))
+        self.assertEqual(error.exception.index, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,37 @@
+import os
+import sys
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import unittest
+
+from archive.remote.cache import (ResultCache, pair_key, params_digest,
+                                  recording_key)
+
+
+class TestResultCache(unittest.TestCase):
+    def test_lru_eviction(self):
+        cache = ResultCache(max_bytes=3 * len("k0") + 3)
+        for i in range(3):
+            cache.put(f"k{i}", i)
+        self.assertEqual(cache.get("k0"), 0)  # k1 is now least recent
+        cache.put("k3", 3)
+
+        self.assertNotIn("k1", cache)
+        self.assertEqual(cache.get("k0"), 0)
+        self.assertEqual(cache.stats()["evictions"], 1)
+        self.assertLessEqual(cache.stats()["bytes"], cache.max_bytes)
+
+    def test_keys(self):
+        params = params_digest([20, 170])
+        self.assertNotEqual(params, params_digest([40, 170]))
+        self.assertNotEqual(pair_key(params, "a", "b"),
+                            pair_key(params, "b", "a"))
+        self.assertEqual(recording_key(params, ["a", "b"]),
+                         recording_key(params, ["a", "b"]))
+        self.assertNotEqual(recording_key(params, ["a", "b"]),
+                            recording_key(params, ["a", "b", "c"]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import sys
+import zlib
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import unittest
+
+import numpy as np
+
+from archive.remote import codec
+
+
+class TestRemoteCodec(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        rng = np.random.default_rng(0)
+        base = rng.normal(300, 20, (64, 80))
+        self.prev = np.clip(base + rng.normal(0, 3, base.shape), 0,
+                            1023).astype(np.uint16)
+        self.frame = np.clip(base + rng.normal(0, 3, base.shape), 0,
+                             1023).astype(np.uint16)
+
+    def test_keyframe(self):
+        header, payload = codec.encode_keyframe(self.frame)
+        np.testing.assert_array_equal(
+            codec.decode_keyframe(header, payload), self.frame)
+
+    def test_delta(self):
+        header, payload = codec.encode_delta(self.frame, self.prev)
+        self.assertEqual(header["dtype"], "int16")
+        self.assertLess(len(payload), self.frame.nbytes / 2)
+        np.testing.assert_array_equal(
+            codec.decode_delta(header, payload),
+            self.frame.astype(np.int32) - self.prev)
+
+    def test_wide_delta(self):
+        prev = np.zeros((2, 2), np.uint16)
+        frame = np.array([[65535, 0], [1, 40000]], np.uint16)
+        for a, b in ((frame, prev), (prev, frame)):
+            header, payload = codec.encode_delta(a, b)
+            self.assertEqual(header["dtype"], "int32")
+            np.testing.assert_array_equal(codec.decode_delta(header, payload),
+                                          a.astype(np.int32) - b)
+
+    def test_payload_size_is_checked(self):
+        header, payload = codec.encode_keyframe(self.frame)
+        for shape in ([32, 80], [64, 81], [1080, 1440 * 100], [-64, -80]):
+            with self.assertRaises(ValueError):
+                codec.decode_keyframe(dict(header, shape=shape), payload)
+        with self.assertRaises(ValueError):
+            codec.decode_keyframe(header, payload[:-10])
+
+    def test_decompression_bomb(self):
+        # 200 MB of zeros announced as a small frame
+        header = {"encoding": "key", "shape": [64, 80], "dtype": "uint16"}
+        bomb = zlib.compress(bytes(200 * 1024 * 1024), 9)
+        with self.assertRaises(ValueError):
+            codec.decode_keyframe(header, bomb)
+
+
+if __name__ == '__main__':
+    unittest.main()
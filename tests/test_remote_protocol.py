@@ -0,0 +1,40 @@
+import io
+import json
+import os
+import sys
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import unittest
+
+from archive.remote import protocol
+
+
+class TestRemoteProtocol(unittest.TestCase):
+    def test_round_trip(self):
+        stream = io.BytesIO(
+            protocol.encode_message({"type": "start", "params": {"a": 1}}) +
+            protocol.encode_message({"type": "frame", "index": 0}, b"tiff") +
+            protocol.encode_message({"type": "end"}))
+        messages = list(protocol.iter_messages(stream))
+
+        self.assertEqual([h["type"] for h, _ in messages],
+                         ["start", "frame", "end"])
+        self.assertEqual(messages[0][0]["params"], {"a": 1})
+        self.assertEqual(messages[1][1], b"tiff")
+
+    def test_truncated(self):
+        data = protocol.encode_message({"type": "frame"}, b"0123456789")
+        with self.assertRaises(protocol.ProtocolError):
+            list(protocol.iter_messages(io.BytesIO(data[:-3])))
+
+    def test_oversized_payload(self):
+        header = json.dumps({"type": "frame",
+                             "size": protocol.MAX_MESSAGE_BYTES + 1}).encode()
+        data = protocol.HEADER.pack(len(header)) + header
+        with self.assertRaises(protocol.ProtocolError):
+            protocol.read_message(io.BytesIO(data))
+
+
+if __name__ == '__main__':
+    unittest.main()
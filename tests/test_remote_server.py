@@ -0,0 +1,178 @@
+import os
+import sys
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+# the server imports its modules as the Docker image lays them out
+sys.path.insert(0, os.path.abspath(
+    os.path.join(os.path.dirname(__file__), '..', 'archive', 'remote')))
+import io
+import threading
+import unittest
+
+import numpy as np
+
+import codec
+import jobs
+import protocol
+import server
+from cache import ResultCache
+
+PARAMS = {"width": 16, "height": 8}
+
+
+def recording(n_frames, burn_at=None):
+    rng = np.random.default_rng(0)
+    base = rng.integers(0, 30, (8, 16)).astype(np.uint8)
+    frames = [base + rng.integers(0, 2, base.shape, np.uint8)
+              for _ in range(n_frames)]
+    if burn_at is not None:
+        for frame in frames[burn_at:]:
+            frame[:4] += 100
+    return frames
+
+
+def frame_hash(frame):
+    return protocol.frame_digest(frame.data, frame.shape, frame.dtype.name)
+
+
+def stream_body(frames, known=(), start=True):
+    body = []
+    if start:
+        body.append(protocol.encode_message({"type": "start",
+                                             "params": PARAMS}))
+    for i, frame in enumerate(frames):
+        if i in known:
+            header, payload = {"type": "hash", "hash": frame_hash(frame)}, b""
+        else:
+            header, payload = codec.encode_keyframe(frame)
+            header["type"] = "frame"
+        body.append(protocol.encode_message(dict(header, index=i), payload))
+    body.append(protocol.encode_message({"type": "end"}))
+    return b"".join(body)
+
+
+class TestServer(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        server.cache = ResultCache()
+        server.job_queue = jobs.JobQueue(1, 2, server.cache)
+        self.client = server.app.test_client()
+
+    def tearDown(self):
+        server.job_queue.shutdown()
+
+    def post_stream(self, body):
+        return self.client.post("/stream", data=body,
+                                content_type="application/octet-stream")
+
+    def test_stream(self):
+        frames = recording(5, burn_at=3)
+        resp = self.post_stream(stream_body(frames))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json["result"], "Current injection")
+        self.assertEqual(resp.json["frames"], 5)
+        self.assertEqual(server.job_queue.metrics()["completed"], 1)
+
+    def test_hashes(self):
+        frames = recording(4, burn_at=2)
+        hashes = [frame_hash(f) for f in frames]
+        resp = self.client.post("/hashes", json={"params": PARAMS,
+                                                 "hashes": hashes})
+        self.assertEqual(resp.json, {"missing": [0, 1, 2, 3]})
+
+        self.post_stream(stream_body(frames))
+        resp = self.client.post("/hashes", json={"params": PARAMS,
+                                                 "hashes": hashes})
+        self.assertTrue(resp.json["cached"])
+        self.assertEqual(resp.json["result"], "Current injection")
+
+        # a new last frame: only it and its references are needed
+        resp = self.client.post("/hashes", json={
+            "params": PARAMS, "hashes": hashes + [frame_hash(frames[0] + 1)]})
+        self.assertEqual(resp.json["missing"], [0, 3, 4])
+
+        resp = self.client.post("/hashes", json={"params": PARAMS})
+        self.assertEqual(resp.status_code, 400)
+        resp = self.client.post("/hashes", json={"params": {"bad": 1},
+                                                 "hashes": hashes})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_stream_by_hash(self):
+        frames = recording(4, burn_at=2)
+        self.post_stream(stream_body(frames))
+        resp = self.post_stream(stream_body(frames, known={1, 2, 3}))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json["frames"], 4)
+
+    def test_missing_frame(self):
+        resp = self.post_stream(stream_body(recording(3), known={2}))
+        self.assertEqual(resp.status_code, 409)
+        self.assertEqual(resp.json["index"], 2)
+
+    def test_malformed_stream(self):
+        resp = self.post_stream(stream_body(recording(2), start=False))
+        self.assertEqual(resp.status_code, 400)
+        resp = self.post_stream(stream_body(recording(2))[:-10])
+        self.assertEqual(resp.status_code, 400)
+        resp = self.post_stream(b"")
+        self.assertEqual(resp.status_code, 400)
+
+    def test_saved_stream_job(self):
+        frames = recording(4, burn_at=2)
+        self.post_stream(stream_body(frames))
+        resp = self.client.post("/analyze",
+                                data=stream_body(frames, known={1, 2, 3}),
+                                content_type="application/octet-stream")
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp.json["result"], "Current injection")
+
+
+class BlockingStream(io.BytesIO):
+    """Upload stream whose end arrives once ``release`` is set."""
+
+    def __init__(self, data):
+        super().__init__(data)
+        self.release = threading.Event()
+
+    def read(self, size=-1):
+        if self.tell() == len(self.getvalue()):
+            self.release.wait(5)
+        return super().read(size)
+
+
+class TestJobQueue(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.queue = jobs.JobQueue(1, 2, ResultCache())
+
+    def tearDown(self):
+        self.queue.shutdown()
+
+    def test_backpressure(self):
+        # without the end message
+        body = stream_body(recording(3))[
+            :-len(protocol.encode_message({"type": "end"}))]
+        streams = [BlockingStream(body) for _ in range(2)]
+        running = [self.queue.submit_stream(s) for s in streams]
+        with self.assertRaises(jobs.QueueFull):
+            self.queue.submit_stream(BlockingStream(body))
+        self.assertEqual(self.queue.metrics()["rejected"], 1)
+
+        for stream in streams:
+            stream.release.set()
+        for job in running:
+            self.assertTrue(self.queue.wait(job, 5))
+        self.assertEqual(self.queue.metrics()["completed"], 2)
+        self.queue.submit_stream(io.BytesIO(stream_body(recording(2))))
+
+    def test_failed_job(self):
+        job = self.queue.submit_stream(io.BytesIO(b"\0\0\0\5junk!"))
+        self.queue.wait(job, 5)
+        self.assertEqual(job.status, "failed")
+        self.assertIsInstance(job.exception, ValueError)
+        self.assertEqual(self.queue.metrics()["failed"], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
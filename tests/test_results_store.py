@@ -0,0 +1,62 @@
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import unittest
+
+from src.analysis.db import SqliteResultsStore
+
+
+class TestResultsStore(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.store = SqliteResultsStore(":memory:")
+
+    def tearDown(self):
+        self.store.close()
+
+    def test_save_recording(self):
+        self.store.save_recording("rec1", "Burn", [10, 20000, 5], [1, 2, 3])
+        self.store.save_recording("rec2", "Current injection", [50, 80],
+                                  [4, 5])
+        self.store.save_recording("rec3", "Burn", [10, 12000], [1, 2])
+
+        burns = self.store.find_recordings(verdict="Burn", min_peak=15000)
+        self.assertEqual([r["name"] for r in burns], ["rec1"])
+        self.assertEqual(burns[0]["n_frames"], 3)
+
+        frames = self.store.frames("rec1")
+        self.assertEqual([f["frame"] for f in frames], [2, 3, 4])
+        self.assertEqual([f["count_vs_prev"] for f in frames], [10, 20000, 5])
+
+    def test_reanalysis_replaces_frames(self):
+        self.store.save_recording("rec", "Burn", [20000, 1], [1, 1])
+        self.store.save_recording("rec", "Nothing happened", [1], [1])
+        self.assertEqual(len(self.store.frames("rec")), 1)
+        self.assertEqual(self.store.find_recordings()[0]["verdict"],
+                         "Nothing happened")
+
+    def test_add_frames(self):
+        self.store.add_frames("dir", [{"yellow_pixels": 1, "agitated": False}])
+        self.store.add_frames("dir", [{"yellow_pixels": 9, "agitated": True}])
+        frames = self.store.frames("dir")
+        self.assertEqual([f["frame"] for f in frames], [1, 2])
+        self.assertEqual(self.store.find_recordings(verdict="Agitated")[0]
+                         ["n_frames"], 2)
+        self.assertEqual(self.store.find_recordings()[0]["peak_count"], 9)
+        self.assertEqual(len(self.store.find_recordings(min_peak=5)), 1)
+        self.assertEqual(len(self.store.find_recordings(min_peak=9)), 0)
+
+    def test_time_range(self):
+        self.store.save_recording("rec", "Burn", [1], [1])
+        now = datetime.now()
+        self.assertEqual(len(self.store.find_recordings(
+            since=now - timedelta(days=30), until=now + timedelta(days=1))), 1)
+        self.assertEqual(len(self.store.find_recordings(
+            since=now + timedelta(days=1))), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
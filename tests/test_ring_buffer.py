@@ -0,0 +1,58 @@
+import os
+import sys
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import unittest
+
+import numpy as np
+
+from src.tools.ring_buffer import RingBuffer
+
+
+class TestRingBuffer(unittest.TestCase):
+    def test_wraps(self):
+        buffer = RingBuffer(2, 4)
+        for i in range(10):
+            buffer.append(float(i), [i, -i], i % 2)
+
+        times, values, flags = buffer.view()
+        self.assertEqual(len(buffer), 4)
+        self.assertEqual(buffer.total, 10)
+        np.testing.assert_array_equal(times, [6, 7, 8, 9])
+        np.testing.assert_array_equal(values, [[6, 7, 8, 9], [-6, -7, -8, -9]])
+        np.testing.assert_array_equal(flags, [0, 1, 0, 1])
+        np.testing.assert_array_equal(buffer.view(2)[0], [8, 9])
+
+    def test_zero_copy(self):
+        buffer = RingBuffer(1, 8)
+        for i in range(11):
+            buffer.append(i, [i])
+        self.assertTrue(np.shares_memory(buffer.view()[1], buffer.values))
+
+    def test_partial_and_nan(self):
+        buffer = RingBuffer(3, 5)
+        buffer.append(0.0, ["NAN", 1.5, "2"])
+        _, values, _ = buffer.view(10)
+        self.assertEqual(values.shape, (3, 1))
+        self.assertTrue(np.isnan(values[0, 0]))
+        self.assertEqual(values[2, 0], 2.0)
+
+        # a short row doesn't keep the values overwritten in the slot
+        buffer = RingBuffer(2, 1)
+        buffer.append(0.0, [1.0, 2.0])
+        buffer.append(1.0, [3.0])
+        _, values, _ = buffer.view()
+        self.assertEqual(values[0, 0], 3.0)
+        self.assertTrue(np.isnan(values[1, 0]))
+
+    def test_set_flag(self):
+        buffer = RingBuffer(1, 3)
+        for i in range(5):
+            buffer.append(i, [i])
+        buffer.set_flag(1, age=1)
+        np.testing.assert_array_equal(buffer.view()[2], [0, 1, 0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import os
+import sys
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import unittest
+
+import numpy as np
+
+from src.tools.series_store import SeriesStore
+
+
+class TestSeriesStore(unittest.TestCase):
+    def test_since_across_chunks(self):
+        store = SeriesStore(2, chunk=4)
+        for i in range(10):
+            store.append(float(i), [i, "NAN"], i == 5)
+
+        self.assertEqual(len(store), 10)
+        self.assertEqual(store.last_time(), 9.0)
+        times, values, flags = store.since(2.5)
+        np.testing.assert_array_equal(times, np.arange(3, 10))
+        np.testing.assert_array_equal(values[0], np.arange(3, 10))
+        self.assertTrue(np.isnan(values[1]).all())
+        np.testing.assert_array_equal(np.flatnonzero(flags), [2])
+
+        self.assertEqual(len(store.since(0)[0]), 10)
+        self.assertEqual(len(store.since(100)[0]), 0)
+
+    def test_empty(self):
+        store = SeriesStore(3)
+        self.assertIsNone(store.last_time())
+        times, values, flags = store.since(0)
+        self.assertEqual(values.shape, (3, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
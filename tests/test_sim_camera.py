@@ -0,0 +1,80 @@
+import os
+import sys
+import tempfile
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import numpy as np
+import unittest
+from PIL import Image
+
+from src.tools.sim_camera import ReplayCamera, SimulatedCamera, \
+    SimulatedCameraSDK, _BaseCamera
+
+
+def _grab(camera, n):
+    frames = []
+    while len(frames) < n:
+        frame = camera.get_pending_frame_or_null()
+        if frame is None:
+            break
+        frames.append(frame.image_buffer)
+    return frames
+
+
+class TestSimCamera(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.sdk = SimulatedCameraSDK(width=160, height=120, fps=0,
+                                      events={3: "burn"})
+        self.camera = self.sdk.open_camera(
+            self.sdk.discover_available_cameras()[0])
+        self.camera.arm(2)
+        self.camera.issue_software_trigger()
+
+    def tearDown(self):
+        self.sdk.dispose()
+
+    def test_frames(self):
+        frames = _grab(self.camera, 5)
+        self.assertEqual(len(frames), 5)
+        for f in frames:
+            self.assertEqual(f.shape, (120, 160))
+            self.assertEqual(f.dtype, np.uint16)
+            self.assertLessEqual(f.max(), 1023)
+
+    def test_event(self):
+        frames = _grab(self.camera, 5)
+        quiet = np.count_nonzero(
+            frames[2].astype(int) - frames[1].astype(int) >= 20)
+        burn = np.count_nonzero(
+            frames[3].astype(int) - frames[2].astype(int) >= 20)
+        self.assertEqual(quiet, 0)
+        self.assertGreater(burn, 0)
+
+    def test_replay(self):
+        frames = _grab(self.camera, 4)
+        with tempfile.TemporaryDirectory() as tmp:
+            for i, f in enumerate(frames):
+                Image.fromarray(f).save(
+                    os.path.join(tmp, f"{i}-20250101_000000.tiff"))
+
+            replay = ReplayCamera(tmp, real_time=False)
+            replay.arm(2)
+            replay.issue_software_trigger()
+            replayed = _grab(replay, 10)
+
+        self.assertEqual(len(replayed), 4)
+        for a, b in zip(frames, replayed):
+            np.testing.assert_array_equal(a, b)
+
+    def test_base_camera_is_abstract(self):
+        class NoFrames(_BaseCamera):
+            pass
+
+        with self.assertRaises(TypeError):
+            NoFrames(16, 16, 10, 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
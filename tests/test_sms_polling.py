@@ -0,0 +1,115 @@
+import os
+import sys
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import json
+import tempfile
+import time
+import unittest
+
+from src.tools.sms_sender import SmsSender, parse_rows
+
+FAKE_ADB = [sys.executable,
+            os.path.join(os.path.dirname(__file__), "fake_adb.py")]
+
+
+class TestInboxPolling(unittest.TestCase):
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.state = os.path.join(self.dir.name, "adb.json")
+        self.inbox = [
+            # before the app started
+            {"_id": 1, "address": "+1555", "body": "old", "date": 500}]
+        self.sent = []
+        self.write_inbox()
+        os.environ["FAKE_ADB_STATE"] = self.state
+        self.sender = SmsSender(adb=FAKE_ADB)
+        self.sender.init_ms = 1000
+
+    def tearDown(self):
+        self.sender.shell.close()
+        del os.environ["FAKE_ADB_STATE"]
+        self.dir.cleanup()
+
+    def write_inbox(self):
+        with open(self.state, "w") as f:
+            json.dump({"inbox": self.inbox, "sent": self.sent}, f)
+
+    def receive(self, body):
+        self.inbox.append({"_id": len(self.inbox) + 1, "address": "+1555",
+                           "body": body, "date": 1000 + len(self.inbox)})
+        self.write_inbox()
+
+    def test_only_new_messages(self):
+        self.assertEqual(self.sender.poll_inbox(), [])
+        self.receive("1")
+        self.receive("Hello, plant")
+        self.assertEqual(self.sender.poll_inbox(), ["1", "hello, plant"])
+        self.assertTrue(self.sender.new_msg_event.is_set())
+        self.assertEqual(self.sender.poll_inbox(), [])
+        self.assertEqual(self.sender.last_inbox_id, 3)
+
+        # the same text twice is two messages
+        self.receive("1")
+        self.assertEqual(self.sender.poll_inbox(), ["1"])
+        queued = [self.sender.new_msgs.get_nowait()
+                  for _ in range(self.sender.new_msgs.qsize())]
+        self.assertEqual(queued, ["1", "hello, plant", "1"])
+
+    def test_history_is_incremental(self):
+        self.receive("1")
+        self.sender.send_msg("You gave me a tickle!", phone="+1555")
+        msgs = self.sender.fetch_new_msgs("1555")
+        self.assertEqual([(m["type"], m["body"]) for m in msgs],
+                         [("received", "1"),
+                          ("sent", "You gave me a tickle!")])
+
+        self.assertEqual(self.sender.fetch_new_msgs("1555"), [])
+        self.receive("2")
+        new = self.sender.fetch_new_msgs("1555")
+        self.assertEqual([m["body"] for m in new], ["2"])
+        self.assertEqual(len(self.sender.history), 3)
+
+        # another contact, without messages yet
+        history = self.sender.history
+        self.assertEqual(self.sender.fetch_new_msgs("1666"), [])
+        self.assertIsNot(self.sender.history, history)
+        self.assertEqual(len(self.sender.history), 0)
+
+    def test_late_sent_rows_with_lower_ids(self):
+        now = int(time.time() * 1000)
+        self.inbox.append({"_id": 5, "address": "+1555", "body": "five",
+                           "date": now})
+        self.sent.append({"_id": 6, "address": "+1555", "body": "six",
+                          "date": now})
+        self.write_inbox()
+        self.assertEqual(self.sender.poll_inbox(), ["five"])
+        self.assertEqual(len(self.sender.fetch_new_msgs("1555")), 2)
+
+        # inbox and sent share the _id sequence, and a message queued before
+        # the others keeps its _id once sent
+        self.sent.append({"_id": 4, "address": "+1555", "body": "four",
+                          "date": now + 1})
+        self.inbox.append({"_id": 7, "address": "+1555", "body": "seven",
+                           "date": now + 2})
+        self.write_inbox()
+        self.assertEqual(self.sender.poll_inbox(), ["seven"])
+        self.assertEqual(self.sender.poll_inbox(), [])
+        new = self.sender.fetch_new_msgs("1555")
+        self.assertEqual(sorted(m["body"] for m in new), ["four", "seven"])
+        self.assertEqual([m["body"] for m in self.sender.history.since(0)[1]],
+                         ["five", "six", "four", "seven"])
+        self.assertEqual(self.sender.fetch_new_msgs("1555"), [])
+
+    def test_parse_rows(self):
+        output = ("Row: 0 _id=7, date=1001, body=a, b\nc\n"
+                  "Row: 1 _id=8, date=1002, body=2\n")
+        self.assertEqual(parse_rows(output, ["_id", "date", "body"]), [
+            {"_id": "7", "date": "1001", "body": "a, b\nc"},
+            {"_id": "8", "date": "1002", "body": "2"}])
+        self.assertEqual(parse_rows("No result found.\n", ["body"]), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import sys
+
+sys.path.insert(0,
+                os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import unittest
+
+from src.analysis.depolarization import Depolarization
+from src.analysis.verdict import VerdictEngine
+
+
+def depolarization(slope):
+    return Depolarization(0.0, 0, "SE1", -380.0, -400.0, 8.0, slope)
+
+
+class TestVerdictEngine(unittest.TestCase):
+    def setUp(self):
+        self.published = []
+        self.engine = VerdictEngine(on_verdict=self.published.append)
+
+    def test_optical_burn_is_early(self):
+        self.engine.add_optical(None)
+        self.engine.add_optical("Burn")
+        self.assertEqual(self.published, ["Burn"])
+        # published once, whatever comes next
+        self.engine.add_depolarization(depolarization(10))
+        self.assertEqual(self.engine.finish("Burn"), "Burn")
+        self.assertEqual(self.published, ["Burn"])
+
+    def test_both_modalities_agree(self):
+        self.engine.add_optical("Current injection")
+        self.assertEqual(self.published, [])  # could still be a burn
+        self.engine.add_depolarization(depolarization(10))
+        self.assertEqual(self.published, ["Current injection"])
+
+    def test_electrical_only_is_not_nothing(self):
+        self.engine.add_depolarization(depolarization(10))
+        for _ in range(5):
+            self.engine.add_optical(None)
+        self.engine.optical_done()
+        self.assertEqual(self.published, ["Depolarization"])
+
+    def test_strong_depolarization(self):
+        self.engine.add_depolarization(depolarization(-200))
+        self.assertEqual(self.published, ["Burn"])
+
+    def test_default(self):
+        self.assertEqual(self.engine.finish("Nothing happened"),
+                         "Nothing happened")
+        self.assertEqual(self.published, ["Nothing happened"])
+
+    def test_configurable_rules(self):
+        rules = {"rules": [{"when": {"electrical": "Depolarization"},
+                            "verdict": "Current injection", "early": True}],
+                 "default": "Quiet"}
+        engine = VerdictEngine(rules, self.published.append)
+        engine.add_depolarization(depolarization(500))
+        self.assertEqual(self.published, ["Current injection"])
+        self.assertEqual(VerdictEngine(rules).finish(), "Quiet")
+
+
+if __name__ == '__main__':
+    unittest.main()